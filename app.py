@@ -6,15 +6,35 @@ A minimal Python application for downloading YouTube videos and audio.
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import threading
 import subprocess
 import os
 import sys
-import yt_dlp
 import re
 import time
-import json
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import multiprocessing
+import yt_dlp
+from backends import EXECUTION_MODES
+from clips import ClipError, parse_clip
+from disk_space import format_bytes
+from engine import DownloadEngine
+from jobs import TERMINAL_EVENTS, Event
+from metadata_resolver import resolve_urls
+from settings import CONFIG_FILE, PROFILES, load_settings, save_settings
+from stats import ThroughputStats, sparkline
+from url_tools import canonical_key, extract_urls, is_http_url
+
+# Speculative prefetch of video info once a pasted URL validates
+PREFETCH_DELAY_MS = 500  # Debounce while the URL is still being edited
+PREFETCH_MAX_AGE = 1800  # Seconds before stream URLs in a prefetched info may expire
+
+# How often the config file is checked for changes made outside the app
+CONFIG_POLL_MS = 2000
+
+# How often the stats panel samples and redraws
+STATS_INTERVAL_MS = 1000
 
 
 class SimpleWebVideoDownloader:
@@ -26,18 +46,27 @@ class SimpleWebVideoDownloader:
         self.root.minsize(500, 600)  # Minimum window size
         
         # Configuration file path
-        self.config_file = os.path.join(os.path.expanduser("~"), ".web_video_downloader_config.json")
+        self.config_file = CONFIG_FILE
+        self.config_mtime = None
+        self.settings: Dict[str, Any] = {}
         
         # Check for FFmpeg
-        self.ffmpeg_available = self.check_ffmpeg()
+        self.ffmpeg_location = self.find_bundled_ffmpeg()
+        self.ffmpeg_available = self.ffmpeg_location is not None or self.check_ffmpeg()
         
         # Variables
         self.folder_path = tk.StringVar()
         self.url = tk.StringVar()
         self.download_video = tk.BooleanVar(value=True)  # Auto-select video
         self.download_audio = tk.BooleanVar(value=False)  # Audio optional
+        self.use_content_store = tk.BooleanVar(value=False)  # Shared store is opt-in
+        self.clip = tk.StringVar()  # Optional time ranges/chapters, see clips.parse_clip
+        self.execution_mode = tk.StringVar(value='thread')  # 'thread' or 'process'
+        self.profile = tk.StringVar(value='none')  # Performance profile from settings.PROFILES
         self.progress_value = tk.DoubleVar()
         self.status_text = tk.StringVar(value="✨ Ready")
+        self.preview_text = tk.StringVar(value="")
+        self.stats_text = tk.StringVar(value="")
         
         # UI state
         self.downloading = False
@@ -46,17 +75,33 @@ class SimpleWebVideoDownloader:
         
         # Multiple downloads tracking
         self.active_downloads: List[Dict[str, Any]] = []
-        self.download_counter = 0
+        self.downloads_by_id: Dict[int, Dict[str, Any]] = {}
+        # Queued and running jobs by (canonical URL key, folder, video, audio)
+        self.queued_keys: Dict[tuple, int] = {}
+        
+        # Prefetched info keyed by URL, oldest first
+        self.prefetched: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.prefetching = set()
+        self.prefetch_after_id = None
         
         # Load configuration
         self.load_config()
         
+        # Headless engine that runs the jobs; this class only renders its events
+        self.engine = DownloadEngine(self.settings)
+        self.engine.subscribe(self.on_engine_event)
+        self.stats = ThroughputStats(interval=STATS_INTERVAL_MS / 1000)
+        
         # Setup modern theme
         self.setup_modern_theme()
         
         self.setup_ui()
         self.setup_bindings()
         
+        # Pick up config file edits without a restart
+        self.root.after(CONFIG_POLL_MS, self.watch_config)
+        self.root.after(STATS_INTERVAL_MS, self.update_stats)
+        
     def setup_ui(self):
         # Use light backgrounds and black text for all widgets
         bg = "#f0f0f0"
@@ -77,19 +122,45 @@ class SimpleWebVideoDownloader:
 
         tk.Label(self.root, text="Video URL:", bg=bg, fg=fg).pack(anchor=tk.W, padx=10)
         self.url_entry = tk.Entry(self.root, textvariable=self.url, bg=entry_bg, fg=entry_fg)
-        self.url_entry.pack(fill=tk.X, padx=10, pady=(0, 10))
+        self.url_entry.pack(fill=tk.X, padx=10)
+        self.preview_label = tk.Label(self.root, textvariable=self.preview_text, anchor=tk.W, justify=tk.LEFT, bg=bg, fg="#555555")
+        self.preview_label.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        tk.Label(self.root, text="Clip (optional, e.g. 1:00-1:30, 45:00-, *Chapter name):", bg=bg, fg=fg).pack(anchor=tk.W, padx=10)
+        self.clip_entry = tk.Entry(self.root, textvariable=self.clip, bg=entry_bg, fg=entry_fg)
+        self.clip_entry.pack(fill=tk.X, padx=10, pady=(0, 10))
 
         self.video_checkbox = tk.Checkbutton(self.root, text="Download Video", variable=self.download_video, bg=bg, fg=fg, selectcolor=bg, activebackground=bg, activeforeground=fg)
         self.video_checkbox.pack(anchor=tk.W, padx=10)
         self.audio_checkbox = tk.Checkbutton(self.root, text="Download Audio (MP3)", variable=self.download_audio, bg=bg, fg=fg, selectcolor=bg, activebackground=bg, activeforeground=fg)
-        self.audio_checkbox.pack(anchor=tk.W, padx=10, pady=(0, 10))
+        self.audio_checkbox.pack(anchor=tk.W, padx=10)
+        self.store_checkbox = tk.Checkbutton(self.root, text="Reuse identical downloads (shared store)", variable=self.use_content_store, command=lambda: self.save_config('use_content_store'), bg=bg, fg=fg, selectcolor=bg, activebackground=bg, activeforeground=fg)
+        self.store_checkbox.pack(anchor=tk.W, padx=10, pady=(0, 10))
+
+        mode_row = tk.Frame(self.root, bg=bg)
+        mode_row.pack(fill=tk.X, padx=10, pady=(0, 10))
+        tk.Label(mode_row, text="Run downloads in:", bg=bg, fg=fg).pack(side=tk.LEFT)
+        self.mode_menu = tk.OptionMenu(mode_row, self.execution_mode, *EXECUTION_MODES, command=lambda _: self.save_config('execution_mode'))
+        self.mode_menu.configure(bg=bg, fg=fg, activebackground=bg)
+        self.mode_menu.pack(side=tk.LEFT, padx=(5, 0))
+        tk.Label(mode_row, text="Profile:", bg=bg, fg=fg).pack(side=tk.LEFT, padx=(15, 0))
+        self.profile_menu = tk.OptionMenu(mode_row, self.profile, 'none', *PROFILES, command=lambda _: self.save_config('profile'))
+        self.profile_menu.configure(bg=bg, fg=fg, activebackground=bg)
+        self.profile_menu.pack(side=tk.LEFT, padx=(5, 0))
 
-        self.download_button = tk.Button(self.root, text="Start Download", command=self.start_download, bg=bg, fg=fg)
-        self.download_button.pack(fill=tk.X, padx=10, pady=(0, 10))
+        button_row = tk.Frame(self.root, bg=bg)
+        button_row.pack(fill=tk.X, padx=10, pady=(0, 10))
+        self.download_button = tk.Button(button_row, text="Start Download", command=self.start_download, bg=bg, fg=fg)
+        self.download_button.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.bulk_button = tk.Button(button_row, text="Bulk Add...", command=self.open_bulk_add, bg=bg, fg=fg)
+        self.bulk_button.pack(side=tk.RIGHT, padx=(5, 0))
 
         self.status_label = tk.Label(self.root, textvariable=self.status_text, anchor=tk.W, bg=bg, fg=fg)
         self.status_label.pack(fill=tk.X, padx=10, pady=(0, 10))
 
+        self.stats_label = tk.Label(self.root, textvariable=self.stats_text, anchor=tk.W, justify=tk.LEFT, font='TkFixedFont', bg=bg, fg="#555555")
+        self.stats_label.pack(fill=tk.X, padx=10, pady=(0, 10))
+
         self.open_folder_button = tk.Button(self.root, text="Open Folder", command=self.open_folder, state="disabled", bg=bg, fg=fg)
         self.open_folder_button.pack(anchor=tk.E, padx=10, pady=(0, 10))
 
@@ -141,9 +212,83 @@ class SimpleWebVideoDownloader:
         """Paste clipboard content into URL field."""
         try:
             clipboard_content = self.root.clipboard_get()
-            self.url.set(clipboard_content)
         except tk.TclError:
-            pass  # Clipboard might be empty or contain non-text data
+            return  # Clipboard might be empty or contain non-text data
+        if len(extract_urls(clipboard_content)) > 1:
+            self.open_bulk_add(clipboard_content)
+        else:
+            self.url.set(clipboard_content)
+            
+    def open_bulk_add(self, initial_text: str = ""):
+        """Open a window for adding many URLs at once."""
+        bg = "#f0f0f0"
+        window = tk.Toplevel(self.root)
+        window.title("Bulk Add")
+        window.geometry("500x400")
+        window.configure(bg=bg)
+        
+        tk.Label(window, text="Paste URLs (one per line or mixed with other text):", bg=bg, fg="black").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        text = tk.Text(window, bg="white", fg="black", wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        text.insert("1.0", initial_text)
+        
+        def paste_clipboard():
+            try:
+                text.insert(tk.END, "\n" + self.root.clipboard_get())
+            except tk.TclError:
+                pass
+                
+        def load_file():
+            file_path = filedialog.askopenfilename(parent=window, title="Select URL List",
+                                                   filetypes=[("Text files", "*.txt"), ("All files", "*")])
+            if file_path:
+                try:
+                    with open(file_path, 'r') as f:
+                        text.insert(tk.END, "\n" + f.read())
+                except OSError as e:
+                    messagebox.showerror("Error", f"Could not read file: {e}", parent=window)
+                    
+        def add_all():
+            if self.add_urls(extract_urls(text.get("1.0", tk.END))):
+                window.destroy()
+                
+        button_row = tk.Frame(window, bg=bg)
+        button_row.pack(fill=tk.X, padx=10, pady=(0, 10))
+        tk.Button(button_row, text="Paste Clipboard", command=paste_clipboard, bg=bg, fg="black").pack(side=tk.LEFT)
+        tk.Button(button_row, text="Load File...", command=load_file, bg=bg, fg="black").pack(side=tk.LEFT, padx=(5, 0))
+        tk.Button(button_row, text="Add to Queue", command=add_all, bg=bg, fg="black").pack(side=tk.RIGHT)
+        
+    def add_urls(self, urls: List[str]) -> bool:
+        """Queue many URLs with the current options, skipping duplicates. Returns False on invalid input."""
+        path = self.folder_path.get().strip()
+        download_video = self.download_video.get()
+        download_audio = self.download_audio.get()
+        if not self.validate_folder(path):
+            messagebox.showerror("Invalid Input", "Please select a download folder first.")
+            return False
+        if not download_video and not download_audio:
+            messagebox.showerror("Invalid Selection", "Please select at least video or audio to download.")
+            return False
+        clip = self.clip_options()
+        if clip is None:
+            return False
+            
+        added = duplicates = unsupported = 0
+        for url in urls:
+            if not self.validate_url(url):
+                unsupported += 1
+            elif self.enqueue_download(url, path, download_video, download_audio, clip):
+                added += 1
+            else:
+                duplicates += 1
+                
+        summary = f"➕ Added {added}"
+        if duplicates:
+            summary += f" · skipped {duplicates} already queued"
+        if unsupported:
+            summary += f" · {unsupported} unsupported"
+        self.status_text.set(summary)
+        return True
             
     def browse_folder(self):
         """Open folder browser dialog."""
@@ -153,13 +298,11 @@ class SimpleWebVideoDownloader:
         )
         if folder:
             self.folder_path.set(folder)
-            self.save_config()
+            self.save_config('download_folder')
             
     def validate_url(self, url: str) -> bool:
-        """Basic URL validation for YouTube links."""
-        if not url.startswith('http'):
-            return False
-        return 'youtube.com' in url or 'youtu.be' in url
+        """Basic URL validation: any http(s) link; yt-dlp decides whether it supports the site."""
+        return is_http_url(url)
         
     def validate_folder(self, folder: str) -> bool:
         """Validate that folder exists and is writable."""
@@ -169,14 +312,86 @@ class SimpleWebVideoDownloader:
         
     def validate_inputs(self, *args):
         """Validate all inputs and update download button state."""
-        url_valid = self.validate_url(self.url.get().strip())
+        url = self.url.get().strip()
+        url_valid = self.validate_url(url)
         folder_valid = self.validate_folder(self.folder_path.get().strip())
+        self.schedule_prefetch(url if url_valid else None)
         
         if url_valid and folder_valid:
             self.download_button.config(state="normal")
         else:
             self.download_button.config(state="disabled")
             
+    def schedule_prefetch(self, url):
+        """Debounce a background info fetch for the URL being entered."""
+        if self.prefetch_after_id is not None:
+            self.root.after_cancel(self.prefetch_after_id)
+            self.prefetch_after_id = None
+        if not url:
+            self.preview_text.set("")
+            return
+        self.prefetch_after_id = self.root.after(PREFETCH_DELAY_MS, lambda: self.start_prefetch(url))
+        
+    def get_prefetched(self, url: str):
+        """Return a fresh prefetch result for a URL, or None."""
+        entry = self.prefetched.get(url)
+        if entry and time.time() - entry['fetched_at'] > PREFETCH_MAX_AGE:
+            del self.prefetched[url]
+            return None
+        return entry
+        
+    def start_prefetch(self, url: str):
+        """Resolve a URL's info in the background so Download can start immediately."""
+        self.prefetch_after_id = None
+        entry = self.get_prefetched(url)
+        if entry:
+            self.show_preview(entry)
+            return
+        if url in self.prefetching:
+            return
+        self.prefetching.add(url)
+        self.preview_text.set("🔎 Looking up video...")
+        
+        def worker():
+            # The network settings the job will use; its egress is only picked on submit
+            result = resolve_urls([url], max_workers=1, keep_info=True,
+                                  ydl_opts={'socket_timeout': self.settings['socket_timeout']},
+                                  use_session=self.settings['use_session'],
+                                  host_min_interval=self.settings['host_min_interval'])[0]
+            if result.get('info'):
+                result['info'] = yt_dlp.YoutubeDL.sanitize_info(result['info'])
+            result['fetched_at'] = time.time()
+            self.root.after(0, lambda: self.on_prefetch_done(url, result))
+            
+        threading.Thread(target=worker, daemon=True).start()
+        
+    def on_prefetch_done(self, url: str, result: Dict[str, Any]):
+        """Cache a prefetch result and show it if its URL is still entered."""
+        self.prefetching.discard(url)
+        if 'error' not in result:
+            self.prefetched[url] = result
+            while len(self.prefetched) > self.settings['prefetch_cache_size']:
+                self.prefetched.popitem(last=False)
+        if self.url.get().strip() != url:
+            return
+        if 'error' in result:
+            self.preview_text.set("⚠️ Couldn't look up this video; it will be resolved on download")
+        else:
+            self.show_preview(result)
+            
+    def show_preview(self, entry: Dict[str, Any]):
+        """Show title, duration and available qualities for a prefetched URL."""
+        parts = [f"🎬 {entry.get('title') or 'Unknown'}"]
+        if entry.get('duration'):
+            parts.append(self.format_time(entry['duration']))
+        heights = sorted({f['height'] for f in entry['info'].get('formats', [])
+                          if f.get('height') and f.get('vcodec') != 'none'}, reverse=True)
+        if heights:
+            parts.append("/".join(f"{h}p" for h in heights[:5]))
+        if entry.get('filesize'):
+            parts.append(f"~{entry['filesize'] / (1024*1024):.0f} MB")
+        self.preview_text.set(" · ".join(parts))
+        
     def format_time(self, seconds):
         """Format seconds into human readable time."""
         if seconds < 60:
@@ -190,7 +405,8 @@ class SimpleWebVideoDownloader:
             minutes = int((seconds % 3600) // 60)
             return f"{hours}h {minutes}m"
             
-    def add_download_item(self, download_id: int, url: str, download_video: bool, download_audio: bool):
+    def add_download_item(self, download_id: int, url: str, download_video: bool, download_audio: bool,
+                          clip: bool = False):
         """Add a new download item to the UI with modern styling."""
         # Create download item container with rounded corners effect
         download_frame = tk.Frame(self.downloads_frame, 
@@ -217,6 +433,8 @@ class SimpleWebVideoDownloader:
         else:
             type_icon = "🎵"
             type_text = "Audio Only"
+        if clip:
+            type_text += ", clip"
             
         title_label = tk.Label(title_frame, 
                               text=f"{type_icon} Download #{download_id} ({type_text})",
@@ -291,6 +509,14 @@ class SimpleWebVideoDownloader:
                                    bg='#1e293b')
         percentage_label.pack(side=tk.LEFT)
         
+        # Recent speed of this download, drawn by update_stats
+        speed_label = tk.Label(info_frame,
+                              text="",
+                              font='TkFixedFont',
+                              fg='#94a3b8',
+                              bg='#1e293b')
+        speed_label.pack(side=tk.LEFT, padx=(8, 0))
+        
         eta_label = tk.Label(info_frame,
                             text="",
                             font=('Arial', 9),
@@ -310,21 +536,24 @@ class SimpleWebVideoDownloader:
             'progress_var': progress_var,
             'progress_fill': progress_fill,
             'percentage_label': percentage_label,
+            'speed_label': speed_label,
             'eta_label': eta_label,
             'cancel_button': cancel_button,
             'start_time': time.time(),
             'status': 'starting',
-            'cancelled': False,  # Add cancellation flag
-            'thread': None  # Will store thread reference
+            'cancelled': False  # Add cancellation flag
         }
         
         self.active_downloads.append(download_info)
+        self.downloads_by_id[download_id] = download_info
         return download_info
         
     def remove_download_item(self, download_info: Dict[str, Any]):
         """Remove a download item from the UI."""
         if download_info in self.active_downloads:
             self.active_downloads.remove(download_info)
+            self.downloads_by_id.pop(download_info['id'], None)
+            self.queued_keys.pop(download_info.get('queue_key'), None)
             download_info['frame'].destroy()
             # No need to reorder since we're using pack layout
             
@@ -375,185 +604,109 @@ class SimpleWebVideoDownloader:
             download_info['title_label'].config(fg='#e8e8e8')
         
         # Update overall status with emoji
-        active_count = len([d for d in self.active_downloads if d['status'] in ['starting', 'downloading', 'post-processing']])
+        active_count = self.engine.active_count()
         if active_count > 0:
             self.status_text.set(f"🔄 Active downloads: {active_count}")
         else:
             self.status_text.set("✨ Ready")
         
-    def create_progress_hook(self, download_info: Dict[str, Any]):
-        """Create a progress hook for yt-dlp."""
-        def progress_hook(d):
-            # Check for cancellation
-            if download_info['cancelled']:
-                raise Exception("Download cancelled by user")
-                
-            if d['status'] == 'downloading':
-                if 'total_bytes' in d and d['total_bytes']:
-                    percentage = (d['downloaded_bytes'] / d['total_bytes']) * 100
-                    
-                    # Calculate ETA
-                    if download_info['start_time'] and percentage > 0:
-                        elapsed = time.time() - download_info['start_time']
-                        if percentage > 0:
-                            estimated_total = elapsed / (percentage / 100)
-                            eta = estimated_total - elapsed
-                            eta_text = f"ETA: {self.format_time(eta)}"
-                        else:
-                            eta_text = ""
-                    else:
-                        eta_text = ""
-                    
-                    self.root.after(0, lambda: self.update_download_progress(download_info, percentage, "Downloading...", eta_text))
-                elif 'downloaded_bytes' in d:
-                    self.root.after(0, lambda: self.update_download_progress(download_info, 0, "Downloading..."))
-            elif d['status'] == 'finished':
-                self.root.after(0, lambda: self.update_download_progress(download_info, 100, "Post-processing..."))
-            elif d['status'] == 'error':
-                self.root.after(0, lambda: self.update_download_progress(download_info, 0, "Error occurred"))
-                
-        return progress_hook
-        
     def on_download_complete(self, download_info: Dict[str, Any]):
         """Called when download completes successfully."""
         self.root.after(0, lambda: self.update_download_progress(download_info, 100, "Finished"))
         
         # Enable open folder button if no active downloads
-        active_count = len([d for d in self.active_downloads if d['status'] in ['starting', 'downloading', 'post-processing']])
-        if active_count == 0:
+        if self.engine.active_count() == 0:
             self.root.after(0, lambda: self.open_folder_button.config(state="normal"))
         
         # Remove the download item after a delay
         self.root.after(3000, lambda: self.remove_download_item(download_info))
         
-    def on_download_error(self, error, download_info: Dict[str, Any]):
-        """Called when download fails."""
-        self.root.after(0, lambda: self.update_download_progress(download_info, 0, "Error"))
-        self.root.after(0, lambda: messagebox.showerror("Download Failed", f"Download #{download_info['id']} failed: {str(error)}"))
-        
-        # Remove the download item after a delay
-        self.root.after(3000, lambda: self.remove_download_item(download_info))
-        
-    def run_download(self, url: str, path: str, download_video: bool, download_audio: bool, download_info: Dict[str, Any]):
-        """Run the actual download in a separate thread."""
-        try:
-            # Check for cancellation at the start
-            if download_info['cancelled']:
-                return
-                
-            # Get video info first
-            info_ydl = yt_dlp.YoutubeDL({'quiet': True})
-            info = info_ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown') if info else 'Unknown'
-            
-            # Check for cancellation after getting info
-            if download_info['cancelled']:
-                return
-            
-            # Create subfolder if downloading both video and audio
-            if download_video and download_audio:
-                safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                download_path = os.path.join(path, safe_title)
-                os.makedirs(download_path, exist_ok=True)
-            else:
-                download_path = path
-            
-            # Download video if requested
-            if download_video and not download_info['cancelled']:
-                self.download_video_only(url, download_path, download_info)
-            
-            # Download audio if requested
-            if download_audio and not download_info['cancelled']:
-                self.download_audio_only(url, download_path, download_info)
-                
-            if not download_info['cancelled']:
-                self.on_download_complete(download_info)
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "cancelled by user" in error_msg.lower():
-                # Don't show error for user cancellation
-                return
-            self.on_download_error(error_msg, download_info)
-    
-    def download_video_only(self, url: str, path: str, download_info: Dict[str, Any]):
-        """Download highest quality video only."""
-        # Check for cancellation
-        if download_info['cancelled']:
-            return
-            
-        ydl_opts = {
-            'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),
-            'progress_hooks': [self.create_progress_hook(download_info)],
-            'format': 'bestvideo',  # Get best video quality (any format)
-        }
-        
-        # Set FFmpeg path if available
-        ffmpeg_found = False
-        if getattr(sys, 'frozen', False):
-            bundle_dir = os.path.dirname(os.path.dirname(os.path.dirname(sys.executable)))
-            ffmpeg_path = os.path.join(bundle_dir, 'Contents', 'Frameworks', 'ffmpeg')
-            if os.path.exists(ffmpeg_path) and os.access(ffmpeg_path, os.X_OK):
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
-                ffmpeg_found = True
-                print(f"USING BUNDLED FFMPEG: {ffmpeg_path}")
-            else:
-                print(f"BUNDLED FFMPEG NOT FOUND OR NOT EXECUTABLE: {ffmpeg_path}")
-        else:
-            try:
-                result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=5)
-                if result.returncode == 0:
-                    ffmpeg_found = True
-                    print("SYSTEM FFMPEG FOUND")
-            except:
-                pass
-        
-        # If FFmpeg is available, add post-processor to convert to MP4
-        if ffmpeg_found:
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': 'mp4',
-            }]
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-    
-    def download_audio_only(self, url: str, path: str, download_info: Dict[str, Any]):
-        """Download highest quality audio only."""
-        # Check for cancellation
-        if download_info['cancelled']:
+    def on_download_error(self, summary: str, download_info: Dict[str, Any]):
+        """Called when download fails after its retries are used up."""
+        # No dialog: a batch keeps running and the failed item stays listed with retry and dismiss buttons
+        summary = summary[:77] + "..." if len(summary) > 80 else summary
+        self.update_download_progress(download_info, 0, "Error", summary)
+        cancel_button = download_info['cancel_button']
+        cancel_button.config(text="↻", bg='#6366f1', activebackground='#4f46e5', state="normal",
+                             command=lambda: self.retry_download(download_info))
+        dismiss_button = tk.Button(cancel_button.master,
+                                   text="✕",
+                                   font=('Arial', 10),
+                                   bg='#6b7280',
+                                   fg='white',
+                                   relief=tk.FLAT,
+                                   bd=0,
+                                   width=3,
+                                   command=lambda: self.remove_download_item(download_info),
+                                   activebackground='#4b5563',
+                                   activeforeground='white')
+        # Rightmost, where the cancel button was
+        dismiss_button.pack(side=tk.RIGHT, padx=(8, 0), before=cancel_button)
+        
+    def retry_download(self, download_info: Dict[str, Any]):
+        """Queue a failed download again from scratch."""
+        self.remove_download_item(download_info)
+        self.enqueue_download(download_info['url'], download_info['folder'],
+                              download_info['download_video'], download_info['download_audio'], download_info['clip'])
+        
+    def on_download_cancelled(self, download_info: Dict[str, Any], latency: Optional[float]):
+        """Called once a cancelled download has actually stopped."""
+        latency_text = f"Stopped in {latency:.1f}s" if latency is not None else ""
+        self.update_download_progress(download_info, 0, "Cancelled", latency_text)
+        
+        # Remove the download item after a short delay
+        self.root.after(2000, lambda: self.remove_download_item(download_info))
+        
+    def video_format_key(self) -> str:
+        """Store key for the video output this app produces."""
+        return 'video-mp4' if self.ffmpeg_available else 'video-original'
+        
+    def on_engine_event(self, event: Event):
+        """Receive an engine event from a worker thread and hand it to the Tk thread."""
+        self.root.after(0, lambda: self.handle_engine_event(event))
+        
+    def handle_engine_event(self, event: Event):
+        """Apply an engine event to its download item."""
+        self.stats.on_event(event)
+        download_info = self.downloads_by_id.get(event['id'])
+        if download_info is None:
             return
-            
-        ydl_opts = {
-            'outtmpl': os.path.join(path, '%(title)s.%(ext)s'),
-            'progress_hooks': [self.create_progress_hook(download_info)],
-            'format': 'bestaudio',  # Get best audio quality
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'm4a',
-                'preferredquality': '192',
-            }],
-        }
-        
-        # Set FFmpeg path if available
-        if getattr(sys, 'frozen', False):
-            bundle_dir = os.path.dirname(os.path.dirname(os.path.dirname(sys.executable)))
-            ffmpeg_path = os.path.join(bundle_dir, 'Contents', 'Frameworks', 'ffmpeg')
-            if os.path.exists(ffmpeg_path) and os.access(ffmpeg_path, os.X_OK):
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
-                print(f"USING BUNDLED FFMPEG: {ffmpeg_path}")
-            else:
-                print(f"BUNDLED FFMPEG NOT FOUND OR NOT EXECUTABLE: {ffmpeg_path}")
-        else:
-            try:
-                result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=5)
-                if result.returncode == 0:
-                    print("SYSTEM FFMPEG FOUND")
-            except:
-                pass
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        if event['type'] in TERMINAL_EVENTS:
+            # The same job may be queued again as soon as this one has ended
+            self.queued_keys.pop(download_info.get('queue_key'), None)
+            download_info['speed_label'].config(text="")
+        if event['type'] == 'progress':
+            eta_text = f"ETA: {self.format_time(event['eta'])}" if event['eta'] is not None else ""
+            self.update_download_progress(download_info, event['percentage'], event['status'], eta_text)
+        elif event['type'] == 'complete':
+            self.on_download_complete(download_info)
+        elif event['type'] == 'held':
+            self.update_download_progress(download_info, 0, "Waiting", event['message'])
+        elif event['type'] == 'retry':
+            download_info['eta_label'].config(text=f"Retrying in {event['delay']:.0f}s (attempt {event['attempt']})")
+        elif event['type'] == 'error':
+            self.on_download_error(event.get('summary', event['error']), download_info)
+        elif event['type'] == 'cancelled':
+            self.on_download_cancelled(download_info, event.get('latency'))
+        
+    def update_stats(self):
+        """Sample throughput and redraw the stats panel and each download's speed line."""
+        self.stats.tick()
+        summary = self.stats.summary()
+        lines = [f"⬇️ {format_bytes(summary['speed'])}/s {sparkline(self.stats.speed.values())}"]
+        queue_eta = self.engine.queue_eta()
+        if queue_eta is not None and self.engine.active_count():
+            lines[0] += f" · queue done in {self.format_time(queue_eta)}"
+        load = f"CPU {summary['cpu_load'] * 100:.0f}%" if summary['cpu_load'] is not None else "CPU n/a"
+        lines.append(f"{summary['jobs_per_minute']:.1f} jobs/min · {summary['downloading']} downloading · "
+                     f"{summary['post_processing']} post-processing · {summary['held']} waiting for disk · {load}")
+        self.stats_text.set("\n".join(lines) if self.active_downloads or summary['jobs_per_minute'] else "")
+        for download_info in self.active_downloads:
+            ring = self.stats.job_speeds.get(download_info['id'])
+            if ring is not None:
+                download_info['speed_label'].config(
+                    text=f"{self.stats.job_sparkline(download_info['id'])} {format_bytes(ring.last())}/s")
+        self.root.after(STATS_INTERVAL_MS, self.update_stats)
         
     def start_download(self):
         """Start the download process."""
@@ -569,27 +722,60 @@ class SimpleWebVideoDownloader:
         if not download_video and not download_audio:
             messagebox.showerror("Invalid Selection", "Please select at least video or audio to download.")
             return
+        clip = self.clip_options()
+        if clip is None:
+            return
             
-        # Increment download counter
-        self.download_counter += 1
-        
-        # Clear the URL field
+        # Clear the URL and clip fields
         self.url.set("")
+        self.clip.set("")
         
+        if not self.enqueue_download(url, path, download_video, download_audio, clip):
+            self.status_text.set("⏭️ Already queued")
+            
+    def clip_options(self) -> Optional[Dict[str, Any]]:
+        """Job options for the clip field ({} when empty), or None after reporting a mistake."""
+        try:
+            ranges, chapters = parse_clip(self.clip.get())
+        except ClipError as e:
+            messagebox.showerror("Invalid Clip", str(e))
+            return None
+        return {'clip_ranges': ranges, 'clip_chapters': chapters} if ranges or chapters else {}
+
+    def enqueue_download(self, url: str, path: str, download_video: bool, download_audio: bool,
+                         clip: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue one download unless the same job is already queued or running."""
+        clip = clip or {}
+        queue_key = (canonical_key(url), os.path.abspath(path), download_video, download_audio, repr(clip))
+        if queue_key in self.queued_keys:
+            return False
+            
         # Disable open folder button while downloading
         self.open_folder_button.config(state="disabled")
         
-        # Create download info and start download
-        download_info = self.add_download_item(self.download_counter, url, download_video, download_audio)
-        
-        # Start download in background thread
-        download_thread = threading.Thread(
-            target=self.run_download,
-            args=(url, path, download_video, download_audio, download_info),
-            daemon=True
+        # Hand over prefetched info so the job skips extraction
+        prefetched = self.get_prefetched(url)
+        self.prefetched.pop(url, None)
+        
+        # Read the Tk variables here on the main thread; they are not thread-safe
+        self.engine.configure({**self.settings, 'execution_mode': self.execution_mode.get(),
+                               'use_content_store': self.use_content_store.get()})
+        download_id = self.engine.submit(
+            url, path, download_video, download_audio,
+            video_format_key=self.video_format_key(),
+            ffmpeg_location=self.ffmpeg_location,
+            ffmpeg_available=self.ffmpeg_available,
+            info=prefetched['info'] if prefetched else None,
+            **clip,
         )
-        download_info['thread'] = download_thread  # Store thread reference
-        download_thread.start()
+        self.queued_keys[queue_key] = download_id
+        
+        # Events are handled on this thread too, so the item exists before the first one arrives
+        download_info = self.add_download_item(download_id, url, download_video, download_audio, bool(clip))
+        download_info['queue_key'] = queue_key
+        download_info['folder'] = path
+        download_info['clip'] = clip
+        return True
         
     def open_folder(self):
         """Open the download folder in Finder."""
@@ -601,26 +787,56 @@ class SimpleWebVideoDownloader:
                 messagebox.showerror("Error", f"Could not open folder: {e}")
                 
     def load_config(self):
-        """Load configuration from file."""
+        """Load settings from the shared config file and apply them."""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    if 'download_folder' in config:
-                        self.folder_path.set(config['download_folder'])
-        except Exception as e:
-            print(f"Error loading config: {e}")
-            
-    def save_config(self):
-        """Save configuration to file."""
+            self.config_mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            self.config_mtime = None
+        self.settings, problems = load_settings(self.config_file)
+        for problem in problems:
+            print(f"Error loading config: {problem}")
+        if self.settings['download_folder']:
+            self.folder_path.set(self.settings['download_folder'])
+        self.use_content_store.set(self.settings['use_content_store'])
+        self.execution_mode.set(self.settings['execution_mode'])
+        self.profile.set(self.settings['profile'] or 'none')
+        return problems
+        
+    def watch_config(self):
+        """Reload settings when the config file changes. Jobs already queued keep their settings."""
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            mtime = None
+        if mtime != self.config_mtime:
+            problems = self.load_config()
+            if problems:
+                self.status_text.set(f"⚠️ Settings reloaded with problems: {problems[0]}")
+            else:
+                self.status_text.set("🔄 Settings reloaded")
+        self.root.after(CONFIG_POLL_MS, self.watch_config)
+        
+    def save_config(self, key: str):
+        """Save one setting changed in the UI, leaving the rest of the config file as it is."""
+        values = {
+            'download_folder': self.folder_path.get,
+            'use_content_store': self.use_content_store.get,
+            'execution_mode': self.execution_mode.get,
+            'profile': lambda: None if self.profile.get() == 'none' else self.profile.get(),
+        }
         try:
-            config = {
-                'download_folder': self.folder_path.get()
-            }
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f)
+            save_settings({key: values[key]()}, self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
+        if key == 'profile':
+            # Values the profile sets still apply under any saved in the file
+            self.load_config()
+        else:
+            self.settings[key] = values[key]()
+        try:
+            self.config_mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            pass
             
     def setup_modern_theme(self):
         """Setup modern purple theme with custom styling."""
@@ -675,6 +891,18 @@ class SimpleWebVideoDownloader:
         """Start the application."""
         self.root.mainloop()
 
+    def find_bundled_ffmpeg(self):
+        """Return the FFmpeg bundled with the packaged app, or None."""
+        if not getattr(sys, 'frozen', False):
+            return None
+        bundle_dir = os.path.dirname(os.path.dirname(os.path.dirname(sys.executable)))
+        ffmpeg_path = os.path.join(bundle_dir, 'Contents', 'Frameworks', 'ffmpeg')
+        if os.path.exists(ffmpeg_path) and os.access(ffmpeg_path, os.X_OK):
+            print(f"USING BUNDLED FFMPEG: {ffmpeg_path}")
+            return ffmpeg_path
+        print(f"BUNDLED FFMPEG NOT FOUND OR NOT EXECUTABLE: {ffmpeg_path}")
+        return None
+
     def check_ffmpeg(self):
         """Check if FFmpeg is available on the system."""
         try:
@@ -724,20 +952,21 @@ Audio-only downloads may still work without FFmpeg."""
         """Cancel a download."""
         for download_info in self.active_downloads:
             if download_info['id'] == download_id:
-                # Set cancellation flag
+                # Set cancellation flag and tell the worker running the job
                 download_info['cancelled'] = True
+                self.queued_keys.pop(download_info.get('queue_key'), None)
+                self.engine.cancel(download_id)
                 
-                # Update UI immediately
+                # Update UI immediately; the item is removed once the job reports it stopped
                 self.update_download_progress(download_info, 0, "Cancelling...")
                 download_info['cancel_button'].config(state="disabled", bg='#6b7280')
-                
-                # Schedule removal after a short delay
-                self.root.after(2000, lambda: self.remove_download_item(download_info))
                 break
 
 
 def main():
     """Main entry point."""
+    # Needed for process-mode workers in the packaged app
+    multiprocessing.freeze_support()
     try:
         app = SimpleWebVideoDownloader()
         app.run()
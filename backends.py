@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Execution backends behind DownloadEngine.
+Jobs run in a thread pool, or in a process pool to escape the GIL; either
+way each reports its events (see jobs.py) back to the backend's owner.
+"""
+
+import time
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from cancellation import CancelToken, watch_flag
+from disk_space import AdmissionQueue, DiskAdmission
+from host_limits import get_host_limits, set_host_limits
+from jobs import Event, TERMINAL_EVENTS, execute_job, resolve_job_info, run_job
+
+
+EXECUTION_MODES = ('thread', 'process')
+DEFAULT_MAX_WORKERS = 4
+
+# Shared-memory cancellation flags for process workers, indexed by job ID
+CANCEL_SLOTS = 65536
+
+
+class _Backend:
+    """Shared bookkeeping for execution backends.
+
+    With a DiskAdmission, submitted jobs wait in an AdmissionQueue until
+    their estimated size fits on the destination volume.
+    """
+
+    def __init__(self, on_event: Callable, runner: Callable, admission: Optional[DiskAdmission] = None):
+        self.on_event = on_event
+        self.runner = runner
+        self._cancel_requested: Dict[int, float] = {}
+        self._admission = AdmissionQueue(admission, self._dispatch, self._deliver, resolve_job_info) \
+            if admission else None
+
+    def _deliver(self, event: Event):
+        if event['type'] in TERMINAL_EVENTS and self._admission:
+            self._admission.release(event['id'])
+        if event['type'] == 'cancelled':
+            # How long the job took to stop after cancel() was called
+            requested = self._cancel_requested.pop(event['id'], None)
+            if requested is not None:
+                event['latency'] = time.perf_counter() - requested
+        self.on_event(event)
+
+    def _dispatch(self, job: Dict[str, Any]):
+        raise NotImplementedError
+
+    def submit(self, job: Dict[str, Any]):
+        if self._admission:
+            self._admission.submit(job)
+        else:
+            self._dispatch(job)
+
+    def cancel(self, job_id: int):
+        self._cancel_requested.setdefault(job_id, time.perf_counter())
+        if self._admission:
+            self._admission.cancel(job_id)
+
+    def _close_admission(self, wait: bool):
+        if self._admission:
+            self._admission.close(wait)
+
+
+class ThreadBackend(_Backend):
+    """Runs jobs on a bounded pool of threads inside this process."""
+
+    mode = 'thread'
+
+    def __init__(self, max_workers: int, on_event: Callable, runner: Callable = run_job,
+                 admission: Optional[DiskAdmission] = None):
+        super().__init__(on_event, runner, admission)
+        self._tokens: Dict[int, CancelToken] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+
+    def _run(self, job: Dict[str, Any], token: CancelToken):
+        try:
+            execute_job(job, self._deliver, token, self.runner)
+        finally:
+            self._tokens.pop(job['id'], None)
+
+    def _dispatch(self, job: Dict[str, Any]):
+        token = CancelToken()
+        self._tokens[job['id']] = token
+        self.executor.submit(self._run, job, token)
+
+    def cancel(self, job_id: int):
+        super().cancel(job_id)
+        token = self._tokens.get(job_id)
+        if token is not None:
+            token.cancel()
+
+    def shutdown(self, wait: bool = False):
+        self._close_admission(wait)
+        self.executor.shutdown(wait=wait)
+
+
+# Set in each worker process by _init_process_worker
+_worker_events = None
+_worker_cancel_flags = None
+
+
+def _init_process_worker(events, cancel_flags, host_limits):
+    global _worker_events, _worker_cancel_flags
+    _worker_events = events
+    _worker_cancel_flags = cancel_flags
+    # Requests from every worker count against the same per-host limits
+    set_host_limits(host_limits)
+    # The parent handles Ctrl+C and cancels jobs itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_in_process(job: Dict[str, Any], runner: Callable):
+    flags = _worker_cancel_flags
+    slot = job['id'] % CANCEL_SLOTS
+    token = CancelToken()
+    stop = threading.Event()
+    watch_flag(token, lambda: flags[slot] != 0, stop)
+    try:
+        execute_job(job, _worker_events.put, token, runner)
+    finally:
+        stop.set()
+
+
+class ProcessBackend(_Backend):
+    """Runs jobs in a pool of worker processes.
+
+    Events come back over a multiprocessing queue (a pipe) and are delivered
+    to on_event from a pump thread. Cancellation flags live in shared memory;
+    a watcher thread in the worker turns a set flag into a token cancel.
+    """
+
+    mode = 'process'
+
+    def __init__(self, max_workers: int, on_event: Callable, runner: Callable = run_job,
+                 admission: Optional[DiskAdmission] = None):
+        super().__init__(on_event, runner, admission)
+        context = multiprocessing.get_context('spawn')
+        self._events = context.Queue()
+        self._cancel_flags = context.RawArray('b', CANCEL_SLOTS)
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_process_worker,
+            initargs=(self._events, self._cancel_flags, get_host_limits()),
+        )
+        self._pump = threading.Thread(target=self._pump_events, daemon=True)
+        self._pump.start()
+
+    def _pump_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            self._deliver(event)
+
+    def _check_worker(self, job_id: int, future):
+        # Jobs report their own errors; this only catches a worker that died
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            message = f"Worker process failed: {error}"
+            self._deliver({'id': job_id, 'type': 'error', 'error': message, 'kind': 'unknown', 'summary': message})
+
+    def _dispatch(self, job: Dict[str, Any]):
+        job_id = job['id']
+        self._cancel_flags[job_id % CANCEL_SLOTS] = 0
+        future = self.executor.submit(_run_in_process, job, self.runner)
+        future.add_done_callback(lambda f: self._check_worker(job_id, f))
+
+    def cancel(self, job_id: int):
+        super().cancel(job_id)
+        self._cancel_flags[job_id % CANCEL_SLOTS] = 1
+
+    def shutdown(self, wait: bool = False):
+        self._close_admission(wait)
+        self.executor.shutdown(wait=wait)
+        if wait:
+            # Workers have exited and flushed their events; stop the pump
+            self._events.put(None)
+            self._pump.join()
+
+
+def create_backend(mode: str, max_workers: int, on_event: Callable, runner: Callable = run_job,
+                   admission: Optional[DiskAdmission] = None):
+    """Create the execution backend for a mode in EXECUTION_MODES."""
+    if mode == 'process':
+        return ProcessBackend(max_workers, on_event, runner, admission)
+    if mode == 'thread':
+        return ThreadBackend(max_workers, on_event, runner, admission)
+    raise ValueError(f"Unknown execution mode: {mode}")
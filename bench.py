@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the DownBad download engine.
+Synthetic jobs are used so results do not depend on the network.
+
+Usage:
+    python bench.py executors [--jobs N] [--concurrency 1 4 16]
+    python bench.py cancel [--jobs N] [--after SECONDS]
+    python bench.py session [--jobs N] [--size BYTES]
+    python bench.py memory [--jobs N] [--formats N] [--history N]
+    python bench.py resolve [--urls N] [--per-host 4 8 16 32] [--latency SECONDS]
+"""
+
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from backends import create_backend, EXECUTION_MODES
+from cancellation import CancelToken, interrupt_response
+from engine import DownloadEngine
+from host_limits import DEFAULT_MAX_CONNECTIONS
+from jobs import new_job, progress_event, run_job, TERMINAL_EVENTS
+from metadata_resolver import MetadataResolver
+from settings import resolve_settings
+
+
+def synthetic_job(job, report, token):
+    """Simulate a download: GIL-bound Python work interleaved with network waits."""
+    for chunk in range(job['chunks']):
+        token.raise_if_cancelled()
+        # Pure-Python work holds the GIL, like extraction, JS solving and hooks
+        total = 0
+        for i in range(job['work']):
+            total += i * i
+        time.sleep(job['io'])
+        report(progress_event(job['id'], (chunk + 1) / job['chunks'] * 100, "Downloading..."))
+    return {'title': f"Synthetic #{job['id']}", 'download_path': '', 'files': []}
+
+
+def stalled_job(job, report, token):
+    """Simulate a download stuck in a socket read that never returns data."""
+    reader, writer = socket.socketpair()
+    unregister = token.add_callback(lambda: interrupt_response(reader))
+    try:
+        report(progress_event(job['id'], 0, "Downloading..."))
+        reader.recv(1)  # Blocks until the token shuts the socket down
+        token.raise_if_cancelled()
+    finally:
+        unregister()
+        reader.close()
+        writer.close()
+    return {'title': f"Stalled #{job['id']}", 'download_path': '', 'files': []}
+
+
+def heavy_info(job_id: int, formats: int):
+    """An info dict shaped like a long YouTube video's: many formats with long URLs and headers."""
+    return {
+        'id': f"vid{job_id:08d}",
+        'extractor_key': 'Youtube',
+        'title': f"Synthetic video #{job_id}",
+        'duration': 3600,
+        'formats': [{
+            'format_id': str(i),
+            'url': f"https://cdn.example.com/videoplayback?id={job_id}&itag={i}&sig=" + 'x' * 200,
+            'ext': 'mp4',
+            'vcodec': 'avc1.640028',
+            'acodec': 'none',
+            'tbr': 1000.0 + i,
+            'filesize': 100_000_000 + i,
+            'http_headers': {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*', 'Accept-Language': 'en-us,en;q=0.5'},
+        } for i in range(formats)],
+    }
+
+
+def info_job(job, report, token):
+    """Simulate a job that reads its pre-resolved info and lets go of it, as run_job does."""
+    info, job['info'] = job['info'], None
+    token.raise_if_cancelled()
+    report({'id': job['id'], 'type': 'info', 'title': info['title']})
+    report(progress_event(job['id'], 100, "Post-processing..."))
+    return {'title': info['title'], 'download_path': job['folder'],
+            'files': [f"{job['folder']}/{info['title']}.mp4"]}
+
+
+class LatencyProbe:
+    """Measures how late a 10ms timer fires in this process, a proxy for Tk responsiveness."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            time.sleep(self.interval)
+            self.lags.append(time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def bench_executor(mode: str, concurrency: int, jobs: int, work: int, chunks: int, io: float):
+    """Run synthetic jobs on one backend and return timing results."""
+    remaining = [0]
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_event(event):
+        if event['type'] in ('complete', 'error', 'cancelled'):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+    def run_batch(first_id, count, **options):
+        remaining[0] = count
+        done.clear()
+        for job_id in range(first_id, first_id + count):
+            backend.submit(new_job(job_id, '', '', True, False, **options))
+        done.wait()
+
+    # Warm up: start every worker before timing so startup is reported separately
+    start = time.perf_counter()
+    backend = create_backend(mode, concurrency, on_event, runner=synthetic_job)
+    run_batch(1, concurrency, work=0, chunks=1, io=0.2)
+    startup = time.perf_counter() - start - 0.2
+
+    probe = LatencyProbe()
+    probe.start()
+    start = time.perf_counter()
+    run_batch(concurrency + 1, jobs, work=work, chunks=chunks, io=io)
+    elapsed = time.perf_counter() - start
+    probe.stop()
+    backend.shutdown(wait=True)
+
+    lags = probe.lags or [0.0]
+    return {
+        'startup': startup,
+        'elapsed': elapsed,
+        'jobs_per_second': jobs / elapsed,
+        'lag_avg_ms': sum(lags) / len(lags) * 1000,
+        'lag_max_ms': max(lags) * 1000,
+    }
+
+
+def cmd_executors(args):
+    print(f"{args.jobs} synthetic jobs x {args.chunks} chunks "
+          f"({args.work} loop iterations + {args.io * 1000:.0f}ms wait per chunk)")
+    print(f"{'mode':<8} {'workers':>7} {'startup':>8} {'wall s':>8} {'jobs/s':>8} {'lag avg':>9} {'lag max':>9}")
+    for concurrency in args.concurrency:
+        for mode in EXECUTION_MODES:
+            result = bench_executor(mode, concurrency, args.jobs, args.work, args.chunks, args.io)
+            print(f"{mode:<8} {concurrency:>7} {result['startup']:>7.2f}s {result['elapsed']:>8.2f} {result['jobs_per_second']:>8.2f} "
+                  f"{result['lag_avg_ms']:>7.1f}ms {result['lag_max_ms']:>7.1f}ms")
+            sys.stdout.flush()
+
+
+def bench_cancel(mode: str, jobs: int, after: float):
+    """Cancel jobs blocked in socket reads and return the cancel-to-stopped latencies."""
+    started = threading.Semaphore(0)
+    latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_event(event):
+        if event['type'] == 'progress':
+            started.release()
+        elif event['type'] in ('complete', 'error', 'cancelled'):
+            with lock:
+                latencies.append(event.get('latency'))
+                if len(latencies) == jobs:
+                    done.set()
+
+    backend = create_backend(mode, jobs, on_event, runner=stalled_job)
+    for job_id in range(1, jobs + 1):
+        backend.submit(new_job(job_id, '', '', True, False))
+    for _ in range(jobs):
+        started.acquire()
+    time.sleep(after)
+    for job_id in range(1, jobs + 1):
+        backend.cancel(job_id)
+    done.wait()
+    backend.shutdown(wait=True)
+    return [latency for latency in latencies if latency is not None]
+
+
+def cmd_cancel(args):
+    print(f"{args.jobs} jobs blocked in socket reads, cancelled after {args.after:.1f}s")
+    print(f"{'mode':<8} {'stopped':>7} {'avg':>9} {'max':>9}")
+    for mode in EXECUTION_MODES:
+        latencies = bench_cancel(mode, args.jobs, args.after) or [0.0]
+        print(f"{mode:<8} {len(latencies):>7} {sum(latencies) / len(latencies) * 1000:>7.1f}ms "
+              f"{max(latencies) * 1000:>7.1f}ms")
+        sys.stdout.flush()
+
+
+class MediaServer(ThreadingHTTPServer):
+    """Local keep-alive HTTP server that serves the same bytes at every path and counts connections."""
+
+    daemon_threads = True
+
+    def __init__(self, size: int):
+        self.body = b'\0' * size
+        self.connections = 0
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):
+                server.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Length', str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def do_HEAD(self):
+                server.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Length', str(len(server.body)))
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def handle_error(self, request, client_address):
+        pass  # Clients reset connections whose body they didn't read
+
+
+def bench_session(use_session: bool, jobs: int, size: int):
+    """Run real jobs one after another against a local server and return per-job timings."""
+    server = MediaServer(size)
+    folder = tempfile.mkdtemp(prefix='downbad-bench-')
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    times = []
+    try:
+        for job_id in range(1, jobs + 1):
+            job = new_job(job_id, f"{url}/clip-{job_id}.mp4", folder, True, False, video_format='best',
+                          convert_video=False, use_session=use_session, extra_opts={'quiet': True, 'noprogress': True})
+            start = time.perf_counter()
+            run_job(job, lambda event: None, CancelToken())
+            times.append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(folder, ignore_errors=True)
+    return {
+        'first_ms': times[0] * 1000,
+        'avg_ms': sum(times[1:] or times) / len(times[1:] or times) * 1000,
+        'connections': server.connections,
+        'requests': server.requests,
+    }
+
+
+def cmd_session(args):
+    print(f"{args.jobs} sequential jobs, {args.size} bytes each, from a local keep-alive server")
+    print(f"{'session':<8} {'first':>9} {'avg rest':>9} {'conns':>6} {'reqs':>6}")
+    for use_session in (False, True):
+        result = bench_session(use_session, args.jobs, args.size)
+        print(f"{'on' if use_session else 'off':<8} {result['first_ms']:>7.1f}ms {result['avg_ms']:>7.1f}ms "
+              f"{result['connections']:>6} {result['requests']:>6}")
+        sys.stdout.flush()
+
+
+def bench_memory(jobs: int, formats: int, history: int, checkpoints: int = 10):
+    """Push jobs with heavy info dicts through a DownloadEngine and sample the memory it keeps."""
+    settings, _ = resolve_settings({'check_disk_space': False, 'history_size': history, 'use_session': False})
+    finished = threading.Semaphore(0)
+
+    def on_event(event):
+        if event['type'] in TERMINAL_EVENTS:
+            finished.release()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    engine = DownloadEngine(settings, runner=info_job)
+    engine.subscribe(on_event)
+    batch = max(jobs // checkpoints, 1)
+    samples = []
+    submitted = 0
+    while submitted < jobs:
+        count = min(batch, jobs - submitted)
+        for _ in range(count):
+            submitted += 1
+            engine.submit('', '/tmp', True, False, info=heavy_info(submitted, formats))
+        for _ in range(count):
+            finished.acquire()
+        current, peak = tracemalloc.get_traced_memory()
+        samples.append((submitted, current - baseline, peak - baseline, len(engine.jobs())))
+    engine.shutdown(wait=True)
+    tracemalloc.stop()
+    return samples
+
+
+def cmd_memory(args):
+    info_size = len(repr(heavy_info(0, args.formats)))
+    print(f"{args.jobs} synthetic jobs, {args.formats} formats each (~{info_size / 1024:.0f} KB of info per job)")
+    for history in (args.history, args.jobs):
+        print(f"history_size = {history}")
+        print(f"{'jobs':>7} {'retained':>10} {'peak':>10} {'records':>8}")
+        for done, retained, peak, records in bench_memory(args.jobs, args.formats, history):
+            print(f"{done:>7} {retained / 1024 ** 2:>8.1f}MB {peak / 1024 ** 2:>8.1f}MB {records:>8}")
+            sys.stdout.flush()
+
+
+class VideoPageServer(ThreadingHTTPServer):
+    """Local server shaped like a video site: a watch page, then a manifest it links to, each after a delay.
+
+    The page is padded to page_size bytes so extraction has parsing work to
+    do, like a real watch page. Counts the most requests served at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float, page_size: int):
+        self.active = 0
+        self.peak = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                with lock:
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                time.sleep(latency)
+                with lock:
+                    server.active -= 1
+                if self.path.endswith('.m3u8'):
+                    body = ("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720\nhi.m3u8\n"
+                            "#EXT-X-STREAM-INF:BANDWIDTH=500000,RESOLUTION=640x360\nlo.m3u8\n").encode()
+                    content_type = 'application/vnd.apple.mpegurl'
+                else:
+                    page = (f'<html><head><title>Video {self.path}</title></head><body>'
+                            f'<video src="{self.path}/master.m3u8"></video>')
+                    padding = '<div class="comment">' + 'x' * 200 + '</div>'
+                    body = (page + padding * max((page_size - len(page)) // len(padding), 0) + '</body></html>').encode()
+                    content_type = 'text/html'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def bench_resolve(urls: int, per_host: int, host_max_connections: int, latency: float, page_size: int):
+    """Resolve urls pages from one host and return the wall time and the most requests served at once."""
+    server = VideoPageServer(latency, page_size)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    resolver = MetadataResolver(per_host=per_host, host_max_connections=host_max_connections,
+                                ydl_opts={'no_warnings': True})
+    try:
+        start = time.perf_counter()
+        results = resolver.resolve([f"{base}/watch/{i}" for i in range(urls)])
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        'elapsed': elapsed,
+        'urls_per_second': urls / elapsed,
+        'errors': sum('error' in result for result in results),
+        'peak': server.peak,
+    }
+
+
+def cmd_resolve(args):
+    print(f"{args.urls} URLs on one host, 2 requests each ({args.latency * 1000:.0f}ms latency, "
+          f"{args.page_size // 1024} KB pages)")
+    print(f"{'per host':>8} {'conns':>6} {'wall s':>8} {'URLs/s':>8} {'peak':>5} {'errors':>7}")
+    for per_host in args.per_host:
+        for connections in args.connections:
+            result = bench_resolve(args.urls, per_host, connections, args.latency, args.page_size)
+            print(f"{per_host:>8} {connections or '-':>6} {result['elapsed']:>8.2f} {result['urls_per_second']:>8.1f} "
+                  f"{result['peak']:>5} {result['errors']:>7}")
+            sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DownBad engine benchmarks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    executors = subparsers.add_parser('executors', help="compare thread and process execution modes")
+    executors.add_argument('--jobs', type=int, default=32)
+    executors.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    executors.add_argument('--work', type=int, default=200000, help="loop iterations per chunk")
+    executors.add_argument('--chunks', type=int, default=10)
+    executors.add_argument('--io', type=float, default=0.02, help="seconds of simulated network wait per chunk")
+    executors.set_defaults(func=cmd_executors)
+
+    cancel = subparsers.add_parser('cancel', help="measure how quickly blocked jobs stop after cancel")
+    cancel.add_argument('--jobs', type=int, default=8)
+    cancel.add_argument('--after', type=float, default=0.5, help="seconds to let the jobs block before cancelling")
+    cancel.set_defaults(func=cmd_cancel)
+
+    session = subparsers.add_parser('session', help="compare per-job overhead with and without the shared session")
+    session.add_argument('--jobs', type=int, default=20)
+    session.add_argument('--size', type=int, default=64 * 1024, help="bytes served per download")
+    session.set_defaults(func=cmd_session)
+
+    memory = subparsers.add_parser('memory', help="check that memory stays bounded over many jobs")
+    memory.add_argument('--jobs', type=int, default=10000)
+    memory.add_argument('--formats', type=int, default=300, help="formats in each job's info dict")
+    memory.add_argument('--history', type=int, default=1000, help="finished jobs the engine keeps")
+    memory.set_defaults(func=cmd_memory)
+
+    resolve = subparsers.add_parser('resolve', help="bulk metadata lookup throughput against one host")
+    resolve.add_argument('--urls', type=int, default=500)
+    resolve.add_argument('--per-host', type=int, nargs='+', default=[4, 8, 16, 32])
+    resolve.add_argument('--connections', type=int, nargs='+', default=[DEFAULT_MAX_CONNECTIONS, 0],
+                         help="lookup connection limits to try (0: no limit, like the resolver's default of --per-host)")
+    resolve.add_argument('--latency', type=float, default=0.3, help="seconds before the server answers each request")
+    resolve.add_argument('--page-size', type=int, default=512 * 1024, help="bytes in each watch page")
+    resolve.set_defaults(func=cmd_resolve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
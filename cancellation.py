@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cancellation tokens for download jobs.
+A token is a flag plus callbacks that interrupt blocking work (network
+reads, FFmpeg child processes) the moment the job is cancelled.
+"""
+
+import time
+import socket
+import threading
+from typing import Callable, Optional
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+
+class CancelToken:
+    """Thread-safe cancellation flag with interrupt callbacks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_handle = 0
+        self.cancelled_at: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancelled_at is not None
+
+    def cancel(self):
+        """Mark the token cancelled and run every registered callback once."""
+        with self._lock:
+            if self.cancelled_at is not None:
+                return
+            self.cancelled_at = time.time()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in cancel callback: {e}")
+
+    def add_callback(self, callback: Callable) -> Callable:
+        """Run callback on cancel (immediately if already cancelled). Returns an unregister function."""
+        with self._lock:
+            if self.cancelled_at is None:
+                handle = self._next_handle
+                self._next_handle += 1
+                self._callbacks[handle] = callback
+                return lambda: self._callbacks.pop(handle, None)
+        callback()
+        return lambda: None
+
+    def raise_if_cancelled(self):
+        if self.cancelled_at is not None:
+            raise DownloadCancelled("Download cancelled by user")
+
+
+def watch_flag(token: CancelToken, is_set: Callable, stop: threading.Event, interval: float = 0.05):
+    """Cancel token when is_set() becomes true; polls until stop is set. Runs in its own thread."""
+    def watch():
+        while not stop.wait(interval):
+            if is_set():
+                token.cancel()
+                return
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
+
+
+def _find_socket(response) -> Optional[socket.socket]:
+    """Best-effort lookup of the socket behind a yt-dlp response."""
+    candidates = [response]
+    for _ in range(6):
+        next_candidates = []
+        for obj in candidates:
+            if isinstance(obj, socket.socket):
+                return obj
+            for attr in ('fp', '_fp', 'raw', '_sock', 'sock', '_connection', 'connection'):
+                child = getattr(obj, attr, None)
+                if child is not None and child is not obj:
+                    next_candidates.append(child)
+        candidates = next_candidates
+    return None
+
+
+def interrupt_response(response):
+    """Abort a response another thread may be blocked reading from."""
+    sock = _find_socket(response)
+    if sock is not None:
+        try:
+            # shutdown() wakes a blocked recv(); close() alone does not
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Clip downloads: only the requested time ranges and chapters of a video.
+yt-dlp hands each section to FFmpeg, which seeks with HTTP range requests
+in progressive formats and opens only the fragments covering the range in
+HLS/DASH formats, so bandwidth and conversion time follow the clip's
+length rather than the video's.
+"""
+
+import re
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+from yt_dlp.utils import download_range_func
+
+
+# Added to output names so each section of a clip gets its own file
+CLIP_NAME_SUFFIX = ' [%(section_start>%H.%M.%S)s-%(section_end>%H.%M.%S|end)s]'
+
+TIMESTAMP_RE = re.compile(r'^(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d+)?)$')
+
+
+class ClipError(ValueError):
+    """Raised for a clip description that can't be parsed."""
+
+
+def parse_timestamp(text: str) -> float:
+    """Seconds in '90', '1:30' or '1:02:03.5'."""
+    match = TIMESTAMP_RE.match(text.strip())
+    if not match:
+        raise ClipError(f"Not a timestamp: '{text.strip()}' (use e.g. 90, 1:30 or 1:02:03)")
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+
+def parse_clip(text: str) -> Tuple[List[Tuple[float, float]], List[str]]:
+    """Parse a clip description into (time ranges, chapter title patterns).
+
+    Items are separated by commas. 'START-END' is a time range, and
+    'START-' runs to the end. '*PATTERN' selects every chapter whose title
+    matches the regular expression, e.g. '1:00-1:30, *Intro'.
+    """
+    ranges = []
+    chapters = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        if item.startswith('*'):
+            try:
+                re.compile(item[1:])
+            except re.error as e:
+                raise ClipError(f"Bad chapter pattern '{item[1:]}': {e}")
+            chapters.append(item[1:])
+            continue
+        start, sep, end = item.partition('-')
+        if not sep:
+            raise ClipError(f"Not a range: '{item}' (use START-END, START- or *CHAPTER)")
+        start_time = parse_timestamp(start)
+        end_time = parse_timestamp(end) if end.strip() else math.inf
+        if end_time <= start_time:
+            raise ClipError(f"Range '{item}' ends before it starts")
+        ranges.append((start_time, end_time))
+    return ranges, chapters
+
+
+def is_clip(job: Dict[str, Any]) -> bool:
+    return bool(job['clip_ranges'] or job['clip_chapters'])
+
+
+def ydl_clip_options(job: Dict[str, Any]) -> Dict[str, Any]:
+    """YoutubeDL options that make a job download only its clip (none for whole videos)."""
+    if not is_clip(job):
+        return {}
+    return {
+        'download_ranges': download_range_func(job['clip_chapters'], job['clip_ranges']),
+        # Re-encode around the cut points; a stream copy can only start at a keyframe
+        'force_keyframes_at_cuts': job['precise_cuts'],
+    }
+
+
+def clip_seconds(job: Dict[str, Any], info: Dict[str, Any]) -> Optional[float]:
+    """Total length of a job's clip in info's video, or None if it can't be told."""
+    duration = info.get('duration')
+    total = 0.0
+    for start, end in job['clip_ranges']:
+        if math.isinf(end) and not duration:
+            return None
+        end = min(end, duration) if duration else end
+        total += max(end - start, 0)
+    for pattern in job['clip_chapters']:
+        for chapter in info.get('chapters') or []:
+            if re.search(pattern, chapter.get('title') or ''):
+                total += chapter['end_time'] - chapter['start_time']
+    return total
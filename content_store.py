@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store for finished downloads.
+Each output is kept once per video ID and format, and later requests
+for the same result are linked into the requested folder.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+from typing import Dict, Any, Optional
+
+from ffmpeg_tools import RENDITIONS
+from url_tools import video_key
+
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".downbad_store")
+
+META_FILE = 'info.json'
+TEMP_SUFFIX = '.downbad-tmp'
+
+# Key parts that are used as directory names as they are; anything else is hashed
+SAFE_COMPONENT_RE = re.compile(r'[A-Za-z0-9_@+,-][A-Za-z0-9_@+,.-]{0,79}')
+
+# yt-dlp format the audio stage downloads
+AUDIO_FORMAT = 'bestaudio'
+
+
+def video_key_from_url(url: str) -> Optional[str]:
+    """Return the store key for a URL without contacting the site, if possible."""
+    return video_key(url)
+
+
+def video_key_from_info(info: Dict[str, Any]) -> Optional[str]:
+    """Return the store key for an extracted info dict."""
+    if not info or not info.get('id'):
+        return None
+    extractor = (info.get('extractor_key') or info.get('extractor') or 'generic').lower()
+    return f"{extractor}/{info['id']}"
+
+
+def rendition_format_key(name: str) -> str:
+    """Store key for a rendition made by a renditions job (see ffmpeg_tools.RENDITIONS)."""
+    return f"rendition-{name}"
+
+
+def format_key(base_key: str, format_spec: str, encoder_profile: Optional[str] = None) -> str:
+    """Store key for an output of kind base_key (say 'video-mp4') made from format_spec.
+
+    Outputs of a different format selection or encoder profile are different
+    files, so neither is a hit for the other.
+    """
+    key = f"{base_key}@{format_spec}"
+    return f"{key}@{encoder_profile}" if encoder_profile else key
+
+
+def job_format_key(job: Dict[str, Any], output: str) -> str:
+    """Store key for one of a job's outputs: 'video', 'audio' or a rendition name."""
+    if output == 'video':
+        encodes = job['convert_video'] and job['ffmpeg_available']
+        return format_key(job['video_format_key'], job['video_format'], job['encoder_profile'] if encodes else None)
+    if output == 'audio':
+        # Without FFmpeg the audio is kept in its original format
+        base_key = job['audio_format_key'] if job['ffmpeg_available'] else 'audio-original'
+        return format_key(base_key, AUDIO_FORMAT)
+    if RENDITIONS[output]['video']:
+        return format_key(rendition_format_key(output), job['video_format'], job['encoder_profile'])
+    return format_key(rendition_format_key(output), AUDIO_FORMAT)
+
+
+def _path_component(part: str) -> str:
+    """A directory name for one part of a key.
+
+    Parts come from extractor info (IDs, extractor names) and format
+    selections, so anything beyond a plain name is replaced by a readable
+    prefix and a hash; it can never escape the store or clash with a plain name.
+    """
+    if SAFE_COMPONENT_RE.fullmatch(part):
+        return part
+    digest = hashlib.sha256(part.encode('utf-8', 'surrogatepass')).hexdigest()[:32]
+    return f"{re.sub(r'[^A-Za-z0-9_-]+', '_', part)[:40]}~{digest}"
+
+
+def downloaded_files(info: Dict[str, Any]):
+    """Return the final file paths yt-dlp produced for an info dict."""
+    if not info:
+        return []
+    downloads = info.get('requested_downloads') or []
+    return [d['filepath'] for d in downloads if d.get('filepath') and os.path.exists(d['filepath'])]
+
+
+class ContentStore:
+    """Stores finished outputs once and links them into download folders."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _video_dir(self, video_key: str) -> str:
+        # 'extractor/id'; an ID may itself contain slashes
+        return os.path.join(self.root, *(_path_component(part) for part in video_key.split('/', 1)))
+
+    def _entry_dir(self, video_key: str, format_key: str) -> str:
+        return os.path.join(self._video_dir(video_key), _path_component(format_key))
+
+    def lookup(self, video_key: Optional[str], format_key: str) -> Optional[str]:
+        """Return the stored file for a video and format, or None."""
+        if not video_key:
+            return None
+        entry_dir = self._entry_dir(video_key, format_key)
+        try:
+            names = [n for n in os.listdir(entry_dir) if not n.endswith(TEMP_SUFFIX)]
+        except FileNotFoundError:
+            return None
+        if not names:
+            return None
+        return os.path.join(entry_dir, names[0])
+
+    def get_title(self, video_key: Optional[str]) -> Optional[str]:
+        """Return the title recorded for a stored video, or None."""
+        if not video_key:
+            return None
+        try:
+            with open(os.path.join(self._video_dir(video_key), META_FILE), 'r') as f:
+                return json.load(f).get('title')
+        except (OSError, ValueError):
+            return None
+
+    def ingest(self, path: str, video_key: Optional[str], format_key: str,
+               title: Optional[str] = None) -> str:
+        """Add a finished file to the store, sharing storage with the original."""
+        if not video_key or not os.path.isfile(path):
+            return path
+        existing = self.lookup(video_key, format_key)
+        if existing:
+            return existing
+
+        entry_dir = self._entry_dir(video_key, format_key)
+        os.makedirs(entry_dir, exist_ok=True)
+        stored_path = os.path.join(entry_dir, os.path.basename(path))
+        # Without a hardlink or reflink the store keeps its own copy; copying it back
+        # over the original couldn't share storage either
+        _atomic_copy(path, stored_path)
+
+        if title:
+            meta_path = os.path.join(self._video_dir(video_key), META_FILE)
+            try:
+                with open(meta_path + TEMP_SUFFIX, 'w') as f:
+                    json.dump({'title': title}, f)
+                os.replace(meta_path + TEMP_SUFFIX, meta_path)
+            except OSError as e:
+                print(f"Error writing store metadata: {e}")
+        return stored_path
+
+    def link_into(self, stored_path: str, folder: str) -> str:
+        """Link a stored file into a folder, keeping its file name."""
+        os.makedirs(folder, exist_ok=True)
+        dest_path = os.path.join(folder, os.path.basename(stored_path))
+        if os.path.exists(dest_path):
+            return dest_path
+        _link_or_copy(stored_path, dest_path)
+        return dest_path
+
+
+def _atomic_copy(src: str, dest: str):
+    """Place src at dest as a hardlink, or a reflink or copy renamed into place."""
+    try:
+        os.link(src, dest)
+        return
+    except OSError:
+        pass
+    temp_path = dest + TEMP_SUFFIX
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    if not _reflink(src, temp_path):
+        shutil.copy2(src, temp_path)
+    os.replace(temp_path, dest)
+
+
+def _reflink(src: str, dest: str) -> bool:
+    """Try a copy-on-write clone of src at dest."""
+    if sys.platform == 'darwin':
+        cmd = ['cp', '-c', src, dest]
+    elif sys.platform.startswith('linux'):
+        cmd = ['cp', '--reflink=always', src, dest]
+    else:
+        return False
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=30)
+        return result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def _link_or_copy(src: str, dest: str):
+    """Hardlink src to dest, falling back to a reflink and then a plain copy."""
+    temp_path = dest + TEMP_SUFFIX
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(src, temp_path)
+    except OSError:
+        if not _reflink(src, temp_path):
+            shutil.copy2(src, temp_path)
+    if not os.path.exists(dest):
+        os.replace(temp_path, dest)
+    else:
+        os.remove(temp_path)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Disk-space admission control for download jobs.
+Each job's peak disk usage is estimated from the formats it will download
+and reserved against the free space of its destination volume before it
+starts. Jobs that don't fit yet wait in the queue; jobs that can't fit even
+with nothing else running on their volume are rejected with the numbers
+that explain why.
+"""
+
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import yt_dlp
+
+from clips import is_clip, clip_seconds
+from content_store import ContentStore, video_key_from_info, job_format_key, AUDIO_FORMAT
+from cancellation import CancelToken
+from ffmpeg_tools import RENDITIONS, rendition_media
+from metadata_resolver import estimate_size
+
+
+# Free space always left untouched on a volume
+DEFAULT_MIN_FREE = 1024 ** 3
+
+# Estimates come from bitrates and approximate sizes; pad them
+SIZE_MARGIN = 1.1
+
+# Free space can change outside DownBad, so held jobs are rechecked this often
+RECHECK_INTERVAL = 5.0
+
+# Jobs sized concurrently when they arrive without pre-resolved info
+SIZING_WORKERS = 4
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable size for status text."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _select_format(info: Dict[str, Any], format_spec: str) -> Optional[Dict[str, Any]]:
+    """The format format_spec picks from info, as yt-dlp would pick it."""
+    if not info.get('formats'):
+        return info
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        selector = ydl.build_format_selector(format_spec)
+        selected = ydl._select_formats(info['formats'], selector)
+    return selected[-1] if selected else None
+
+
+def _estimate_sizes(job: Dict[str, Any], info: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Return (bytes downloaded, extra bytes needed while converting), or None if unknown.
+
+    FFmpeg writes its output next to the input before deleting the input, so
+    a converted stage briefly needs twice its size. Stages already in the
+    content store are linked and cost nothing. A clip needs its share of
+    the whole video's size.
+    """
+    # Clips never come from the store
+    store = ContentStore(job['store_dir']) if job['store_dir'] and not is_clip(job) else None
+    video_key = video_key_from_info(info)
+    if job['renditions']:
+        sizes = _estimate_rendition_sizes(job, info, store, video_key)
+    else:
+        sizes = _estimate_stage_sizes(job, info, store, video_key)
+    if sizes is None or not is_clip(job):
+        return sizes
+    seconds = clip_seconds(job, info)
+    if seconds is None or not info.get('duration'):
+        return None
+    fraction = min(seconds / info['duration'], 1.0)
+    return int(sizes[0] * fraction), int(sizes[1] * fraction)
+
+
+def _estimate_stage_sizes(job: Dict[str, Any], info: Dict[str, Any], store: Optional[ContentStore],
+                          video_key: Optional[str]) -> Optional[Tuple[int, int]]:
+    stages = []
+    if job['download_video']:
+        stages.append((job['video_format'], job_format_key(job, 'video'), job['convert_video']))
+    if job['download_audio']:
+        stages.append((AUDIO_FORMAT, job_format_key(job, 'audio'), True))
+
+    total = 0
+    overhead = 0
+    for format_spec, format_key, converts in stages:
+        if store and video_key and store.lookup(video_key, format_key):
+            continue
+        fmt = _select_format(info, format_spec)
+        size = estimate_size({**fmt, 'duration': info.get('duration')}) if fmt else None
+        if size is None:
+            return None
+        total += size
+        if converts and job['ffmpeg_available'] and fmt.get('ext') not in ('mp4', 'm4a'):
+            overhead = max(overhead, size)
+    return total, overhead
+
+
+def estimate_job_bytes(job: Dict[str, Any], info: Dict[str, Any]) -> Optional[int]:
+    """Estimate the most disk a job will use at once, or None if the size is unknown."""
+    sizes = _estimate_sizes(job, info)
+    return int(sum(sizes) * SIZE_MARGIN) if sizes else None
+
+
+def job_space_needs(job: Dict[str, Any], info: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """Bytes a job needs per directory, or None if the size is unknown.
+
+    With a staging directory, downloading and converting happen there and
+    only the finished files land in the destination folder.
+    """
+    return _space_needs(job, _estimate_sizes(job, info))
+
+
+def _estimate_rendition_sizes(job: Dict[str, Any], info: Dict[str, Any], store: Optional[ContentStore],
+                              video_key: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Sizes for a renditions job, whose streams are downloaded once.
+
+    Every output is about as big as the streams it carries, and they all
+    exist alongside the streams until FFmpeg finishes.
+    """
+    missing = [name for name in job['renditions']
+               if not (store and video_key and store.lookup(video_key, job_format_key(job, name)))]
+    if not missing:
+        return 0, 0
+    needs_video, needs_audio = rendition_media(missing)
+    sizes = {}
+    for media, format_spec, needed in (('video', f"{job['video_format']}/best", needs_video),
+                                       ('audio', 'bestaudio/best', needs_audio)):
+        if not needed:
+            continue
+        fmt = _select_format(info, format_spec)
+        size = estimate_size({**fmt, 'duration': info.get('duration')}) if fmt else None
+        if size is None:
+            return None
+        sizes[media] = size
+    outputs = sum(sizes.get('video', 0) * RENDITIONS[name]['video'] + sizes.get('audio', 0) * RENDITIONS[name]['audio']
+                  for name in missing) if job['ffmpeg_available'] else 0
+    return sum(sizes.values()), outputs
+
+
+def _space_needs(job: Dict[str, Any], sizes: Optional[Tuple[int, int]]) -> Optional[Dict[str, int]]:
+    if sizes is None:
+        return None
+    total, overhead = sizes
+    peak = int((total + overhead) * SIZE_MARGIN)
+    if not job['staging_dir']:
+        return {job['folder']: peak}
+    return {job['staging_dir']: peak, job['folder']: int(total * SIZE_MARGIN)}
+
+
+def _existing_parent(path: str) -> str:
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def volume_of(path: str) -> int:
+    """Device ID of the volume a (possibly not yet created) path is on."""
+    return os.stat(_existing_parent(path)).st_dev
+
+
+def free_bytes(path: str) -> int:
+    return shutil.disk_usage(_existing_parent(path)).free
+
+
+class DiskAdmission:
+    """Reservations of estimated job sizes against each volume's free space.
+
+    A reservation is held until the job ends. Bytes the job has already
+    written are counted both as used space and as reserved, which errs on
+    the side of holding the next job a little longer.
+    """
+
+    def __init__(self, min_free: int = DEFAULT_MIN_FREE):
+        self.min_free = min_free
+        self._lock = threading.Lock()
+        self._reservations: Dict[int, Dict[int, int]] = {}  # job ID -> {volume: bytes}
+
+    def reserved(self, volume: int) -> int:
+        return sum(needs.get(volume, 0) for needs in self._reservations.values())
+
+    @staticmethod
+    def _by_volume(needs: Dict[str, int]) -> Dict[int, Tuple[str, int]]:
+        # Directories on one volume share its space; a move within it is a rename
+        volumes = {}
+        for folder, size in needs.items():
+            volume = volume_of(folder)
+            if volume not in volumes or size > volumes[volume][1]:
+                volumes[volume] = (folder, size)
+        return volumes
+
+    def check(self, needs: Dict[str, int]) -> Optional[str]:
+        """Return why a job can't fit on a volume nothing else is reserved on, or None.
+
+        While other jobs hold reservations on a volume the job isn't
+        rejected: they can free space as they finish (partial and
+        intermediate files go, staged files move elsewhere), and held jobs
+        are checked again each time one does.
+        """
+        with self._lock:
+            for volume, (folder, size) in self._by_volume(needs).items():
+                if self.reserved(volume):
+                    continue
+                usable = free_bytes(folder) - self.min_free
+                if size > usable:
+                    return (f"Not enough disk space: needs ~{format_bytes(size)} in {folder} but only "
+                            f"{format_bytes(max(usable, 0))} can be used on that volume "
+                            f"(keeping {format_bytes(self.min_free)} free)")
+        return None
+
+    def try_reserve(self, job_id: int, needs: Dict[str, int]) -> bool:
+        """Reserve a job's space on every volume it needs if it all fits right now."""
+        with self._lock:
+            volumes = self._by_volume(needs)
+            for volume, (folder, size) in volumes.items():
+                if size > free_bytes(folder) - self.reserved(volume) - self.min_free:
+                    return False
+            self._reservations[job_id] = {volume: size for volume, (_, size) in volumes.items()}
+            return True
+
+    def release(self, job_id: int) -> bool:
+        with self._lock:
+            return self._reservations.pop(job_id, None) is not None
+
+
+class AdmissionQueue:
+    """Holds submitted jobs until their estimated size fits on disk, then dispatches them.
+
+    Jobs without pre-resolved info are resolved here first, under a token
+    that cancel() fires; the info is kept on the job so the worker doesn't
+    extract it again. Jobs whose size can't be estimated are dispatched
+    without a reservation.
+    """
+
+    def __init__(self, admission: DiskAdmission, dispatch: Callable, report: Callable,
+                 resolve_info: Callable):
+        self.admission = admission
+        self.dispatch = dispatch
+        self.report = report
+        self.resolve_info = resolve_info
+        self._pending: List[Dict[str, Any]] = []
+        self._needs: Dict[int, Optional[Dict[str, int]]] = {}
+        self._sizing: Dict[int, CancelToken] = {}  # Job ID -> token of its sizing
+        self._cancelled = set()  # Job IDs cancelled while being sized
+        self._held = set()  # Job IDs already told they are waiting
+        self._wakeup = threading.Condition()
+        self._closed = False
+        self._sizer = ThreadPoolExecutor(max_workers=SIZING_WORKERS, thread_name_prefix='sizing')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Dict[str, Any]):
+        token = CancelToken()
+        with self._wakeup:
+            self._sizing[job['id']] = token
+        self._sizer.submit(self._size, job, token)
+
+    def _size(self, job: Dict[str, Any], token: CancelToken):
+        try:
+            if job['info'] is None:
+                job['info'] = self.resolve_info(job, token)
+            sizes = _estimate_sizes(job, job['info'])
+        except Exception:
+            # The job reports the real error (with retries) when it runs
+            sizes = None
+        with self._wakeup:
+            self._sizing.pop(job['id'], None)
+            if job['id'] in self._cancelled:
+                # Already reported cancelled by cancel()
+                self._cancelled.discard(job['id'])
+                return
+            if sizes is not None:
+                job['estimated_bytes'] = int(sum(sizes) * SIZE_MARGIN)
+                job['download_bytes'] = sizes[0]
+                self.report({'id': job['id'], 'type': 'sized', 'bytes': sizes[0]})
+            self._needs[job['id']] = _space_needs(job, sizes)
+            self._pending.append(job)
+            self._wakeup.notify_all()
+
+    def cancel(self, job_id: int) -> bool:
+        """Drop a job that hasn't been dispatched yet. Returns False if it isn't held here."""
+        with self._wakeup:
+            if job_id in self._sizing:
+                # The extraction stops at its next request or retry; the job is done now
+                self._cancelled.add(job_id)
+                self._sizing[job_id].cancel()
+                self.report({'id': job_id, 'type': 'cancelled'})
+                return True
+            for job in self._pending:
+                if job['id'] == job_id:
+                    self._pending.remove(job)
+                    self._needs.pop(job_id, None)
+                    self._held.discard(job_id)
+                    self.report({'id': job_id, 'type': 'cancelled'})
+                    self._wakeup.notify_all()
+                    return True
+        return False
+
+    def release(self, job_id: int):
+        """Free a finished job's reservation and let held jobs try again."""
+        if self.admission.release(job_id):
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _admit_ready(self):
+        for job in list(self._pending):
+            needs = self._needs.get(job['id'])
+            if needs is None:
+                admitted = True
+            else:
+                reason = self.admission.check(needs)
+                if reason:
+                    self._pending.remove(job)
+                    self._needs.pop(job['id'], None)
+                    self.report({'id': job['id'], 'type': 'error', 'error': reason, 'kind': 'disk_full',
+                                 'summary': reason})
+                    continue
+                admitted = self.admission.try_reserve(job['id'], needs)
+            if admitted:
+                self._pending.remove(job)
+                self._needs.pop(job['id'], None)
+                self._held.discard(job['id'])
+                self.dispatch(job)
+            elif job['id'] not in self._held:
+                self._held.add(job['id'])
+                self.report({'id': job['id'], 'type': 'held',
+                             'message': f"Waiting for ~{format_bytes(max(needs.values()))} of free disk space"})
+
+    def _run(self):
+        with self._wakeup:
+            while not self._closed:
+                before = len(self._pending)
+                self._admit_ready()
+                if len(self._pending) != before:
+                    self._wakeup.notify_all()
+                self._wakeup.wait(RECHECK_INTERVAL if self._pending else None)
+
+    def close(self, wait: bool = False):
+        """Stop admitting jobs.
+
+        With wait, returns once every held job has been dispatched or
+        rejected. Otherwise jobs still being sized or held are reported
+        cancelled, and the call doesn't wait for their extractions to stop.
+        """
+        if wait:
+            self._sizer.shutdown(wait=True)
+        else:
+            with self._wakeup:
+                for job_id, token in self._sizing.items():
+                    # As in cancel(); a sizing still running discards its result
+                    self._cancelled.add(job_id)
+                    token.cancel()
+                    self.report({'id': job_id, 'type': 'cancelled'})
+                self._sizing.clear()
+            self._sizer.shutdown(wait=False, cancel_futures=True)
+        with self._wakeup:
+            while wait and self._pending:
+                self._wakeup.wait()
+            self._closed = True
+            for job in self._pending:
+                self.report({'id': job['id'], 'type': 'cancelled'})
+            self._pending.clear()
+            self._needs.clear()
+            self._wakeup.notify()
+        self._thread.join()
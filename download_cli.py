@@ -6,146 +6,615 @@ Called by the Electron frontend.
 
 import sys
 import os
+import argparse
 import subprocess
-import yt_dlp
+import json
+import time
+import signal
+import threading
 import ssl
+from backends import EXECUTION_MODES
+from clips import ClipError, parse_clip
+from content_store import DEFAULT_STORE_DIR
+from egress import EGRESS_STRATEGIES
+from engine import DownloadEngine
+from ffmpeg_tools import RENDITIONS, rendition_media
+from inbox import DEFAULT_POLL_INTERVAL, INBOX_SUFFIXES, InboxError, InboxWatcher
+from job_queue import DEFAULT_LEASE_SECONDS, PENDING_STATES, POLL_INTERVAL, QueueWorker, SharedQueue
+from metadata_resolver import MetadataResolver
+from settings import CONFIG_FILE, PROFILES, read_config_file, resolve_settings, describe_settings
+from url_tools import canonical_key, extract_urls
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: python download_cli.py <url> <folder> [video] [audio]")
+# Prefer H.264 MP4 so the file plays everywhere without conversion
+VIDEO_FORMAT = 'bestvideo[ext=mp4][vcodec^=avc]/bestvideo[ext=mp4]/bestvideo'
+
+# Options an entry in a watched list (or a '# key: value' line before it) may set
+INBOX_OPTIONS = ('folder', 'media', 'clip', 'fast_cuts')
+
+# Store keys for the outputs this CLI produces
+VIDEO_FORMAT_KEY = 'video-h264'
+AUDIO_FORMAT_KEY = 'audio-m4a'
+
+def parse_args(argv):
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        usage="python download_cli.py <url> <folder> [video] [audio] [options]\n"
+              "       python download_cli.py --resolve <url-list> [options]\n"
+              "       python download_cli.py --queue <db> [<url> <folder> [video] [audio]] [options]\n"
+              "       python download_cli.py --worker <db> [options]\n"
+              "       python download_cli.py --watch <dir> [<folder> [video] [audio]] [options]",
+        description="Download a video and/or its audio with yt-dlp.",
+    )
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('folder', nargs='?')
+    parser.add_argument('media', nargs='*',
+                        help="'video' and/or 'audio', or renditions made from a single download: "
+                             f"{', '.join(RENDITIONS)} (e.g. 'mp4 m4a mp3')")
+    parser.add_argument('--url', dest='extra_urls', action='append', default=[], metavar='URL',
+                        help="additional URL to download with the same options (repeatable)")
+    parser.add_argument('--urls-file', metavar='FILE',
+                        help="read more URLs from FILE ('-' for stdin); duplicates are dropped")
+    parser.add_argument('--config', default=CONFIG_FILE, metavar='FILE',
+                        help=f"settings file shared with the app (default: {CONFIG_FILE})")
+    parser.add_argument('--profile', choices=list(PROFILES),
+                        help="performance profile, overriding the one in the settings file")
+    parser.add_argument('--show-config', action='store_true',
+                        help="print the effective settings and exit")
+    # Options below override the settings file when given
+    parser.add_argument('--clip', metavar='SPEC',
+                        help="download only these parts: comma-separated START-END ranges (e.g. 1:00-1:30, "
+                             "'45:00-' for the rest) and *PATTERN for chapters whose titles match")
+    parser.add_argument('--fast-cuts', action='store_true',
+                        help="with --clip, cut at the nearest keyframe instead of re-encoding around the cut points")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_DIR, default=None, metavar='DIR',
+                        help=f"reuse finished outputs from a content-addressed store (default: {DEFAULT_STORE_DIR})")
+    parser.add_argument('--executor', choices=EXECUTION_MODES,
+                        help="run jobs in worker threads or worker processes")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="maximum concurrent jobs")
+    parser.add_argument('--concurrent-fragments', type=int, metavar='N',
+                        help="fragments downloaded in parallel per job")
+    parser.add_argument('--rate-limit', metavar='RATE',
+                        help="per-job download limit in bytes/s, e.g. 2M")
+    parser.add_argument('--host-connections', type=int, metavar='N',
+                        help="open requests per host across all jobs, extractor and media alike (0: no limit)")
+    parser.add_argument('--host-interval', type=float, metavar='SECONDS',
+                        help="minimum spacing between requests to the same host")
+    parser.add_argument('--egress', action='append', metavar='SPEC',
+                        help="add a local source address or proxy URL (http, https, socks4, socks5) to the pool "
+                             "jobs are spread over; repeat for several, 'direct' for the default route")
+    parser.add_argument('--egress-strategy', choices=EGRESS_STRATEGIES,
+                        help="give jobs egresses in turn or to the one with the fewest unfinished jobs")
+    parser.add_argument('--min-free', type=float, metavar='GB',
+                        help="free space to leave on the destination volume; jobs wait until they fit")
+    parser.add_argument('--no-space-check', action='store_true',
+                        help="start jobs without estimating and reserving disk space")
+    parser.add_argument('--staging-dir', metavar='DIR',
+                        help="download and convert in DIR (e.g. a fast local disk), then move finished files into the folder")
+    parser.add_argument('--keep-partial', action='store_true',
+                        help="keep partial downloads when interrupted so a rerun can resume them")
+    parser.add_argument('--resolve', metavar='FILE',
+                        help="print metadata for every URL in FILE ('-' for stdin) as JSON lines, without downloading")
+    parser.add_argument('--resolve-concurrency', type=int, metavar='N',
+                        help="URLs resolved at once")
+    parser.add_argument('--per-host', type=int, metavar='N',
+                        help="URLs resolved at once per host, and open lookup requests per host")
+    parser.add_argument('--queue', metavar='DB',
+                        help="add the URLs to the shared queue in DB instead of downloading them here, "
+                             "then follow the queue until every job is done")
+    parser.add_argument('--worker', metavar='DB',
+                        help="run jobs leased from the shared queue in DB")
+    parser.add_argument('--worker-id', metavar='ID',
+                        help="name this worker reports to the queue (default: host-pid)")
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, metavar='SECONDS',
+                        help="how long a job stays with a worker that stops sending heartbeats")
+    parser.add_argument('--exit-when-idle', action='store_true',
+                        help="with --worker, exit once the queue has no jobs left instead of waiting for more; "
+                             "with --watch, download what the lists hold now and exit")
+    parser.add_argument('--watch', action='append', metavar='DIR',
+                        help="download the URLs in every .txt or .jsonl list in DIR, including lists added or "
+                             "appended to later, writing LIST.results.jsonl next to each (repeat for more directories)")
+    parser.add_argument('--poll', action='store_true',
+                        help="with --watch, scan the directories instead of using inotify")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                        help="with --watch, seconds between scans when polling")
+    return parser.parse_args(argv)
+
+def load_cli_settings(args):
+    """Resolve settings from the settings file, the profile and command-line overrides."""
+    overrides = {
+        'execution_mode': args.executor,
+        'max_workers': args.workers,
+        'concurrent_fragments': args.concurrent_fragments,
+        'rate_limit': args.rate_limit,
+        'host_max_connections': args.host_connections,
+        'host_min_interval': args.host_interval,
+        'egress_pool': args.egress,
+        'egress_strategy': args.egress_strategy,
+        'min_free_space_gb': args.min_free,
+        'staging_dir': args.staging_dir,
+        'resolve_concurrency': args.resolve_concurrency,
+        'resolve_per_host': args.per_host,
+    }
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    if args.store:
+        overrides.update(use_content_store=True, content_store_dir=args.store)
+    if args.no_space_check:
+        overrides['check_disk_space'] = False
+    if args.keep_partial:
+        overrides['keep_partial_on_cancel'] = True
+
+    _, problems = resolve_settings(overrides)
+    if problems:
+        print(f"Error: {problems[0]}")
         sys.exit(1)
+
+    try:
+        values = read_config_file(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Stage: ⚠️ Ignoring settings file: {e}", file=sys.stderr)
+        values = {}
+    settings, problems = resolve_settings({**values, **overrides}, args.profile)
+    for problem in problems:
+        print(f"Stage: ⚠️ Settings: {problem}", file=sys.stderr)
+    return settings
+
+def read_url_list(path):
+    """Read every URL from a file, skipping # comment lines."""
+    f = sys.stdin if path == '-' else open(path, 'r')
+    try:
+        return extract_urls("".join(line for line in f if not line.lstrip().startswith('#')))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def dedupe_urls(urls):
+    """Drop URLs that point to the same video as an earlier one."""
+    seen = set()
+    unique = []
+    for url in urls:
+        key = canonical_key(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+def resolve_main(args, settings):
+    """Resolve metadata for a URL list and print one JSON line per URL as it finishes."""
+    urls = read_url_list(args.resolve)
+    if args.url:
+        urls.insert(0, args.url)
+    urls = dedupe_urls(urls)
+    print(f"Stage: Resolving {len(urls)} URLs...", file=sys.stderr)
+    
+    failures = [0]
+    def print_result(result):
+        if 'error' in result:
+            failures[0] += 1
+        print(json.dumps(result))
+        sys.stdout.flush()
     
-    url = sys.argv[1]
-    folder = sys.argv[2]
-    download_video = 'video' in sys.argv[3:]
-    download_audio = 'audio' in sys.argv[3:]
+    start = time.perf_counter()
+    resolver = MetadataResolver(
+        max_workers=settings['resolve_concurrency'],
+        per_host=settings['resolve_per_host'],
+        ydl_opts={'no_check_certificate': True},  # Fix for macOS SSL issues
+        host_min_interval=settings['host_min_interval'],
+    )
+    results = resolver.resolve(urls, print_result)
+    elapsed = time.perf_counter() - start
     
+    total_size = sum(r.get('filesize') or 0 for r in results)
+    print(f"Stage: Resolved {len(results) - failures[0]}/{len(results)} URLs in {elapsed:.1f}s "
+          f"(~{total_size / (1024*1024):.0f} MB estimated)", file=sys.stderr)
+    if failures[0]:
+        sys.exit(1)
+
+class EventPrinter:
+    """Prints engine events in the line format the Electron frontend parses."""
+
+    def __init__(self, multiple: bool, engine=None):
+        self.multiple = multiple
+        self.engine = engine  # For queue progress lines when running several jobs
+        self.results = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        prefix = f"[#{event['id']}] " if self.multiple else ""
+        with self.lock:
+            if event['type'] == 'info':
+                print(f"{prefix}Title: {event['title']}")
+            elif event['type'] == 'stage':
+                print(f"Stage: {prefix}{event['message']}")
+            elif event['type'] in ('retry', 'held'):
+                print(f"Stage: {prefix}{event['message']}")
+            elif event['type'] == 'complete':
+                self.results[event['id']] = event['result']
+                if self.multiple and self.engine is not None:
+                    self.print_queue_progress()
+            elif event['type'] == 'error':
+                self.errors[event['id']] = event['error']
+                print(f"Error: {prefix}[{event['kind']}] {event['error']}")
+            elif event['type'] == 'cancelled':
+                self.errors[event['id']] = "cancelled"
+                if 'latency' in event:
+                    print(f"Stage: {prefix}Cancelled, stopped in {event['latency']:.2f}s")
+            sys.stdout.flush()
+
+    def print_queue_progress(self):
+        remaining = self.engine.active_count()
+        eta = self.engine.queue_eta()
+        eta_text = f", about {format_duration(eta)} left" if eta is not None and remaining else ""
+        print(f"Stage: {len(self.results)} done, {remaining} remaining{eta_text}")
+
+def format_duration(seconds):
+    """Format seconds as e.g. 1h 5m, 4m 10s or 12s."""
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m {int(seconds % 60)}s"
+    return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
+
+def check_video_file(file_path):
+    """Print FFmpeg's analysis of a downloaded MP4."""
+    print(f"Stage: Downloaded file: {os.path.basename(file_path)}")
+    try:
+        ffmpeg_path = get_ffmpeg_path()
+        if ffmpeg_path:
+            probe_cmd = [ffmpeg_path, '-i', file_path]
+            result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                print(f"Stage: File analysis: {result.stderr}")
+            else:
+                print(f"Stage: ⚠️ File may be corrupted or not a valid MP4")
+    except Exception as e:
+        print(f"Stage: Error analyzing file: {str(e)}")
+
+def print_summary(download_path):
+    """Print the files present in a download folder."""
+    print("Stage: Download Summary:")
+    print(f"Stage: Download path: {download_path}")
+    if os.path.exists(download_path):
+        final_files = os.listdir(download_path)
+        print(f"Stage: Final files in directory: {final_files}")
+        for file in final_files:
+            file_path = os.path.join(download_path, file)
+            if os.path.isfile(file_path):
+                size = os.path.getsize(file_path)
+                print(f"Stage: - {file} ({size / (1024*1024):.1f} MB)")
+    else:
+        print(f"Stage: ❌ Download path not found: {download_path}")
+
+def cli_job_options(ffmpeg_path):
+    """new_job() options for every download this CLI runs, locally or as a queue worker."""
+    return {
+        'video_format': VIDEO_FORMAT,
+        'convert_video': False,
+        'video_format_key': VIDEO_FORMAT_KEY,
+        'audio_format_key': AUDIO_FORMAT_KEY,
+        'ffmpeg_location': ffmpeg_path,
+        'ffmpeg_available': ffmpeg_path is not None,
+        'extra_opts': {'no_check_certificate': True},  # Fix for macOS SSL issues
+    }
+
+def media_selection(media):
+    """Return (download_video, download_audio, renditions) for a list of media words; ValueError on a mistake."""
+    renditions = [word for word in dict.fromkeys(media) if word in RENDITIONS]
+    unknown = [word for word in media if word not in RENDITIONS and word not in ('video', 'audio')]
+    if unknown:
+        raise ValueError(f"Unknown media '{unknown[0]}'; use 'video', 'audio' or {', '.join(RENDITIONS)}")
+    if renditions:
+        if 'video' in media or 'audio' in media:
+            raise ValueError("Use either 'video'/'audio' or renditions, not both")
+        return (*rendition_media(renditions), renditions)
+    download_video = 'video' in media
+    download_audio = 'audio' in media
     if not download_video and not download_audio:
-        print("Error: Must specify at least 'video' or 'audio'")
+        raise ValueError("Must specify at least 'video' or 'audio'")
+    return download_video, download_audio, None
+
+def parse_media(media):
+    """Return (download_video, download_audio, renditions) for the media arguments, or exit on a mistake."""
+    try:
+        return media_selection(media)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def clip_job_options(clip, fast_cuts=False):
+    """new_job() options for a clip description (none without one); ClipError if it can't be parsed."""
+    if not clip:
+        return {}
+    ranges, chapters = parse_clip(clip)
+    return {'clip_ranges': ranges, 'clip_chapters': chapters, 'precise_cuts': not fast_cuts}
+
+def clip_options(args):
+    """new_job() options for --clip, or exit if it can't be parsed."""
+    try:
+        return clip_job_options(args.clip, args.fast_cuts)
+    except ClipError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def collect_urls(args):
+    """The positional URL, --url and --urls-file URLs, without duplicates."""
+    urls = [args.url] + args.extra_urls
+    if args.urls_file:
+        urls += read_url_list(args.urls_file)
+    unique_urls = dedupe_urls(urls)
+    if len(unique_urls) < len(urls):
+        print(f"Stage: Skipped {len(urls) - len(unique_urls)} duplicate URLs")
+    return unique_urls
+
+def queue_main(args):
+    """Add URLs to a shared queue, then print what the workers report until every job is done."""
+    queue = SharedQueue(args.queue)
+    job_ids = None  # Follow the whole queue when nothing was added
+    if args.url:
+        if not args.folder:
+            print("Usage: python download_cli.py --queue <db> <url> <folder> [video] [audio]")
+            sys.exit(1)
+        download_video, download_audio, renditions = parse_media(args.media)
+        # Workers on other machines resolve the folder themselves, so it should be on a shared volume
+        folder = os.path.abspath(args.folder)
+        spec = {'folder': folder, 'download_video': download_video, 'download_audio': download_audio}
+        options = clip_options(args)
+        if renditions:
+            options['renditions'] = renditions
+        if options:
+            spec['options'] = options
+        job_ids = [queue.enqueue({'url': url, **spec}) for url in collect_urls(args)]
+        print(f"Stage: Queued {len(job_ids)} jobs in {queue.path}")
+    sys.stdout.flush()
+
+    last_event = 0
+    states = {}
+    try:
+        while True:
+            for event in queue.events_since(last_event):
+                last_event = event['log_id']
+                if job_ids is not None and event['job_id'] not in job_ids:
+                    continue
+                prefix = f"[#{event['job_id']} {event['worker']}] "
+                if event['type'] == 'info':
+                    print(f"{prefix}Title: {event['title']}")
+                elif event['type'] == 'error':
+                    print(f"Error: {prefix}[{event['kind']}] {event['error']}")
+                elif event['type'] == 'cancelled':
+                    print(f"Stage: {prefix}Cancelled")
+                elif event['type'] == 'complete':
+                    print(f"Stage: {prefix}Done")
+                else:
+                    print(f"Stage: {prefix}{event['message']}")
+            jobs = queue.jobs(job_ids)
+            changed = {job['id']: job['state'] for job in jobs} != states
+            states = {job['id']: job['state'] for job in jobs}
+            counts = {state: list(states.values()).count(state) for state in set(states.values())}
+            if changed:
+                running = ", ".join(f"#{job['id']} {job['percentage']:.0f}% on {job['worker']}"
+                                    for job in jobs if job['state'] == 'leased')
+                print(f"Stage: {counts.get('complete', 0)} done, {counts.get('leased', 0)} running, "
+                      f"{counts.get('queued', 0)} queued" + (f" ({running})" if running else ""))
+            sys.stdout.flush()
+            if not any(counts.get(state) for state in PENDING_STATES):
+                break
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        # Only the view stops; the jobs stay queued for the workers
+        print("Stage: Stopped following the queue")
+        sys.exit(130)
+
+    for job in jobs:
+        if job['state'] == 'complete':
+            print(f"Stage: #{job['id']} {job['result'].get('title') or job['spec']['url']}: "
+                  f"{', '.join(job['result']['files'])}")
+        else:
+            print(f"Error: #{job['id']} {job['spec']['url']}: {job['state']} {job['message']}".rstrip())
+    if any(job['state'] != 'complete' for job in jobs):
+        sys.exit(1)
+    print("All downloads completed successfully!")
+
+def worker_main(args, settings):
+    """Lease jobs from a shared queue and download them until interrupted (or idle, with --exit-when-idle)."""
+    ffmpeg_path = get_ffmpeg_path()
+    engine = DownloadEngine(settings)
+    engine.subscribe(EventPrinter(multiple=True))
+    worker = QueueWorker(SharedQueue(args.worker), engine, args.worker_id, args.lease,
+                         options=cli_job_options(ffmpeg_path))
+    print(f"Stage: Worker {worker.worker_id} running up to {settings['max_workers']} jobs from {worker.queue.path}")
+    sys.stdout.flush()
+    signal.signal(signal.SIGTERM, raise_interrupt)
+    try:
+        worker.run(exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        print("Stage: Interrupted, returned running jobs to the queue")
+        sys.exit(130)
+
+def entry_job(entry, default_folder, default_media):
+    """(folder, download_video, download_audio, options) for an inbox entry; ValueError if its options are bad.
+
+    A relative 'folder' option is taken from the list's own directory;
+    entries without one go to default_folder (an absolute path, or None).
+    """
+    options = dict(entry.options)
+    unknown = sorted(set(options) - set(INBOX_OPTIONS))
+    if unknown:
+        raise InboxError(f"Unknown option '{unknown[0]}' (use {', '.join(INBOX_OPTIONS)})")
+    folder = options.get('folder')
+    if folder:
+        if not isinstance(folder, str):
+            raise InboxError("'folder' must be a string")
+        folder = os.path.normpath(os.path.join(os.path.dirname(entry.path), os.path.expanduser(folder)))
+    elif default_folder:
+        folder = default_folder
+    else:
+        raise InboxError("No folder: set a 'folder' option in the list, or pass a default folder after --watch")
+    media = options.get('media', default_media)
+    if isinstance(media, str):
+        media = media.replace(',', ' ').split()
+    if not isinstance(media, list) or not all(isinstance(word, str) for word in media):
+        raise InboxError("'media' must be a string or a list of strings")
+    download_video, download_audio, renditions = media_selection(media)
+    fast_cuts = options.get('fast_cuts', False)
+    if isinstance(fast_cuts, str):
+        fast_cuts = fast_cuts.strip().lower() in ('1', 'true', 'yes', 'on')
+    job_options = clip_job_options(options.get('clip'), bool(fast_cuts))
+    if renditions:
+        job_options['renditions'] = renditions
+    return folder, download_video, download_audio, job_options
+
+def watch_main(args, settings):
+    """Download the URLs in every list dropped into the watched directories, recording results next to each list."""
+    positional = [value for value in (args.url, args.folder) if value] + args.media
+    default_folder = positional[0] if positional else settings['download_folder']
+    # Resolved here, not against each list's directory; without one, lists must name their own
+    default_folder = os.path.abspath(os.path.expanduser(default_folder)) if default_folder else None
+    default_media = positional[1:] or ['video', 'audio']
+    parse_media(default_media)
+    for directory in args.watch:
+        if not os.path.isdir(directory):
+            print(f"Error: Not a directory: {directory}")
+            sys.exit(1)
+
+    ffmpeg_path = get_ffmpeg_path()
+    engine = DownloadEngine(settings)
+    engine.subscribe(EventPrinter(multiple=True, engine=engine))
+    pending = {}  # Job ID -> (entry, manifest)
+    lock = threading.RLock()
+
+    def record(event):
+        if event['type'] not in ('complete', 'error'):
+            return  # Cancelled entries are left out of the manifest, so the next run picks them up again
+        with lock:
+            entry, manifest = pending.pop(event['id'], (None, None))
+        if entry is None:
+            return
+        if event['type'] == 'complete':
+            manifest.write(entry, 'complete', job=event['id'], title=event['result'].get('title'),
+                           files=event['result']['files'])
+        else:
+            manifest.write(entry, 'error', job=event['id'], kind=event['kind'], error=event['error'])
+
+    def submit(entries):
+        for entry in entries:
+            manifest = watcher.files[entry.path].manifest
+            source = f"{os.path.basename(entry.path)}:{entry.line}"
+            try:
+                if entry.error:
+                    raise InboxError(entry.error)
+                folder, download_video, download_audio, options = entry_job(entry, default_folder, default_media)
+            except ValueError as e:
+                print(f"Error: {source}: {e}")
+                manifest.write(entry, 'invalid', error=str(e))
+                continue
+            with lock:
+                job_id = engine.submit(entry.url, folder, download_video, download_audio,
+                                       **cli_job_options(ffmpeg_path), **options)
+                pending[job_id] = (entry, manifest)
+            print(f"Stage: [#{job_id}] Queued {entry.url} from {source}")
+        sys.stdout.flush()
+
+    engine.subscribe(record)
+    watcher = InboxWatcher(args.watch, submit, args.poll_interval, poll=args.poll)
+    signal.signal(signal.SIGTERM, raise_interrupt)
+    try:
+        if args.exit_when_idle:
+            watcher.scan(final=True)
+            engine.shutdown(wait=True)
+            return
+        print(f"Stage: Watching {', '.join(watcher.directories)} for {' and '.join(INBOX_SUFFIXES)} lists "
+              f"({watcher.mode})")
+        sys.stdout.flush()
+        watcher.run(threading.Event())
+    except KeyboardInterrupt:
+        print("Stage: Interrupted, cancelling downloads; unfinished entries run again next time")
+        sys.stdout.flush()
+        engine.cancel_all()
+        engine.shutdown(wait=True)
+        sys.exit(130)
+
+def raise_interrupt(signum, frame):
+    """Treat SIGTERM like Ctrl+C so jobs are cancelled and cleaned up."""
+    raise KeyboardInterrupt
+
+def main():
+    args = parse_args(sys.argv[1:])
+    settings = load_cli_settings(args)
+    if args.show_config:
+        print(describe_settings(settings))
+        return
+    if args.resolve:
+        resolve_main(args, settings)
+        return
+    if args.worker:
+        worker_main(args, settings)
+        return
+    if args.watch:
+        watch_main(args, settings)
+        return
+    if args.queue:
+        queue_main(args)
+        return
+    if not args.url or not args.folder:
+        print("Usage: python download_cli.py <url> <folder> [video] [audio]")
         sys.exit(1)
     
+    urls = collect_urls(args)
+    folder = args.folder
+    download_video, download_audio, renditions = parse_media(args.media)
+    clip = clip_options(args)
     print(f"Starting download...")
-    print(f"URL: {url}")
+    print(f"URL: {', '.join(urls)}")
     print(f"Folder: {folder}")
-    print(f"Video: {download_video}, Audio: {download_audio}")
+    if renditions:
+        print(f"Renditions: {', '.join(renditions)}")
+    else:
+        print(f"Video: {download_video}, Audio: {download_audio}")
+    if clip:
+        print(f"Clip: {args.clip}")
     
     try:
-        # Get video info with SSL fix for macOS
-        info_ydl_opts = {
-            'quiet': True,
-            'no_check_certificate': True,  # Fix for macOS SSL issues
-        }
-        info_ydl = yt_dlp.YoutubeDL(info_ydl_opts)
-        info = info_ydl.extract_info(url, download=False)
-        title = info.get('title', 'Unknown') if info else 'Unknown'
-        print(f"Title: {title}")
-        
-        # Create safe filename for folder (only if downloading both video and audio)
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        
-        if download_video and download_audio:
-            # Create folder for both video and audio
-            download_path = os.path.join(folder, safe_title)
-            os.makedirs(download_path, exist_ok=True)
-        else:
-            # Use the main folder directly for single downloads
-            download_path = folder
-        
-        # Download video
-        if download_video:
-            print("Stage: Starting video download...")
-            
-            # First, get available formats to debug
-            info_ydl_opts = {
-                'quiet': True,
-                'no_check_certificate': True,
-            }
-            info_ydl = yt_dlp.YoutubeDL(info_ydl_opts)
-            info = info_ydl.extract_info(url, download=False)
-            
-            print("Stage: Available video formats:")
-            if info and 'formats' in info:
-                for f in info['formats']:
-                    if f.get('vcodec') != 'none':
-                        print(f"Stage: - {f.get('format_id', 'N/A')}: {f.get('ext', 'N/A')} {f.get('resolution', 'N/A')} {f.get('vcodec', 'N/A')}")
+        ffmpeg_path = get_ffmpeg_path()
+        if renditions:
+            if ffmpeg_path:
+                print("Stage: Streams will be downloaded once and written to every rendition")
             else:
-                print("Stage: Could not get format information")
-            
-            # Choose format more carefully
-            ydl_opts = {
-                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                'format': 'bestvideo[ext=mp4][vcodec^=avc]/bestvideo[ext=mp4]/bestvideo',  # Prefer H.264 MP4
-                'no_check_certificate': True,  # Fix for macOS SSL issues
-            }
-            
-            print("Stage: Downloading highest quality H.264 MP4 available...")
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            print("Stage: Video download complete!")
-            
-            # Check what was actually downloaded
-            print("Stage: Checking downloaded file...")
-            if os.path.exists(download_path):
-                for filename in os.listdir(download_path):
-                    if filename.lower().endswith('.mp4'):
-                        file_path = os.path.join(download_path, filename)
-                        print(f"Stage: Downloaded file: {filename}")
-                        
-                        # Check if it's actually a valid MP4
-                        try:
-                            import subprocess
-                            ffmpeg_path = get_ffmpeg_path()
-                            if ffmpeg_path:
-                                probe_cmd = [ffmpeg_path, '-i', file_path]
-                                result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
-                                if result.returncode == 0:
-                                    print(f"Stage: File analysis: {result.stderr}")
-                                else:
-                                    print(f"Stage: ⚠️ File may be corrupted or not a valid MP4")
-                        except Exception as e:
-                            print(f"Stage: Error analyzing file: {str(e)}")
-        
-        # Download audio
-        if download_audio:
-            print("Stage: Starting audio download...")
-            ydl_opts = {
-                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                'format': 'bestaudio',  # Get best audio quality - matches original app
-                'no_check_certificate': True,  # Fix for macOS SSL issues
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'm4a',
-                    'preferredquality': '192',
-                }],
-            }
-            
-            # Set FFmpeg path if available
-            ffmpeg_path = get_ffmpeg_path()
+                print("Stage: FFmpeg not found - streams will be kept as downloaded")
+        elif download_audio:
             if ffmpeg_path:
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
                 print("Stage: Audio will be converted to M4A format")
             else:
                 print("Stage: FFmpeg not found - audio will be downloaded in original format")
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            print("Stage: Audio download complete!")
         
-        # Final summary
-        print("Stage: Download Summary:")
-        print(f"Stage: Download path: {download_path}")
-        if os.path.exists(download_path):
-            final_files = os.listdir(download_path)
-            print(f"Stage: Final files in directory: {final_files}")
-            for file in final_files:
-                file_path = os.path.join(download_path, file)
-                if os.path.isfile(file_path):
-                    size = os.path.getsize(file_path)
-                    print(f"Stage: - {file} ({size / (1024*1024):.1f} MB)")
-        else:
-            print(f"Stage: ❌ Download path not found: {download_path}")
+        engine = DownloadEngine({**settings, 'max_workers': min(settings['max_workers'], len(urls))})
+        printer = EventPrinter(multiple=len(urls) > 1, engine=engine)
+        engine.subscribe(printer)
+        for url in urls:
+            engine.submit(url, folder, download_video, download_audio, renditions=renditions,
+                          **cli_job_options(ffmpeg_path), **clip)
+        signal.signal(signal.SIGTERM, raise_interrupt)
+        try:
+            engine.shutdown(wait=True)
+        except KeyboardInterrupt:
+            print("Stage: Interrupted, cancelling downloads...")
+            sys.stdout.flush()
+            engine.cancel_all()
+            engine.shutdown(wait=True)
+            sys.exit(130)
+        
+        # Check what was actually downloaded
+        for job_id in sorted(printer.results):
+            result = printer.results[job_id]
+            if download_video:
+                print("Stage: Checking downloaded file...")
+                for file_path in result['files']:
+                    if file_path.lower().endswith('.mp4'):
+                        check_video_file(file_path)
+            print_summary(result['download_path'])
         
+        if printer.errors:
+            sys.exit(1)
         print("All downloads completed successfully!")
         
     except Exception as e:
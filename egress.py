@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Egress pool: the source addresses and proxies jobs go out through.
+Each job is given one egress when it is submitted, round-robin or to the
+one with the fewest unfinished jobs, and keeps it for every request it
+makes. A background health check probes each egress; one that fails its
+probe, or whose jobs keep failing with network errors, is taken out of
+rotation until a probe succeeds again.
+"""
+
+import socket
+import ipaddress
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+
+from retries import NETWORK
+
+
+EGRESS_STRATEGIES = ('round-robin', 'least-load')
+DEFAULT_STRATEGY = 'round-robin'
+
+# Seconds between health checks; 0 turns them off
+DEFAULT_CHECK_INTERVAL = 30.0
+
+# Seconds a probe may take before the egress counts as down
+PROBE_TIMEOUT = 5.0
+
+# Consecutive network failures of an egress's jobs that take it out of rotation
+MAX_FAILURES = 3
+
+PROXY_SCHEMES = ('http', 'https', 'socks4', 'socks4a', 'socks5', 'socks5h')
+
+
+@dataclass(slots=True, eq=False)
+class Egress:
+    """One way out: the default route, a local source address or a proxy."""
+    spec: str
+    source_address: Optional[str] = None
+    proxy: Optional[str] = None
+    healthy: bool = True
+    load: int = 0  # Jobs given this egress that haven't finished
+    failures: int = 0  # Consecutive network failures
+    jobs: int = 0  # Jobs given this egress in total
+
+    def ydl_options(self) -> Dict[str, Any]:
+        """YoutubeDL options that send requests out through this egress."""
+        if self.proxy:
+            return {'proxy': self.proxy}
+        if self.source_address:
+            return {'source_address': self.source_address}
+        return {}
+
+    def probe(self, timeout: float = PROBE_TIMEOUT) -> bool:
+        """Whether the proxy accepts connections, or the source address can be bound."""
+        try:
+            if self.proxy:
+                url = urlparse(self.proxy)
+                default_port = 443 if url.scheme == 'https' else 1080 if url.scheme.startswith('socks') else 80
+                socket.create_connection((url.hostname, url.port or default_port), timeout=timeout).close()
+            elif self.source_address:
+                family = socket.AF_INET6 if ':' in self.source_address else socket.AF_INET
+                with socket.socket(family, socket.SOCK_STREAM) as sock:
+                    sock.bind((self.source_address, 0))
+            return True
+        except OSError:
+            return False
+
+
+def parse_egress(spec: str) -> Egress:
+    """Parse 'direct', a local IP address, or a proxy URL such as 'socks5://127.0.0.1:1080'."""
+    spec = spec.strip()
+    if spec == 'direct':
+        return Egress(spec)
+    if '://' in spec:
+        url = urlparse(spec)
+        if url.scheme not in PROXY_SCHEMES or not url.hostname:
+            raise ValueError(f"Not a proxy URL: '{spec}' (schemes: {', '.join(PROXY_SCHEMES)})")
+        return Egress(spec, proxy=spec)
+    try:
+        ipaddress.ip_address(spec)
+    except ValueError:
+        raise ValueError(f"Not an egress: '{spec}' (use direct, a local IP address or a proxy URL)")
+    return Egress(spec, source_address=spec)
+
+
+def valid_egress(spec) -> bool:
+    try:
+        parse_egress(spec)
+        return isinstance(spec, str)
+    except (ValueError, AttributeError):
+        return False
+
+
+class EgressPool:
+    """Hands out egresses to jobs and keeps track of their load and health.
+
+    When every egress is out of rotation, jobs still get one (the least
+    loaded) rather than waiting; the health check puts egresses back as
+    soon as they answer.
+    """
+
+    def __init__(self, specs: List[str], strategy: str = DEFAULT_STRATEGY,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.egresses = [parse_egress(spec) for spec in specs]
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stop = threading.Event()
+        if check_interval and self.egresses:
+            self._checker = threading.Thread(target=self._check_loop, args=(check_interval,), daemon=True)
+            self._checker.start()
+
+    def acquire(self) -> Optional[Egress]:
+        """Pick the egress for a new job (None if the pool is empty)."""
+        with self._lock:
+            if not self.egresses:
+                return None
+            # Starting after the last pick makes ties and round-robin take turns
+            order = self.egresses[self._next:] + self.egresses[:self._next]
+            healthy = [egress for egress in order if egress.healthy]
+            if self.strategy == 'least-load' or not healthy:
+                egress = min(healthy or order, key=lambda e: e.load)
+            else:
+                egress = healthy[0]
+            self._next = (self.egresses.index(egress) + 1) % len(self.egresses)
+            egress.load += 1
+            egress.jobs += 1
+            return egress
+
+    def release(self, egress: Egress):
+        """A job on egress has finished, one way or another."""
+        with self._lock:
+            egress.load = max(egress.load - 1, 0)
+
+    def succeeded(self, egress: Egress):
+        with self._lock:
+            egress.failures = 0
+
+    def failed(self, egress: Egress, error_kind: str):
+        """Count a failure of a job on egress; network failures in a row take it out of rotation."""
+        if error_kind != NETWORK:
+            return
+        with self._lock:
+            egress.failures += 1
+            if egress.failures >= MAX_FAILURES and egress.healthy:
+                egress.healthy = False
+                print(f"Egress {egress.spec} taken out of rotation after {egress.failures} network failures")
+
+    def check(self):
+        """Probe every egress once and update which ones are in rotation."""
+        for egress in list(self.egresses):
+            ok = egress.probe()
+            with self._lock:
+                if ok and not egress.healthy:
+                    print(f"Egress {egress.spec} back in rotation")
+                    egress.failures = 0
+                elif not ok and egress.healthy:
+                    print(f"Egress {egress.spec} failed its health check; taken out of rotation")
+                egress.healthy = ok
+
+    def _check_loop(self, interval: float):
+        while True:
+            self.check()
+            if self._stop.wait(interval):
+                return
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Spec, health, load and job count of every egress."""
+        with self._lock:
+            return [{'spec': egress.spec, 'healthy': egress.healthy, 'load': egress.load, 'jobs': egress.jobs}
+                    for egress in self.egresses]
+
+    def close(self):
+        self._stop.set()
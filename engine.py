@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Headless download engine shared by the Tk app and the command-line interface.
+DownloadEngine builds jobs from settings, runs them on the configured
+backend, keeps a status record per job and passes every event on to its
+subscribers. It never touches a UI: front ends submit and cancel jobs and
+render the events they receive.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, List, Optional
+
+from backends import create_backend
+from disk_space import DiskAdmission
+from egress import EgressPool
+from estimates import QueueEstimator
+from jobs import Event, TERMINAL_EVENTS, new_job, run_job
+from settings import job_options
+
+
+# Job states, in the order a job normally passes through them
+QUEUED = 'queued'        # Submitted, not started yet
+WAITING = 'waiting'      # Held until it fits on disk
+RUNNING = 'running'
+RETRYING = 'retrying'    # Backing off before another attempt
+COMPLETE = 'complete'
+FAILED = 'error'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETE, FAILED, CANCELLED)
+
+# Event type -> state a job is in after it
+EVENT_STATES = {
+    'progress': RUNNING,
+    'stage': RUNNING,
+    'info': RUNNING,
+    'held': WAITING,
+    'retry': RETRYING,
+    'complete': COMPLETE,
+    'error': FAILED,
+    'cancelled': CANCELLED,
+}
+
+
+@dataclass(slots=True)
+class JobStatus:
+    """What the engine knows about one job, updated as its events arrive.
+
+    Only small values are kept; the job's info dict and options stay with the
+    worker, so a record costs a few hundred bytes however big the video's
+    format list is.
+    """
+    id: int
+    url: str
+    folder: str
+    download_video: bool
+    download_audio: bool
+    state: str = QUEUED
+    title: Optional[str] = None
+    percentage: float = 0.0
+    message: str = ""  # Latest status, stage, retry or error text
+    error_kind: Optional[str] = None
+    egress: Optional[str] = None  # Source address or proxy the job goes out through
+    result: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+
+class DownloadEngine:
+    """Runs download jobs for a front end.
+
+    settings is a resolved settings dict (see settings.py). The backend is
+    created on the first submit and replaced when configure() changes the
+    settings it depends on; jobs the old one already accepted, running or
+    held for disk space, finish on it while it drains in the background.
+    Subscribers are called with every event, on a worker or pump thread.
+
+    With an egress_pool in the settings, each job is given an egress from
+    it when submitted, and the job's network failures count against that
+    egress's health. A job sent through a proxy or source address extracts
+    its info again through it rather than using info passed in.
+
+    Finished jobs move into a history of the last history_size jobs, so a
+    session that runs for days keeps a bounded number of records.
+    """
+
+    def __init__(self, settings: Dict[str, Any], runner: Callable = run_job):
+        self.settings = settings
+        self.runner = runner
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable] = []
+        self._active: Dict[int, JobStatus] = {}
+        self._history: "OrderedDict[int, JobStatus]" = OrderedDict()  # Finished jobs, oldest first
+        self._job_backends: Dict[int, Any] = {}  # Job ID -> backend it was submitted to
+        self._job_egresses: Dict[int, Any] = {}  # Job ID -> egress it goes out through
+        self._queue = QueueEstimator()
+        self._next_id = 1
+        self._backend = None
+        self._backend_settings = None
+        self._retired: List[threading.Thread] = []  # Replaced backends still draining
+        self._egress_pool = None
+        self._egress_settings = None
+
+    def subscribe(self, callback: Callable[[Event], None]) -> Callable:
+        """Call callback with every event from now on. Returns a function that unsubscribes it."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def configure(self, settings: Dict[str, Any]):
+        """Use new settings for jobs submitted from now on."""
+        self.settings = settings
+
+    def _get_backend(self):
+        """Return the backend for the current settings, and the one it replaced (if any)."""
+        backend_settings = (self.settings['execution_mode'], self.settings['max_workers'],
+                            self.settings['check_disk_space'], self.settings['min_free_space_gb'])
+        if self._backend is not None and self._backend_settings == backend_settings:
+            return self._backend, None
+        old_backend = self._backend
+        admission = DiskAdmission(int(self.settings['min_free_space_gb'] * 1024 ** 3)) \
+            if self.settings['check_disk_space'] else None
+        self._backend = create_backend(self.settings['execution_mode'], self.settings['max_workers'],
+                                       self._on_event, self.runner, admission)
+        self._backend_settings = backend_settings
+        return self._backend, old_backend
+
+    def _retire(self, backend):
+        # Jobs the old backend accepted finish there, held ones included; it reports
+        # events while draining and may wait on jobs, so it drains on its own thread
+        thread = threading.Thread(target=backend.shutdown, kwargs={'wait': True},
+                                  name='retired-backend', daemon=True)
+        thread.start()
+        with self._lock:
+            self._retired = [t for t in self._retired if t.is_alive()] + [thread]
+
+    def _get_egress_pool(self) -> Optional[EgressPool]:
+        egress_settings = (tuple(self.settings['egress_pool']), self.settings['egress_strategy'],
+                           self.settings['egress_check_interval'])
+        if self._egress_settings != egress_settings:
+            if self._egress_pool is not None:
+                # Jobs on the old pool's egresses keep them; only new jobs use the new pool
+                self._egress_pool.close()
+            self._egress_pool = EgressPool(*egress_settings) if self.settings['egress_pool'] else None
+            self._egress_settings = egress_settings
+        return self._egress_pool
+
+    def egress_status(self) -> List[Dict[str, Any]]:
+        """Health and load of each egress in the pool (empty without one)."""
+        with self._lock:
+            pool = self._egress_pool
+        return pool.status() if pool is not None else []
+
+    def submit(self, url: str, folder: str, download_video: bool, download_audio: bool, **options) -> int:
+        """Queue a download and return its job ID.
+
+        options are new_job() options; they override the ones derived from
+        the settings.
+        """
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._active[job_id] = JobStatus(job_id, url, folder, download_video, download_audio)
+            self._queue.add(job_id, options.get('download_bytes'))
+            backend, old_backend = self._get_backend()
+            self._job_backends[job_id] = backend
+            pool = self._get_egress_pool()
+            egress = pool.acquire() if pool is not None else None
+            if egress is not None:
+                self._job_egresses[job_id] = (pool, egress)
+                self._active[job_id].egress = egress.spec
+        if old_backend is not None:
+            self._retire(old_backend)
+        job = new_job(job_id, url, folder, download_video, download_audio,
+                      **{**job_options(self.settings), **options})
+        if egress is not None:
+            # A proxy or source address the caller asked for explicitly wins
+            job['extra_opts'] = {**egress.ydl_options(), **job['extra_opts']}
+            if egress.ydl_options():
+                # Info resolved beforehand came over the default route, and stream URLs
+                # can be tied to the address that asked for them
+                job['info'] = None
+        backend.submit(job)
+        return job_id
+
+    def cancel(self, job_id: int) -> bool:
+        """Ask a job to stop. Returns False if it isn't queued or running."""
+        with self._lock:
+            backend = self._job_backends.get(job_id)
+        if backend is None:
+            return False
+        backend.cancel(job_id)
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            job_ids = list(self._job_backends)
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def job(self, job_id: int) -> Optional[JobStatus]:
+        """A job's status, or None once it has dropped out of the history."""
+        with self._lock:
+            return self._active.get(job_id) or self._history.get(job_id)
+
+    def jobs(self) -> List[JobStatus]:
+        """Recently finished jobs, oldest first, then the ones still queued or running."""
+        with self._lock:
+            return list(self._history.values()) + list(self._active.values())
+
+    def active_count(self) -> int:
+        """Jobs that haven't finished yet."""
+        with self._lock:
+            return len(self._job_backends)
+
+    def queue_eta(self) -> Optional[float]:
+        """Seconds until every queued and running job is done, or None while it can't be estimated."""
+        with self._lock:
+            return self._queue.eta(self.settings['max_workers'])
+
+    def throughput(self) -> float:
+        """Current total download speed in bytes/s."""
+        with self._lock:
+            return self._queue.throughput()
+
+    def _on_event(self, event: Event):
+        with self._lock:
+            status = self._active.get(event['id'])
+            if status is not None:
+                self._apply(status, event)
+            self._queue.on_event(event, time.monotonic())
+            if event['id'] in self._job_egresses:
+                self._track_egress(event)
+            if event['type'] in TERMINAL_EVENTS:
+                self._job_backends.pop(event['id'], None)
+                if status is not None:
+                    del self._active[event['id']]
+                    self._history[event['id']] = status
+                    while len(self._history) > self.settings['history_size']:
+                        self._history.popitem(last=False)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event)
+
+    def _track_egress(self, event: Event):
+        pool, egress = self._job_egresses[event['id']]
+        if event['type'] in ('retry', 'error'):
+            pool.failed(egress, event['kind'])
+        elif event['type'] == 'complete':
+            pool.succeeded(egress)
+        if event['type'] in TERMINAL_EVENTS:
+            del self._job_egresses[event['id']]
+            pool.release(egress)
+
+    @staticmethod
+    def _apply(status: JobStatus, event: Event):
+        status.state = EVENT_STATES.get(event['type'], status.state)
+        if event['type'] == 'progress':
+            status.percentage = event['percentage']
+            status.message = event['status']
+        elif event['type'] == 'info':
+            status.title = event['title']
+        elif event['type'] in ('stage', 'held', 'retry'):
+            status.message = event['message']
+        elif event['type'] == 'complete':
+            status.percentage = 100.0
+            status.result = event['result']
+            status.title = event['result'].get('title', status.title)
+        elif event['type'] == 'error':
+            status.message = event['summary']
+            status.error_kind = event['kind']
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting jobs. With wait, returns once every submitted job has finished."""
+        with self._lock:
+            backend = self._backend
+            pool = self._egress_pool
+            retired = list(self._retired)
+        if backend is not None:
+            backend.shutdown(wait=wait)
+        if wait:
+            for thread in retired:
+                thread.join()
+        if pool is not None:
+            pool.close()
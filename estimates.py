@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Speed and ETA estimates for single jobs and for the whole queue.
+Speeds are exponentially weighted moving averages over time: a brief
+stall or burst moves them a little, a sustained change within a few
+seconds. Only bytes actually moving count, so extraction, format
+selection and conversion never dilute a download speed.
+"""
+
+from typing import Dict, Optional
+
+
+# Seconds after which a speed sample has half its original weight
+SPEED_HALF_LIFE = 3.0
+
+# Weight of the newest post-processing duration in its running average
+POST_PROCESSING_WEIGHT = 0.3
+
+
+class EwmaRate:
+    """Exponentially weighted moving average of a rate, weighted by elapsed time.
+
+    Samples that arrive close together count for less than samples spread
+    out, so the estimate doesn't depend on how often progress is reported.
+    """
+
+    __slots__ = ('half_life', 'value', '_last_time')
+
+    def __init__(self, half_life: float = SPEED_HALF_LIFE):
+        self.half_life = half_life
+        self.value: Optional[float] = None
+        self._last_time: Optional[float] = None
+
+    def update(self, sample: float, now: float):
+        if self.value is None or self._last_time is None:
+            self.value = sample
+        else:
+            weight = 1 - 0.5 ** (max(now - self._last_time, 0) / self.half_life)
+            self.value += weight * (sample - self.value)
+        self._last_time = now
+
+
+class JobEstimator:
+    """Speed and ETA for one job across its download stages.
+
+    Each stage downloads one or more files; update() is fed yt-dlp's
+    progress for the current file. expected_bytes, when known, is what the
+    whole job downloads (every stage), so the ETA covers stages that
+    haven't started yet.
+    """
+
+    __slots__ = ('expected_bytes', 'speed', 'finished_bytes', '_file', '_downloaded', '_total', '_last')
+
+    def __init__(self, expected_bytes: Optional[int] = None, half_life: float = SPEED_HALF_LIFE):
+        self.expected_bytes = expected_bytes
+        self.speed = EwmaRate(half_life)
+        self.finished_bytes = 0  # Bytes in files already downloaded
+        self._file: Optional[str] = None
+        self._downloaded = 0
+        self._total: Optional[int] = None
+        self._last: Optional[tuple] = None  # (downloaded bytes, time) of the previous update
+
+    def update(self, filename: Optional[str], downloaded: int, total: Optional[int], now: float,
+               reported_speed: Optional[float] = None):
+        """Record progress on the current file.
+
+        total may be yt-dlp's exact size or its estimate. reported_speed,
+        yt-dlp's own figure, only seeds the average before there are two
+        samples to measure between.
+        """
+        if filename != self._file:
+            self.finish_file()
+            self._file = filename
+        if self._last is not None and now > self._last[1] and downloaded >= self._last[0]:
+            self.speed.update((downloaded - self._last[0]) / (now - self._last[1]), now)
+        elif self.speed.value is None and reported_speed:
+            self.speed.update(reported_speed, now)
+        self._downloaded = downloaded
+        self._total = total
+        self._last = (downloaded, now)
+
+    def finish_file(self):
+        """The current file is complete; later progress belongs to the next one."""
+        if self._file is not None:
+            self.finished_bytes += max(self._total or 0, self._downloaded)
+        self._file = None
+        self._downloaded = 0
+        self._total = None
+        self._last = None
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return self.finished_bytes + self._downloaded
+
+    def remaining_bytes(self) -> Optional[int]:
+        """Bytes left to download in the whole job, or in the current file if that's all that's known."""
+        current = max(self._total - self._downloaded, 0) if self._total else None
+        if self.expected_bytes:
+            return max(self.expected_bytes - self.downloaded_bytes, current or 0)
+        return current
+
+    def eta(self) -> Optional[float]:
+        remaining = self.remaining_bytes()
+        if remaining is None or not self.speed.value:
+            return None
+        return remaining / self.speed.value
+
+
+class QueueEstimator:
+    """ETA for everything queued and running, from engine events.
+
+    The download time is the bytes left across jobs over the current total
+    throughput. Sizes that aren't known yet are taken to be the average of
+    completed jobs. Post-processing runs alongside other jobs' downloads, so
+    it only adds to the ETA when its backlog outlasts them. The last job's
+    conversion always comes at the end.
+    """
+
+    def __init__(self):
+        self._queued: Dict[int, Optional[int]] = {}  # Not started: job ID -> expected bytes
+        self._running: Dict[int, tuple] = {}  # Job ID -> (speed, remaining bytes, downloaded bytes)
+        self._post_started: Dict[int, float] = {}  # Job ID -> when post-processing began
+        self._completed_bytes = 0
+        self._completed = 0
+        self.post_seconds: Optional[float] = None  # Average post-processing time per stage
+
+    def add(self, job_id: int, expected_bytes: Optional[int] = None):
+        self._queued[job_id] = expected_bytes
+
+    def on_event(self, event, now: float):
+        job_id = event['id']
+        if event['type'] == 'sized':
+            if job_id in self._queued:
+                self._queued[job_id] = event['bytes']
+        elif event['type'] == 'progress':
+            if event['status'] == "Post-processing...":
+                self._post_started.setdefault(job_id, now)
+                if job_id in self._running:
+                    # Nothing left to fetch for this stage; its speed no longer counts
+                    self._running[job_id] = (0.0, 0, self._running[job_id][2])
+                return
+            self._end_post_processing(job_id, now)
+            if event.get('downloaded_bytes') is not None:
+                self._queued.pop(job_id, None)
+                self._running[job_id] = (event.get('speed') or 0.0, event.get('remaining_bytes'),
+                                         event['downloaded_bytes'])
+        elif event['type'] == 'stage':
+            self._end_post_processing(job_id, now)
+        elif event['type'] in ('complete', 'error', 'cancelled'):
+            self._end_post_processing(job_id, now)
+            self._queued.pop(job_id, None)
+            running = self._running.pop(job_id, None)
+            if event['type'] == 'complete' and running:
+                self._completed += 1
+                self._completed_bytes += running[2] + (running[1] or 0)
+
+    def _end_post_processing(self, job_id: int, now: float):
+        started = self._post_started.pop(job_id, None)
+        if started is None:
+            return
+        duration = now - started
+        if self.post_seconds is None:
+            self.post_seconds = duration
+        else:
+            self.post_seconds += POST_PROCESSING_WEIGHT * (duration - self.post_seconds)
+
+    def throughput(self) -> float:
+        """Total bytes/s across running jobs."""
+        return sum(speed for speed, _, _ in self._running.values())
+
+    def eta(self, workers: int) -> Optional[float]:
+        """Seconds until every known job is done, or None until there is enough to go on."""
+        average = self._completed_bytes / self._completed if self._completed else None
+        remaining = 0
+        for _, left, done in self._running.values():
+            if left is None and average is None:
+                return None
+            remaining += left if left is not None else max(average - done, 0)
+        for expected in self._queued.values():
+            if expected is None and average is None:
+                return None
+            remaining += expected if expected is not None else average
+        throughput = self.throughput()
+        if remaining and not throughput:
+            return None
+        download_time = remaining / throughput if remaining else 0.0
+        post = self.post_seconds or 0.0
+        jobs_left = len(set(self._queued) | set(self._running) | set(self._post_started))
+        post_backlog = jobs_left * post / max(workers, 1)
+        return max(download_time, post_backlog) + (post if jobs_left else 0.0)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+FFmpeg post-processing for downloaded streams.
+Every FFmpeg child process is tied to a cancel token and terminated as
+soon as its job is cancelled, including the ones yt-dlp starts itself
+(section downloads, merges) while a job runs under cancel_children(),
+once install_cancellable_popen() has been called.
+"""
+
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import yt_dlp.downloader.external
+import yt_dlp.postprocessor.ffmpeg
+from yt_dlp.utils import Popen
+
+from cancellation import CancelToken, DownloadCancelled
+
+
+# Seconds FFmpeg gets to exit after SIGTERM before it is killed
+TERMINATE_GRACE = 2.0
+
+AAC_CODECS = ('aac', 'mp4a')
+
+# Codec arguments for MP4 conversion
+ENCODER_PROFILES = {
+    'default': [],  # FFmpeg's default MP4 codecs
+    'fast': ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-c:a', 'aac'],
+    'balanced': ['-c:v', 'libx264', '-preset', 'medium', '-crf', '21', '-c:a', 'aac'],
+    'small': ['-c:v', 'libx265', '-preset', 'medium', '-crf', '28', '-tag:v', 'hvc1', '-c:a', 'aac'],
+}
+DEFAULT_ENCODER_PROFILE = 'default'
+
+# Video codecs an MP4 can hold as they are
+MP4_VIDEO_CODECS = ('avc1', 'h264', 'hvc1', 'hev1', 'hevc', 'h265', 'av01')
+
+# Outputs a job can produce from one download. video/audio: streams the output
+# carries. copy_*: codecs it takes without re-encoding (None: any). audio_args:
+# how audio is encoded otherwise; video is encoded with the job's encoder profile.
+RENDITIONS = {
+    'mp4': {'ext': 'mp4', 'video': True, 'audio': True, 'copy_video': MP4_VIDEO_CODECS,
+            'copy_audio': AAC_CODECS, 'audio_args': ['-c:a', 'aac', '-b:a', '192k']},
+    'mkv': {'ext': 'mkv', 'video': True, 'audio': True, 'copy_video': None,
+            'copy_audio': None, 'audio_args': []},
+    'm4a': {'ext': 'm4a', 'video': False, 'audio': True,
+            'copy_audio': AAC_CODECS, 'audio_args': ['-c:a', 'aac', '-b:a', '192k']},
+    'mp3': {'ext': 'mp3', 'video': False, 'audio': True,
+            'copy_audio': ('mp3',), 'audio_args': ['-c:a', 'libmp3lame', '-q:a', '2']},
+}
+
+
+class FFmpegError(Exception):
+    """Raised when FFmpeg exits with an error."""
+
+
+def ffmpeg_binary(ffmpeg_location: Optional[str]) -> str:
+    """Resolve an ffmpeg_location option (file, directory or None) to an executable."""
+    if not ffmpeg_location:
+        return 'ffmpeg'
+    if os.path.isdir(ffmpeg_location):
+        return os.path.join(ffmpeg_location, 'ffmpeg')
+    return ffmpeg_location
+
+
+def _terminate(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(TERMINATE_GRACE)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def terminate_on_cancel(process: subprocess.Popen, token: CancelToken) -> Callable:
+    """Terminate process when token is cancelled. Returns an unregister function."""
+    # Terminate from a separate thread so cancel() itself never waits on FFmpeg
+    return token.add_callback(
+        lambda: threading.Thread(target=_terminate, args=(process,), daemon=True).start())
+
+
+_children = threading.local()
+
+
+class _CancellablePopen(Popen):
+    """yt-dlp's Popen, tied to the token of the job running in the thread that starts it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        token = getattr(_children, 'token', None)
+        self._unregister = terminate_on_cancel(self, token) if token is not None else (lambda: None)
+
+    def __exit__(self, *exc_info):
+        self._unregister()
+        return super().__exit__(*exc_info)
+
+
+def install_cancellable_popen():
+    """Make yt-dlp start its FFmpeg children as _CancellablePopen. Safe to call repeatedly.
+
+    yt-dlp has no hook for the processes it starts, so this replaces the Popen
+    its downloader and postprocessor modules use, for the whole process. It is
+    the one yt-dlp override outside ydl_session.py's shim; run_job() calls it,
+    and children started outside cancel_children() behave exactly as before.
+    """
+    yt_dlp.downloader.external.Popen = _CancellablePopen
+    yt_dlp.postprocessor.ffmpeg.Popen = _CancellablePopen
+
+
+@contextmanager
+def cancel_children(token: CancelToken):
+    """Terminate the child processes yt-dlp starts in this thread when token is cancelled."""
+    previous = getattr(_children, 'token', None)
+    _children.token = token
+    try:
+        yield
+    finally:
+        _children.token = previous
+
+
+def _remove_quietly(paths: Sequence[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def run_ffmpeg(args: List[str], ffmpeg_location: Optional[str], token: CancelToken, outputs: Sequence[str] = ()):
+    """Run FFmpeg with args, removing outputs if it fails or is cancelled."""
+    token.raise_if_cancelled()
+    cmd = [ffmpeg_binary(ffmpeg_location), '-y', '-hide_banner', '-nostdin', '-loglevel', 'error', *args]
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True)
+
+    unregister = terminate_on_cancel(process, token)
+    try:
+        _, stderr = process.communicate()
+    finally:
+        unregister()
+
+    if token.cancelled:
+        _remove_quietly(outputs)
+        raise DownloadCancelled("Download cancelled by user")
+    if process.returncode != 0:
+        _remove_quietly(outputs)
+        message = stderr.strip().splitlines()[-1] if stderr.strip() else f"exit code {process.returncode}"
+        raise FFmpegError(f"FFmpeg failed: {message}")
+
+
+def convert_video_to_mp4(src: str, ffmpeg_location: Optional[str], token: CancelToken,
+                         encoder_profile: str = DEFAULT_ENCODER_PROFILE) -> str:
+    """Convert a video file to MP4 with a profile from ENCODER_PROFILES. Returns the new path."""
+    root, ext = os.path.splitext(src)
+    if ext.lower() == '.mp4':
+        return src
+    dest = root + '.mp4'
+    temp_path = root + '.temp.mp4'
+    run_ffmpeg(['-i', src, *ENCODER_PROFILES[encoder_profile], temp_path], ffmpeg_location, token,
+               outputs=[temp_path])
+    os.replace(temp_path, dest)
+    os.remove(src)
+    return dest
+
+
+def extract_audio_m4a(src: str, acodec: Optional[str], ffmpeg_location: Optional[str], token: CancelToken,
+                      bitrate: str = '192k') -> str:
+    """Convert an audio stream to M4A, copying it when it is already AAC. Returns the new path."""
+    root, ext = os.path.splitext(src)
+    is_aac = bool(acodec) and acodec.split('.')[0].lower() in AAC_CODECS
+    if ext.lower() == '.m4a' and is_aac:
+        return src
+    dest = root + '.m4a'
+    temp_path = root + '.temp.m4a'
+    codec_args = ['-c:a', 'copy'] if is_aac else ['-c:a', 'aac', '-b:a', bitrate]
+    run_ffmpeg(['-i', src, '-vn', *codec_args, temp_path], ffmpeg_location, token, outputs=[temp_path])
+    os.replace(temp_path, dest)
+    if dest != src:
+        os.remove(src)
+    return dest
+
+
+def rendition_media(renditions: Sequence[str]) -> Tuple[bool, bool]:
+    """Whether a set of renditions needs a video stream and an audio stream."""
+    return (any(RENDITIONS[name]['video'] for name in renditions),
+            any(RENDITIONS[name]['audio'] for name in renditions))
+
+
+def _copyable(codec: Optional[str], allowed: Optional[Sequence[str]]) -> bool:
+    if allowed is None:
+        return True
+    # An unknown codec (None) is re-encoded rather than guessed at
+    return bool(codec) and codec.split('.')[0].lower() in allowed
+
+
+def render_outputs(base: str, renditions: Sequence[str], video: Optional[Tuple[str, Optional[str]]],
+                   audio: Optional[Tuple[str, Optional[str]]], ffmpeg_location: Optional[str], token: CancelToken,
+                   encoder_profile: str = DEFAULT_ENCODER_PROFILE) -> Dict[str, str]:
+    """Write base.<ext> for every rendition in a single FFmpeg run. Returns rendition -> path.
+
+    video and audio are (path, codec) of the downloaded streams, and may be
+    the same file. Each stream is read and demuxed once; outputs whose
+    container accepts the codec get a copy, the rest are encoded.
+    """
+    inputs: List[str] = []
+    for stream in (video, audio):
+        if stream and stream[0] not in inputs:
+            inputs.append(stream[0])
+    args: List[str] = []
+    for path in inputs:
+        args += ['-i', path]
+
+    outputs = {}
+    temp_paths = []
+    for name in renditions:
+        rendition = RENDITIONS[name]
+        output_args = []
+        if rendition['video'] and video:
+            # Trailing '?': a combined stream without video just gives an audio-only output
+            output_args += ['-map', f"{inputs.index(video[0])}:v:0?"]
+            if _copyable(video[1], rendition['copy_video']):
+                output_args += ['-c:v', 'copy']
+            else:
+                output_args += ENCODER_PROFILES[encoder_profile]
+        if rendition['audio'] and audio:
+            output_args += ['-map', f"{inputs.index(audio[0])}:a:0?"]
+            output_args += ['-c:a', 'copy'] if _copyable(audio[1], rendition['copy_audio']) else rendition['audio_args']
+        if not output_args:
+            raise FFmpegError(f"No {'video' if rendition['video'] else 'audio'} stream to make {name} from")
+        temp_path = f"{base}.temp.{rendition['ext']}"
+        args += [*output_args, temp_path]
+        temp_paths.append(temp_path)
+        outputs[name] = f"{base}.{rendition['ext']}"
+
+    run_ffmpeg(args, ffmpeg_location, token, outputs=temp_paths)
+    for temp_path, dest in zip(temp_paths, outputs.values()):
+        os.replace(temp_path, dest)
+    return outputs
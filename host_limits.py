@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Per-host politeness limits for every request a job makes.
+Extractor API calls, manifest and fragment requests and progressive
+downloads all count against their host: at most max_connections at a
+time, started at least min_interval apart. A 429 or 503 from a host slows
+it down (fewer connections, wider spacing, and any Retry-After honoured);
+the slowdown fades once the host stops complaining.
+
+The counters live in shared memory, so thread jobs and process workers
+started from the same DownloadEngine process obey the same limits.
+A limiter can count its connections in a separate pool (bulk metadata
+lookups use LOOKUP_POOL), so it doesn't compete with downloads for the
+host's connections; spacing and throttle slowdowns are still shared.
+"""
+
+import time
+import zlib
+import weakref
+import threading
+import multiprocessing
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from cancellation import CancelToken
+from retries import wait_or_cancel
+
+
+# Hosts are hashed into this many shared counters; a collision only makes two hosts share a limit
+HOST_SLOTS = 4096
+
+DEFAULT_MAX_CONNECTIONS = 6
+DEFAULT_MIN_INTERVAL = 0.0
+
+# Connection pool of bulk metadata lookups (metadata_resolver.py)
+LOOKUP_POOL = 'lookup'
+
+# Responses that mean "slow down"
+THROTTLE_STATUSES = (429, 503)
+
+# Each throttle response doubles a host's slowdown, up to this factor
+MAX_SLOWDOWN = 16.0
+
+# Throttle responses this close together are one burst and slow a host down once
+THROTTLE_BURST = 2.0
+
+# Seconds for a slowdown to fade halfway back to normal
+SLOWDOWN_HALF_LIFE = 60.0
+
+# Spacing used while a host is slowed down, if min_interval is smaller
+THROTTLED_INTERVAL = 0.5
+
+# Longest Retry-After that is honoured; beyond it the job's own retries take over
+MAX_RETRY_AFTER = 120.0
+
+# How often a request waiting for a slot checks again
+POLL_INTERVAL = 0.05
+
+
+def request_host(req) -> str:
+    """Host of a yt-dlp Request or URL string."""
+    url = req if isinstance(req, str) else req.url
+    return (urlparse(url).hostname or '').lower()
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Seconds from a numeric Retry-After header, if any."""
+    try:
+        return min(max(float(headers.get('Retry-After')), 0.0), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimits:
+    """Shared per-host connection counts, next start times and slowdowns.
+
+    Created once per process (see get_host_limits()) and handed to process
+    workers when they start, like the cancellation flags.
+    """
+
+    def __init__(self):
+        # Spawn-context objects can be passed to spawned workers and used locally alike
+        context = multiprocessing.get_context('spawn')
+        self._lock = context.Lock()
+        self._active = context.RawArray('i', HOST_SLOTS)
+        self._next_start = context.RawArray('d', HOST_SLOTS)
+        self._slowdown = context.RawArray('d', HOST_SLOTS)  # Factor at the last throttle response, 0 if none
+        self._throttled_at = context.RawArray('d', HOST_SLOTS)
+        self._throttles = context.RawArray('i', HOST_SLOTS)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in
+                ('_lock', '_active', '_next_start', '_slowdown', '_throttled_at', '_throttles')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _slot(host: str) -> int:
+        return zlib.crc32(host.encode()) % HOST_SLOTS
+
+    def _current_slowdown(self, slot: int, now: float) -> float:
+        if self._slowdown[slot] <= 1.0:
+            return 1.0
+        faded = 0.5 ** ((now - self._throttled_at[slot]) / SLOWDOWN_HALF_LIFE)
+        return 1.0 + (self._slowdown[slot] - 1.0) * faded
+
+    @classmethod
+    def _connection_slot(cls, host: str, pool: str) -> int:
+        return cls._slot(f"{pool}:{host}" if pool else host)
+
+    def acquire(self, host: str, max_connections: int, min_interval: float, token: CancelToken,
+                take_connection: bool = True, pool: str = ''):
+        """Wait until host may be sent another request. Raises if the token is cancelled.
+
+        Returns True if the request took one of the host's connections in pool,
+        which must be given back with release(). max_connections of 0 means no
+        connection limit; without take_connection only the spacing applies.
+        """
+        slot = self._slot(host)
+        connection_slot = self._connection_slot(host, pool)
+        while True:
+            token.raise_if_cancelled()
+            with self._lock:
+                now = time.monotonic()
+                slowdown = self._current_slowdown(slot, now)
+                limit = max(1, int(max_connections / slowdown)) if max_connections else None
+                interval = max(min_interval, THROTTLED_INTERVAL) * slowdown if slowdown > 1.0 else min_interval
+                counted = take_connection and limit is not None
+                if not counted or self._active[connection_slot] < limit:
+                    start = max(now, self._next_start[slot])
+                    self._next_start[slot] = start + interval
+                    if counted:
+                        self._active[connection_slot] += 1
+                    break
+            wait_or_cancel(token, POLL_INTERVAL)
+        # The start time is reserved; waiting for it doesn't hold the lock
+        if start > now:
+            try:
+                wait_or_cancel(token, start - now)
+            except BaseException:
+                if counted:
+                    self.release(host, pool)
+                raise
+        return counted
+
+    def release(self, host: str, pool: str = ''):
+        slot = self._connection_slot(host, pool)
+        with self._lock:
+            self._active[slot] = max(self._active[slot] - 1, 0)
+
+    def throttled(self, host: str, retry_after: Optional[float] = None):
+        """Record a throttle response from host: slow it down, and pause it for retry_after seconds."""
+        slot = self._slot(host)
+        with self._lock:
+            now = time.monotonic()
+            self._throttles[slot] += 1
+            if self._slowdown[slot] <= 1.0 or now - self._throttled_at[slot] >= THROTTLE_BURST:
+                self._slowdown[slot] = min(max(self._current_slowdown(slot, now) * 2, 2.0), MAX_SLOWDOWN)
+                self._throttled_at[slot] = now
+            if retry_after:
+                self._next_start[slot] = max(self._next_start[slot], now + retry_after)
+
+    def status(self, host: str, pool: str = '') -> Dict[str, float]:
+        """Current connections in pool, slowdown factor and throttle count for host."""
+        slot = self._slot(host)
+        with self._lock:
+            return {'active': self._active[self._connection_slot(host, pool)], 'slowdown': self._current_slowdown(slot, time.monotonic()),
+                    'throttles': self._throttles[slot]}
+
+
+class HostLimiter:
+    """One job's view of the shared limits, with its configured caps.
+
+    A thread that already holds a connection to a host (say, a response it
+    hasn't finished with) doesn't wait for a second one, so a low limit can
+    never deadlock a job against itself.
+    """
+
+    def __init__(self, limits: HostLimits, max_connections: int, min_interval: float, pool: str = ''):
+        self.limits = limits
+        self.max_connections = max_connections
+        self.min_interval = min_interval
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._held: Dict[Tuple[int, str], int] = {}
+
+    def acquire(self, host: str, token: CancelToken) -> Callable[[], None]:
+        """Wait for a slot on host. Returns the function that gives it back (safe to call more than once)."""
+        key = (threading.get_ident(), host)
+        with self._lock:
+            reentrant = self._held.get(key, 0) > 0
+        counted = self.limits.acquire(host, self.max_connections, self.min_interval, token,
+                                      take_connection=not reentrant, pool=self.pool)
+        with self._lock:
+            self._held[key] = self._held.get(key, 0) + 1
+        released = []
+
+        def release():
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self._held[key] -= 1
+                if not self._held[key]:
+                    del self._held[key]
+            if counted:
+                self.limits.release(host, self.pool)
+        return release
+
+    def throttled(self, host: str, headers=None):
+        self.limits.throttled(host, retry_after_seconds(headers) if headers is not None else None)
+
+
+def host_limiter(max_connections: int, min_interval: float, pool: str = '') -> Optional[HostLimiter]:
+    """A limiter on this process's shared limits with these caps, or None if they limit nothing."""
+    if not max_connections and not min_interval:
+        return None
+    return HostLimiter(get_host_limits(), max_connections, min_interval, pool)
+
+
+def hold_until_done(response, release: Callable[[], None]):
+    """Call release once response has been read to the end, closed or garbage collected."""
+    ref = weakref.ref(response)
+    cls = type(response)
+
+    def read(amt=None):
+        data = cls.read(ref(), amt)
+        if (amt is None or amt < 0) or (amt and not data):
+            release()
+        return data
+
+    def close():
+        try:
+            cls.close(ref())
+        finally:
+            release()
+
+    # Looked up on the instance first, including by IOBase's finalizer
+    response.read = read
+    response.close = close
+    weakref.finalize(response, release)
+
+
+_limits: Optional[HostLimits] = None
+_limits_lock = threading.Lock()
+
+
+def get_host_limits() -> HostLimits:
+    """The limits shared by this process's jobs, created on first use."""
+    global _limits
+    with _limits_lock:
+        if _limits is None:
+            _limits = HostLimits()
+        return _limits
+
+
+def set_host_limits(limits: HostLimits):
+    """Use limits shared with another process (called in process workers)."""
+    global _limits
+    with _limits_lock:
+        _limits = limits
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion: URL lists dropped into a directory become jobs.
+.txt files hold URLs, one or more per line, with '# key: value' lines
+setting options for the lines after them. .jsonl files hold one object
+per line: {"url": ..., options...} for an entry, or {"options": {...}}
+for options that apply to the entries after it.
+
+Files are read incrementally, so a list that is still being appended to
+is picked up line by line. What happened to each entry is appended to a
+manifest next to the input (list.txt -> list.txt.results.jsonl); entries
+already in the manifest are skipped when the file is read again, e.g.
+after a restart.
+
+Directories are watched with inotify where the C library has it, and
+polled otherwise.
+"""
+
+import os
+import json
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
+
+from url_tools import extract_urls, is_http_url
+
+
+INBOX_SUFFIXES = ('.txt', '.jsonl')
+MANIFEST_SUFFIX = '.results.jsonl'
+
+# Seconds between directory scans when polling, and between checks for quiet files with inotify
+DEFAULT_POLL_INTERVAL = 2.0
+
+# An unterminated last line is taken as complete once its file has been quiet this long
+SETTLE_SECONDS = 2.0
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InboxError(ValueError):
+    """Raised for an inbox entry or option that can't be used."""
+
+
+@dataclass(slots=True)
+class InboxEntry:
+    """One URL from an input file, with the options in effect for it."""
+    path: str
+    line: int
+    url: Optional[str]
+    options: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None  # Set instead of a URL for lines that can't be parsed
+
+
+def is_inbox_file(name: str) -> bool:
+    return (name.endswith(INBOX_SUFFIXES) and not name.endswith(MANIFEST_SUFFIX)
+            and not name.startswith('.'))
+
+
+def manifest_path(path: str) -> str:
+    return path + MANIFEST_SUFFIX
+
+
+def parse_directive(text: str) -> Optional[Tuple[str, str]]:
+    """(key, value) for a '# key: value' line in a .txt list, or None for a plain comment."""
+    key, sep, value = text.lstrip('#').partition(':')
+    key = key.strip().lower().replace('-', '_')
+    if not sep or not key.isidentifier():
+        return None
+    return key, value.strip()
+
+
+class Manifest:
+    """Append-only JSON-lines record of the entries of one input file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def recorded(self) -> Set[Tuple[int, Optional[str]]]:
+        """(line, url) of every entry already in the manifest."""
+        done = set()
+        try:
+            with open(self.path, 'r') as f:
+                for text in f:
+                    try:
+                        record = json.loads(text)
+                        done.add((record['line'], record.get('url')))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # A line cut short by a crash
+        except FileNotFoundError:
+            pass
+        return done
+
+    def write(self, entry: InboxEntry, state: str, **fields):
+        record = {'line': entry.line, 'url': entry.url, 'state': state, **fields,
+                  'finished': datetime.now().isoformat(timespec='seconds')}
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+class InboxFile:
+    """Read position and option state of one input file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest = Manifest(manifest_path(path))
+        self._reset(None)
+
+    def _reset(self, inode: Optional[int]):
+        self.inode = inode
+        self.offset = 0
+        self.line = 0
+        self.tail = b''
+        self.options: Dict[str, Any] = {}
+        self.size = -1
+        self.changed = time.monotonic()
+        self.done = self.manifest.recorded()
+
+    def read(self, final: bool = False) -> List[InboxEntry]:
+        """Entries in lines added since the last read.
+
+        A last line without a newline is held back until final (the writer
+        closed the file, or it has been quiet for a while).
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self.inode or stat.st_size < self.offset:
+                    # Replaced or truncated: start over, skipping what the manifest already has
+                    self._reset(stat.st_ino)
+                if stat.st_size != self.size:
+                    self.size = stat.st_size
+                    self.changed = time.monotonic()
+                f.seek(self.offset)
+                data = self.tail + f.read()
+                self.offset = f.tell()
+        except OSError:
+            return []
+        lines = data.split(b'\n')
+        self.tail = lines.pop()
+        if final and self.tail.strip():
+            lines.append(self.tail)
+            self.tail = b''
+        entries = []
+        for raw in lines:
+            self.line += 1
+            for entry in self._parse(raw.decode('utf-8', errors='replace').strip()):
+                if (entry.line, entry.url) not in self.done:
+                    self.done.add((entry.line, entry.url))
+                    entries.append(entry)
+        return entries
+
+    def quiet(self) -> bool:
+        """Whether a held-back last line has had no company for SETTLE_SECONDS."""
+        return bool(self.tail.strip()) and time.monotonic() - self.changed >= SETTLE_SECONDS
+
+    def _parse(self, text: str) -> List[InboxEntry]:
+        if not text:
+            return []
+        if self.path.endswith('.jsonl'):
+            return self._parse_json(text)
+        if text.startswith('#'):
+            directive = parse_directive(text)
+            if directive:
+                self.options[directive[0]] = directive[1]
+            return []
+        return [InboxEntry(self.path, self.line, url, dict(self.options)) for url in extract_urls(text)]
+
+    def _parse_json(self, text: str) -> List[InboxEntry]:
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            return [InboxEntry(self.path, self.line, None, error=f"Not JSON: {e}")]
+        if not isinstance(record, dict):
+            return [InboxEntry(self.path, self.line, None, error="Expected a JSON object")]
+        if 'url' in record:
+            if not isinstance(record['url'], str) or not is_http_url(record['url']):
+                return [InboxEntry(self.path, self.line, None, error="'url' must be an http(s) URL")]
+            options = {key: value for key, value in record.items() if key != 'url'}
+            return [InboxEntry(self.path, self.line, record['url'], {**self.options, **options})]
+        if isinstance(record.get('options'), dict):
+            self.options.update(record['options'])
+            return []
+        return [InboxEntry(self.path, self.line, None, error="Expected a 'url' or an 'options' object")]
+
+
+class _Inotify:
+    """Minimal ctypes binding for inotify; raises OSError where it isn't available."""
+
+    def __init__(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self.fd = libc.inotify_init1(IN_NONBLOCK)
+        except (AttributeError, TypeError) as e:
+            raise OSError(f"inotify is not available: {e}")
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, directory: str):
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        wd = self._add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Can't watch {directory}")
+        self.watches[wd] = directory
+
+    def read(self, timeout: float) -> List[Tuple[Optional[str], int]]:
+        """(path, mask) of events within timeout; path is None after a queue overflow."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif wd in self.watches and name:
+                events.append((os.path.join(self.watches[wd], os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InboxWatcher:
+    """Feeds the entries of every list in some directories to on_entries as they appear.
+
+    on_entries is called from the thread running run(). With poll, the
+    directories are scanned every poll_interval seconds even where
+    inotify is available.
+    """
+
+    def __init__(self, directories: List[str], on_entries: Callable[[List[InboxEntry]], None],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, poll: bool = False):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.on_entries = on_entries
+        self.poll_interval = poll_interval
+        self.files: Dict[str, InboxFile] = {}
+        self.inotify = None
+        if not poll:
+            try:
+                inotify = _Inotify()
+                for directory in self.directories:
+                    inotify.add_watch(directory)
+                self.inotify = inotify
+            except OSError as e:
+                print(f"Stage: ⚠️ Polling for new files every {poll_interval:g}s ({e})")
+
+    @property
+    def mode(self) -> str:
+        return 'inotify' if self.inotify is not None else 'polling'
+
+    def _read(self, path: str, final: bool = False):
+        inbox_file = self.files.get(path)
+        if inbox_file is None:
+            inbox_file = self.files[path] = InboxFile(path)
+        entries = inbox_file.read(final)
+        if not final and inbox_file.quiet():
+            entries += inbox_file.read(final=True)
+        if entries:
+            self.on_entries(entries)
+
+    def scan(self, final: bool = False):
+        """Read whatever is new in every list, and any quiet last lines (every last line, with final)."""
+        for directory in self.directories:
+            try:
+                names = sorted(entry.name for entry in os.scandir(directory) if entry.is_file())
+            except OSError as e:
+                print(f"Stage: ⚠️ Can't read {directory}: {e}")
+                continue
+            for name in filter(is_inbox_file, names):
+                self._read(os.path.join(directory, name), final)
+
+    def run(self, stop: threading.Event):
+        """Watch until stop is set. Lists already in the directories are read first."""
+        self.scan()
+        try:
+            while not stop.is_set():
+                if self.inotify is None:
+                    stop.wait(self.poll_interval)
+                    self.scan()
+                    continue
+                for path, mask in self.inotify.read(min(self.poll_interval, SETTLE_SECONDS)):
+                    if path is None:
+                        self.scan()
+                    elif is_inbox_file(os.path.basename(path)):
+                        # A closed or moved-in file is complete, unterminated last line included
+                        self._read(path, final=bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+                for path, inbox_file in list(self.files.items()):
+                    if inbox_file.quiet():
+                        self._read(path)
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
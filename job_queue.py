@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Shared job queue for running downloads on several machines.
+The queue is a SQLite file that every worker can reach (a local disk for
+workers on one host, or a shared volume with working file locks). Workers
+lease jobs for a limited time and renew the lease with heartbeats; a job
+whose worker stops heartbeating is leased to another worker. Only the
+worker holding the current lease can record a job's outcome, so each job
+finishes exactly once.
+"""
+
+import os
+import json
+import time
+import contextlib
+import sqlite3
+import socket
+import threading
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+
+# Seconds a lease lasts without a heartbeat
+DEFAULT_LEASE_SECONDS = 60.0
+
+# Leases a job may lose (worker died or hung) before it is failed instead of reassigned
+DEFAULT_MAX_LEASES = 3
+
+# Seconds between polls of an empty queue
+POLL_INTERVAL = 1.0
+
+# A running job's progress is written to the queue at most this often
+PROGRESS_INTERVAL = 1.0
+
+# Job states
+QUEUED = 'queued'
+LEASED = 'leased'
+COMPLETE = 'complete'
+FAILED = 'error'
+CANCELLED = 'cancelled'
+
+PENDING_STATES = (QUEUED, LEASED)
+
+# Engine events copied into the queue's event log for whoever is watching
+LOGGED_EVENTS = ('info', 'stage', 'retry', 'held', 'error', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    leases INTEGER NOT NULL DEFAULT 0,
+    percentage REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    worker TEXT,
+    event TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SharedQueue:
+    """Jobs, leases and worker-reported events in one SQLite file.
+
+    Every call opens its own connection, so one instance can be used from
+    any number of threads, and every process on every host sees the same
+    state. Writes that must not interleave run in IMMEDIATE transactions.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.timeout = timeout
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection's own context manager only ends a transaction; this closes it too
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            yield db
+        finally:
+            db.close()
+
+    def _write(self, db: sqlite3.Connection, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(sql, params)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return cursor
+
+    def enqueue(self, spec: Dict[str, Any]) -> int:
+        """Add a job. spec holds url, folder, download_video, download_audio and any new_job() options."""
+        with self._connect() as db:
+            return self._write(db, "INSERT INTO jobs (spec, updated) VALUES (?, ?)",
+                               (json.dumps(spec), time.time())).lastrowid
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+              max_leases: int = DEFAULT_MAX_LEASES) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Take the oldest job that is queued or whose lease has expired. Returns (job ID, spec) or None."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                # Jobs whose workers keep dying are failed rather than handed out forever
+                db.execute("UPDATE jobs SET state = ?, message = ?, updated = ? "
+                           "WHERE state = ? AND lease_expires < ? AND leases >= ?",
+                           (FAILED, f"Lease lost {max_leases} times; giving up", now, LEASED, now, max_leases))
+                row = db.execute("SELECT id, spec FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                                 "ORDER BY id LIMIT 1", (QUEUED, LEASED, now)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, leases = leases + 1, "
+                               "updated = ? WHERE id = ?", (LEASED, worker, now + lease_seconds, now, row['id']))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return (row['id'], json.loads(row['spec'])) if row is not None else None
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend a lease. Returns False if the worker no longer holds it and should stop the job."""
+        now = time.time()
+        with self._connect() as db:
+            cursor = self._write(db, "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                                 (now + lease_seconds, job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def report_progress(self, job_id: int, worker: str, percentage: float, message: str):
+        """Record a job's latest progress (kept on the job, not in the event log)."""
+        with self._connect() as db:
+            self._write(db, "UPDATE jobs SET percentage = ?, message = ?, updated = ? "
+                            "WHERE id = ? AND worker = ? AND state = ?",
+                        (percentage, message, time.time(), job_id, worker, LEASED))
+
+    def add_event(self, job_id: int, worker: str, event: Dict[str, Any]):
+        with self._connect() as db:
+            self._write(db, "INSERT INTO events (job_id, worker, event, created) VALUES (?, ?, ?, ?)",
+                        (job_id, worker, json.dumps(event), time.time()))
+
+    def finish(self, job_id: int, worker: str, state: str, result: Optional[Dict[str, Any]] = None,
+               message: str = "") -> bool:
+        """Record a job's outcome. Returns False (and records nothing) if the worker lost the lease."""
+        with self._connect() as db:
+            cursor = self._write(db, "UPDATE jobs SET state = ?, result = ?, message = ?, percentage = ?, "
+                                     "lease_expires = NULL, updated = ? WHERE id = ? AND worker = ? AND state = ?",
+                                 (state, json.dumps(result) if result is not None else None, message,
+                                  100.0 if state == COMPLETE else 0.0, time.time(), job_id, worker, LEASED))
+        return cursor.rowcount == 1
+
+    def release(self, job_id: int, worker: str):
+        """Give a leased job back to the queue, e.g. when a worker shuts down."""
+        with self._connect() as db:
+            self._write(db, "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, leases = leases - 1, "
+                            "updated = ? WHERE id = ? AND worker = ? AND state = ?",
+                        (QUEUED, time.time(), job_id, worker, LEASED))
+
+    def events_since(self, last_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Events reported after last_id, oldest first, each with its log ID, job ID and worker."""
+        with self._connect() as db:
+            rows = db.execute("SELECT id, job_id, worker, event FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                              (last_id, limit)).fetchall()
+        return [{'log_id': row['id'], 'job_id': row['job_id'], 'worker': row['worker'], **json.loads(row['event'])}
+                for row in rows]
+
+    def jobs(self, job_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Every job (or the given ones) with its state, worker and latest progress."""
+        with self._connect() as db:
+            sql = "SELECT id, spec, state, worker, leases, percentage, message, result FROM jobs"
+            params: tuple = ()
+            if job_ids is not None:
+                sql += f" WHERE id IN ({','.join('?' * len(job_ids))})"
+                params = tuple(job_ids)
+            rows = db.execute(sql + " ORDER BY id", params).fetchall()
+        return [{**dict(row), 'spec': json.loads(row['spec']),
+                 'result': json.loads(row['result']) if row['result'] else None} for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each state."""
+        with self._connect() as db:
+            rows = db.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+
+class QueueWorker:
+    """Leases jobs from a SharedQueue and runs them on a DownloadEngine.
+
+    It holds at most the engine's max_workers leases at a time, renews them
+    from a heartbeat thread, and writes progress and outcomes back to the
+    queue. A job whose lease can't be renewed (it expired and went to
+    another worker) is cancelled here, so it isn't downloaded twice.
+    options are new_job() options applied to every job, under the job's own.
+    """
+
+    def __init__(self, queue: SharedQueue, engine, worker_id: Optional[str] = None,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, options: Optional[Dict[str, Any]] = None,
+                 log: Callable[[str], None] = print):
+        self.queue = queue
+        self.engine = engine
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.options = options or {}
+        self.log = log
+        self._lock = threading.RLock()  # Events can arrive while submit() is still running
+        self._leases: Dict[int, int] = {}  # Engine job ID -> queue job ID
+        self._lost = set()  # Engine job IDs whose lease went to another worker
+        self._last_progress: Dict[int, float] = {}
+        self._slots = threading.Semaphore(engine.settings['max_workers'])
+        self._stopping = threading.Event()  # No new leases
+        self._interrupted = False  # Running jobs were cancelled because the worker is exiting
+        self._done = threading.Event()  # Every job has finished; heartbeats can stop
+
+    def run(self, exit_when_idle: bool = False):
+        """Lease and run jobs until stop() is called or, with exit_when_idle, the queue has none left.
+
+        KeyboardInterrupt cancels the running jobs and returns their leases to
+        the queue before it propagates.
+        """
+        unsubscribe = self.engine.subscribe(self._on_event)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="queue-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while not self._stopping.is_set():
+                if not self._slots.acquire(timeout=POLL_INTERVAL):
+                    continue
+                leased = self.queue.lease(self.worker_id, self.lease_seconds)
+                if leased is None:
+                    self._slots.release()
+                    # Wait for other workers' leases too: if one of them dies, its jobs come back
+                    if exit_when_idle and not any(self.queue.counts().get(state) for state in PENDING_STATES):
+                        break
+                    self._stopping.wait(POLL_INTERVAL)
+                    continue
+                self._start(*leased)
+            self.engine.shutdown(wait=True)
+        except KeyboardInterrupt:
+            self._stopping.set()
+            self._interrupted = True
+            self.engine.cancel_all()
+            self.engine.shutdown(wait=True)
+            raise
+        finally:
+            self._stopping.set()
+            self._done.set()
+            heartbeat.join()
+            unsubscribe()
+
+    def stop(self):
+        """Stop leasing new jobs; run() returns once the current ones finish."""
+        self._stopping.set()
+
+    def _start(self, queue_id: int, spec: Dict[str, Any]):
+        self.log(f"Stage: Leased job #{queue_id}: {spec['url']}")
+        with self._lock:
+            engine_id = self.engine.submit(spec['url'], spec['folder'], spec['download_video'],
+                                           spec['download_audio'], **{**self.options, **spec.get('options', {})})
+            self._leases[engine_id] = queue_id
+
+    def _on_event(self, event):
+        with self._lock:
+            queue_id = self._leases.get(event['id'])
+            lost = event['id'] in self._lost
+        if queue_id is None or (lost and event['type'] not in ('complete', 'error', 'cancelled')):
+            return
+        try:
+            if event['type'] == 'progress':
+                now = time.monotonic()
+                if now - self._last_progress.get(queue_id, 0.0) >= PROGRESS_INTERVAL:
+                    self._last_progress[queue_id] = now
+                    self.queue.report_progress(queue_id, self.worker_id, event['percentage'], event['status'])
+            elif event['type'] in ('complete', 'error', 'cancelled'):
+                self._finish(event, queue_id, lost)
+            elif event['type'] in LOGGED_EVENTS:
+                self.queue.add_event(queue_id, self.worker_id, event)
+        except sqlite3.Error as e:
+            self.log(f"Stage: ⚠️ Queue update for job #{queue_id} failed: {e}")
+            if event['type'] in ('complete', 'error', 'cancelled'):
+                self._forget(event['id'], queue_id)
+
+    def _finish(self, event, queue_id: int, lost: bool):
+        try:
+            if lost:
+                self.log(f"Stage: Job #{queue_id} was reassigned; dropped it here")
+            elif event['type'] == 'cancelled' and self._interrupted:
+                # The worker is exiting, not the job being cancelled: another worker picks it up
+                self.queue.release(queue_id, self.worker_id)
+            else:
+                self.queue.add_event(queue_id, self.worker_id, {k: v for k, v in event.items() if k != 'result'})
+                message = event.get('summary', '') if event['type'] == 'error' else ''
+                if not self.queue.finish(queue_id, self.worker_id, event['type'], event.get('result'), message):
+                    self.log(f"Stage: Job #{queue_id} finished after its lease expired; result discarded")
+        finally:
+            self._forget(event['id'], queue_id)
+
+    def _forget(self, engine_id: int, queue_id: int):
+        with self._lock:
+            if self._leases.pop(engine_id, None) is not None:
+                self._slots.release()
+            self._lost.discard(engine_id)
+        self._last_progress.pop(queue_id, None)
+
+    def _heartbeat_loop(self):
+        while not self._done.wait(self.lease_seconds / 3):
+            with self._lock:
+                leases = [(engine_id, queue_id) for engine_id, queue_id in self._leases.items()
+                          if engine_id not in self._lost]
+            for engine_id, queue_id in leases:
+                try:
+                    renewed = self.queue.heartbeat(queue_id, self.worker_id, self.lease_seconds)
+                except sqlite3.Error as e:
+                    self.log(f"Stage: ⚠️ Heartbeat for job #{queue_id} failed: {e}")
+                    continue
+                if not renewed:
+                    with self._lock:
+                        self._lost.add(engine_id)
+                    self.engine.cancel(engine_id)
@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Jobs and the runner that carries them out.
+A job is a picklable dict (see new_job()); run_job() downloads it and
+reports what happens as plain-dict events (typed below). The backends in
+backends.py decide where jobs run.
+"""
+
+import os
+import copy
+import glob
+import time
+import weakref
+from typing import Dict, Any, Callable, List, Literal, NotRequired, Optional, TypedDict, Union
+
+from yt_dlp.networking.exceptions import HTTPError
+
+from cancellation import CancelToken, DownloadCancelled, interrupt_response
+from clips import CLIP_NAME_SUFFIX, is_clip, ydl_clip_options
+from content_store import (ContentStore, video_key_from_url, video_key_from_info, downloaded_files,
+                           job_format_key, AUDIO_FORMAT)
+from estimates import JobEstimator
+from ffmpeg_tools import (cancel_children, convert_video_to_mp4, extract_audio_m4a, render_outputs, rendition_media,
+                          install_cancellable_popen, DEFAULT_ENCODER_PROFILE)
+from host_limits import (HostLimiter, host_limiter, request_host, hold_until_done,
+                         THROTTLE_STATUSES, DEFAULT_MAX_CONNECTIONS, DEFAULT_MIN_INTERVAL)
+from staging import staging_path, finalize, discard
+from ydl_session import SessionYoutubeDL, get_session
+from retries import (classify_error, is_retryable, retry_delay, wait_or_cancel, ydl_retry_options,
+                     describe_error, EXPIRED, DEFAULT_MAX_RETRIES, DEFAULT_FRAGMENT_RETRIES,
+                     DEFAULT_BASE_DELAY, DEFAULT_MAX_DELAY)
+
+
+# Progress hooks fire for every chunk; forward at most this often per job
+PROGRESS_INTERVAL = 0.1
+
+# Upper bound on how long a blocked network read can delay a cancel
+DEFAULT_SOCKET_TIMEOUT = 15
+
+# Separates the title from the format ID in downloaded stream names
+STREAM_MARK = '.stream-'
+
+# Every job ends with exactly one of these
+TERMINAL_EVENTS = ('complete', 'error', 'cancelled')
+
+
+class ProgressEvent(TypedDict):
+    id: int
+    type: Literal['progress']
+    percentage: float
+    status: str
+    eta: Optional[float]  # Seconds until the whole job has downloaded, when known
+    speed: Optional[float]  # Smoothed bytes/s, while downloading
+    downloaded_bytes: NotRequired[int]  # Across all stages so far
+    remaining_bytes: NotRequired[Optional[int]]
+
+
+class StageEvent(TypedDict):
+    id: int
+    type: Literal['stage']
+    message: str
+
+
+class InfoEvent(TypedDict):
+    id: int
+    type: Literal['info']
+    title: str
+
+
+class RetryEvent(TypedDict):
+    id: int
+    type: Literal['retry']
+    kind: str  # One of the kinds in retries.py
+    attempt: int
+    delay: float
+    message: str
+
+
+class SizedEvent(TypedDict):
+    id: int
+    type: Literal['sized']
+    bytes: int  # Estimated bytes the job will download
+
+
+class HeldEvent(TypedDict):
+    id: int
+    type: Literal['held']
+    message: str  # Why the job is waiting, e.g. for disk space
+
+
+class CompleteEvent(TypedDict):
+    id: int
+    type: Literal['complete']
+    result: Dict[str, Any]  # title, download_path and files
+
+
+class ErrorEvent(TypedDict):
+    id: int
+    type: Literal['error']
+    error: str
+    kind: str
+    summary: str  # One line for status text
+
+
+class CancelledEvent(TypedDict):
+    id: int
+    type: Literal['cancelled']
+    latency: NotRequired[float]  # Seconds from cancel() to the job stopping
+
+
+Event = Union[ProgressEvent, StageEvent, InfoEvent, RetryEvent, SizedEvent, HeldEvent, CompleteEvent,
+              ErrorEvent, CancelledEvent]
+
+
+def new_job(job_id: int, url: str, folder: str, download_video: bool, download_audio: bool,
+            **options) -> Dict[str, Any]:
+    """Build a picklable job description with default options."""
+    job = {
+        'id': job_id,
+        'url': url,
+        'folder': folder,
+        'download_video': download_video,
+        'download_audio': download_audio,
+        'start_time': time.time(),
+        'video_format': 'bestvideo',
+        'convert_video': True,  # Convert video to MP4 when FFmpeg is available
+        'video_format_key': 'video-mp4',  # Output kinds in the store; job_format_key() adds format and profile
+        'audio_format_key': 'audio-m4a',
+        'ffmpeg_location': None,
+        'ffmpeg_available': False,
+        'store_dir': None,
+        'info': None,  # Pre-resolved info dict; skips extraction when set
+        'estimated_bytes': None,  # Peak disk usage, filled in by disk admission
+        'download_bytes': None,  # Bytes all stages fetch, filled in by disk admission
+        'keep_partial': False,  # Keep .part files on cancel so the download can resume
+        'staging_dir': None,  # Download and convert here, then move finished files into folder
+        'concurrent_fragments': 1,  # Parallel fragment downloads for DASH/HLS formats
+        'rate_limit': None,  # Bytes per second
+        'encoder_profile': DEFAULT_ENCODER_PROFILE,
+        'socket_timeout': DEFAULT_SOCKET_TIMEOUT,
+        'max_retries': DEFAULT_MAX_RETRIES,  # Per request, and per job stage after yt-dlp gives up
+        'fragment_retries': DEFAULT_FRAGMENT_RETRIES,
+        'retry_base_delay': DEFAULT_BASE_DELAY,
+        'retry_max_delay': DEFAULT_MAX_DELAY,
+        'use_session': True,  # Borrow connections, cookies and player caches from the process-wide session
+        'host_max_connections': DEFAULT_MAX_CONNECTIONS,  # Open requests per host, shared by all jobs; 0 for no limit
+        'host_min_interval': DEFAULT_MIN_INTERVAL,  # Seconds between request starts per host, shared by all jobs
+        'renditions': None,  # Outputs from ffmpeg_tools.RENDITIONS, all made from one download; replaces the video/audio stages
+        'clip_ranges': [],  # (start, end) seconds to download instead of the whole video; end may be inf
+        'clip_chapters': [],  # Regexes; chapters whose titles match are downloaded as clips
+        'precise_cuts': True,  # Cut clips at the exact time rather than the nearest earlier keyframe
+        'extra_opts': {},  # Passed through to every YoutubeDL instance
+    }
+    job.update(options)
+    return job
+
+
+def progress_event(job_id: int, percentage: float, status: str, eta: Optional[float] = None,
+                   speed: Optional[float] = None) -> ProgressEvent:
+    """Build a progress event; eta is in seconds and speed in bytes/s when known."""
+    return {'id': job_id, 'type': 'progress', 'percentage': percentage, 'status': status, 'eta': eta,
+            'speed': speed}
+
+
+def stage_event(job_id: int, message: str) -> StageEvent:
+    """Build an event describing a step a job has reached."""
+    return {'id': job_id, 'type': 'stage', 'message': message}
+
+
+def job_session(job: Dict[str, Any]):
+    """The session a job's YoutubeDL instances should use, or None for standalone ones."""
+    return get_session() if job['use_session'] else None
+
+
+def job_host_limiter(job: Dict[str, Any]) -> Optional[HostLimiter]:
+    """The per-host limits a job's requests obey, or None if it has none."""
+    return host_limiter(job['host_max_connections'], job['host_min_interval'])
+
+
+class CancellableYoutubeDL(SessionYoutubeDL):
+    """YoutubeDL whose in-flight requests are aborted when its cancel token fires.
+
+    With a limiter, each request also waits for a free slot on its host and
+    holds it until the response is read, closed or dropped; throttle
+    responses slow the host down for every job.
+    """
+
+    def __init__(self, params: Dict[str, Any], token: CancelToken, session=None,
+                 limiter: Optional[HostLimiter] = None):
+        super().__init__(params, session=session)
+        self._token = token
+        self._limiter = limiter
+        self._responses = weakref.WeakSet()
+        self._unregister = token.add_callback(self._abort)
+
+    def urlopen(self, req):
+        # Every extractor and HTTP/fragment download request goes through here
+        self._token.raise_if_cancelled()
+        if self._limiter is None:
+            response = super().urlopen(req)
+        else:
+            response = self._limited_urlopen(req)
+        self._responses.add(response)
+        if self._token.cancelled:
+            interrupt_response(response)
+            self._token.raise_if_cancelled()
+        return response
+
+    def _limited_urlopen(self, req):
+        host = request_host(req)
+        release = self._limiter.acquire(host, self._token)
+        try:
+            response = super().urlopen(req)
+        except HTTPError as e:
+            if e.status in THROTTLE_STATUSES:
+                self._limiter.throttled(host, e.response.headers)
+            release()
+            raise
+        except BaseException:
+            release()
+            raise
+        hold_until_done(response, release)
+        return response
+
+    def process_info(self, info_dict):
+        # Section downloads and merges run in FFmpeg children that urlopen never sees
+        with cancel_children(self._token):
+            return super().process_info(info_dict)
+
+    def _abort(self):
+        for response in list(self._responses):
+            interrupt_response(response)
+
+    def close(self):
+        self._unregister()
+        super().close()
+
+
+def create_progress_hook(job: Dict[str, Any], report: Callable, token: CancelToken, touched: set):
+    """Create a yt-dlp progress hook that forwards throttled progress events.
+
+    Speed and ETA come from a JobEstimator that lives as long as the hook,
+    so they carry over from one stage of the job to the next. Every file
+    the hook sees is added to touched so partial files can be cleaned up if
+    the job is cancelled.
+    """
+    last_sent = [0.0]
+    estimator = JobEstimator(job['download_bytes'])
+
+    def progress_hook(d):
+        if d.get('filename'):
+            touched.add(d['filename'])
+        token.raise_if_cancelled()
+
+        if d['status'] == 'downloading':
+            now = time.time()
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if 'downloaded_bytes' in d:
+                estimator.update(d.get('filename'), d['downloaded_bytes'], total, now, d.get('speed'))
+            if now - last_sent[0] < PROGRESS_INTERVAL:
+                return
+            last_sent[0] = now
+            percentage = d['downloaded_bytes'] / total * 100 if total and 'downloaded_bytes' in d else 0
+            event = progress_event(job['id'], min(percentage, 100), "Downloading...", estimator.eta(),
+                                   estimator.speed.value)
+            event['downloaded_bytes'] = estimator.downloaded_bytes
+            event['remaining_bytes'] = estimator.remaining_bytes()
+            report(event)
+        elif d['status'] == 'finished':
+            estimator.finish_file()
+            report(progress_event(job['id'], 100, "Post-processing..."))
+        elif d['status'] == 'error':
+            report(progress_event(job['id'], 0, "Error occurred"))
+
+    return progress_hook
+
+
+def cleanup_partial_files(paths: set, keep_partial: bool):
+    """Remove what a cancelled job left behind, optionally keeping resumable partial data."""
+    for path in paths:
+        leftovers = glob.glob(glob.escape(path) + '.part-Frag*')
+        if not keep_partial:
+            leftovers += [path, path + '.part', path + '.ytdl']
+        for leftover in leftovers:
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+
+def resolve_job_info(job: Dict[str, Any], token: Optional[CancelToken] = None) -> Dict[str, Any]:
+    """Extract a job's info without downloading, in a form that can be sent to a worker process."""
+    token = token or CancelToken()
+    info_opts = {'quiet': True, 'noplaylist': True, 'socket_timeout': job['socket_timeout'],
+                 **ydl_retry_options(job, token), **job['extra_opts']}
+    with CancellableYoutubeDL(info_opts, token, job_session(job), job_host_limiter(job)) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(job['url'], download=False))
+
+
+def output_template(job: Dict[str, Any], path: str, suffix: str = "") -> str:
+    """yt-dlp output template for a job's files in path."""
+    clip_suffix = CLIP_NAME_SUFFIX if is_clip(job) else ""
+    return os.path.join(path, f"%(title)s{clip_suffix}{suffix}.%(ext)s")
+
+
+def _run_ydl(ydl_opts: Dict[str, Any], job: Dict[str, Any], token: CancelToken,
+             keep_info: bool = True) -> Dict[str, Any]:
+    """Download with yt-dlp, reusing the job's pre-resolved info when it has one.
+
+    Without keep_info the info is handed to yt-dlp instead of copied and the
+    job lets go of it; a retry then extracts again.
+    """
+    ydl_opts = {
+        # A watch URL with a list parameter is one video (url_tools.canonical_key dedupes it as one)
+        'noplaylist': True,
+        'socket_timeout': job['socket_timeout'],
+        'concurrent_fragment_downloads': job['concurrent_fragments'],
+        **ydl_retry_options(job, token),
+        **ydl_clip_options(job),
+        **ydl_opts,
+    }
+    if job['rate_limit']:
+        ydl_opts['ratelimit'] = job['rate_limit']
+    with CancellableYoutubeDL(ydl_opts, token, job_session(job), job_host_limiter(job)) as ydl:
+        if job['info']:
+            # Only format selection and the download itself run again
+            if keep_info:
+                info = copy.deepcopy(job['info'])
+            else:
+                info, job['info'] = job['info'], None
+            return ydl.process_ie_result(info, download=True)
+        return ydl.extract_info(job['url'])
+
+
+def download_video_only(job: Dict[str, Any], path: str, hook: Callable, token: CancelToken,
+                        keep_info: bool = True):
+    """Download the job's video stream. Returns the yt-dlp result info and output files."""
+    ydl_opts = {
+        'outtmpl': output_template(job, path),
+        'progress_hooks': [hook],
+        'format': job['video_format'],
+        **job['extra_opts'],
+    }
+    if job['ffmpeg_location']:
+        ydl_opts['ffmpeg_location'] = job['ffmpeg_location']
+    result = _run_ydl(ydl_opts, job, token, keep_info)
+    files = downloaded_files(result)
+
+    # If FFmpeg is available, convert to MP4
+    if job['convert_video'] and job['ffmpeg_available']:
+        files = [convert_video_to_mp4(f, job['ffmpeg_location'], token, job['encoder_profile']) for f in files]
+    return result, files
+
+
+def download_audio_only(job: Dict[str, Any], path: str, hook: Callable, token: CancelToken,
+                        keep_info: bool = True):
+    """Download the job's audio stream as M4A. Returns the yt-dlp result info and output files."""
+    ydl_opts = {
+        'outtmpl': output_template(job, path),
+        'progress_hooks': [hook],
+        'format': AUDIO_FORMAT,  # Get best audio quality
+        **job['extra_opts'],
+    }
+    if job['ffmpeg_location']:
+        ydl_opts['ffmpeg_location'] = job['ffmpeg_location']
+    result = _run_ydl(ydl_opts, job, token, keep_info)
+    files = downloaded_files(result)
+
+    # Without FFmpeg the audio is kept in its original format
+    if job['ffmpeg_available']:
+        files = [extract_audio_m4a(f, result.get('acodec'), job['ffmpeg_location'], token) for f in files]
+    return result, files
+
+
+def download_renditions(job: Dict[str, Any], path: str, hook: Callable, token: CancelToken,
+                        renditions: List[str], keep_info: bool = True):
+    """Download the streams renditions need once, then write every rendition in one FFmpeg run.
+
+    Returns the yt-dlp result info and (rendition, output path) pairs; a
+    clip gives one output per rendition for each of its sections. Without
+    FFmpeg the downloaded streams are returned as they are, named by format ID.
+    """
+    needs_video, needs_audio = rendition_media(renditions)
+    selectors = []
+    if needs_video:
+        selectors.append(f"{job['video_format']}/best")
+    if needs_audio:
+        selectors.append('bestaudio/best')
+    ydl_opts = {
+        'outtmpl': output_template(job, path, f"{STREAM_MARK}%(format_id)s"),
+        'progress_hooks': [hook],
+        'format': ','.join(selectors),  # Each stream as its own file; nothing is merged
+        **job['extra_opts'],
+    }
+    if job['ffmpeg_location']:
+        ydl_opts['ffmpeg_location'] = job['ffmpeg_location']
+    result = _run_ydl(ydl_opts, job, token, keep_info)
+    # Streams by output name (one per clip section). A site with only combined
+    # formats gives the same file for both selectors.
+    sections: Dict[str, Dict[str, Any]] = {}
+    for download in result.get('requested_downloads') or []:
+        if download.get('filepath') and os.path.exists(download['filepath']):
+            base = download['filepath'].rsplit(STREAM_MARK, 1)[0]
+            sections.setdefault(base, {}).setdefault(download['filepath'], download)
+    if not job['ffmpeg_available']:
+        return result, [(f"stream-{d.get('format_id')}", p) for streams in sections.values() for p, d in streams.items()]
+
+    outputs = []
+    for base, streams in sections.items():
+        video = next(((p, d.get('vcodec')) for p, d in streams.items() if d.get('vcodec') != 'none'), None) \
+            if needs_video else None
+        audio = next(((p, d.get('acodec')) for p, d in streams.items() if d.get('acodec') != 'none'), None) \
+            if needs_audio else None
+        rendered = render_outputs(base, renditions, video, audio, job['ffmpeg_location'], token,
+                                  job['encoder_profile'])
+        outputs.extend(rendered.items())
+        for stream_path in streams:
+            os.remove(stream_path)
+    return result, outputs
+
+
+def with_retries(job: Dict[str, Any], report: Callable, token: CancelToken, label: str, attempt: Callable):
+    """Call attempt() until it succeeds, retrying transient failures with jittered backoff.
+
+    yt-dlp already retries individual requests and fragments; this covers
+    failures it gives up on. An expired stream URL drops the job's cached
+    info so the next attempt re-extracts, and yt-dlp resumes from the .part
+    file instead of starting over.
+    """
+    failures = 0
+    while True:
+        try:
+            return attempt()
+        except Exception as e:
+            if token.cancelled or isinstance(e, DownloadCancelled):
+                raise
+            kind = classify_error(e)
+            failures += 1
+            if not is_retryable(kind) or failures > job['max_retries']:
+                raise
+            if kind == EXPIRED:
+                job['info'] = None
+            delay = retry_delay(kind, failures, job)
+            report({
+                'id': job['id'], 'type': 'retry', 'kind': kind, 'attempt': failures, 'delay': delay,
+                'message': f"{describe_error(kind, e)} - retrying {label} in {delay:.1f}s "
+                           f"({failures}/{job['max_retries']})",
+            })
+            wait_or_cancel(token, delay)
+
+
+def _run_renditions(job: Dict[str, Any], report: Callable, token: CancelToken, hook: Callable, touched: set,
+                    store: Optional[ContentStore], video_key: Optional[str], title: str,
+                    work_path: str, download_path: str) -> List[str]:
+    """Link the job's renditions that are in the store and make the rest from one download."""
+    files = []
+    missing = []
+    for name in job['renditions']:
+        stored_path = store.lookup(video_key, job_format_key(job, name)) if store else None
+        if stored_path:
+            files.append(store.link_into(stored_path, download_path))
+            report(stage_event(job['id'], f"Linked {name} from store: {os.path.basename(files[-1])}"))
+        else:
+            missing.append(name)
+    if not missing:
+        report(progress_event(job['id'], 100, "Linked from store"))
+        return files
+
+    report(stage_event(job['id'], f"Starting download for {', '.join(missing)}..."))
+    result, outputs = with_retries(job, report, token, "download",
+                                   lambda: download_renditions(job, work_path, hook, token, missing, keep_info=False))
+    touched.clear()
+    for name, file_path in outputs:
+        if work_path != download_path:
+            file_path = finalize(file_path, download_path)
+        if store and name in missing:
+            store.ingest(file_path, video_key_from_info(result), job_format_key(job, name), title)
+        files.append(file_path)
+    if job['ffmpeg_available']:
+        report(stage_event(job['id'], f"Wrote {', '.join(dict.fromkeys(name for name, _ in outputs))} "
+                                      f"from one download"))
+    else:
+        report(stage_event(job['id'], "FFmpeg not found - kept the downloaded streams as they are"))
+    return files
+
+
+def run_job(job: Dict[str, Any], report: Callable, token: CancelToken) -> Dict[str, Any]:
+    """Run one job to completion. Returns the title, download path and output files."""
+    token.raise_if_cancelled()
+    install_cancellable_popen()  # So cancel_children() reaches yt-dlp's FFmpeg children
+    url = job['url']
+    # The store holds whole videos only; a clip is always downloaded
+    store = ContentStore(job['store_dir']) if job['store_dir'] and not is_clip(job) else None
+
+    # A job fully covered by the store needs no network access at all
+    video_key = video_key_from_url(url)
+    renditions = job['renditions'] or []
+    format_keys = [job_format_key(job, name) for name in renditions]
+    if job['download_video'] and not renditions:
+        format_keys.append(job_format_key(job, 'video'))
+    if job['download_audio'] and not renditions:
+        format_keys.append(job_format_key(job, 'audio'))
+    title = None
+    if store and all(store.lookup(video_key, key) for key in format_keys):
+        title = store.get_title(video_key)
+
+    if title is None and job['info']:
+        title = job['info'].get('title', 'Unknown')
+        video_key = video_key_from_info(job['info']) or video_key
+    if title is None:
+        info_opts = {'quiet': True, 'noplaylist': True, 'socket_timeout': job['socket_timeout'],
+                     **ydl_retry_options(job, token), **job['extra_opts']}
+
+        def extract():
+            with CancellableYoutubeDL(info_opts, token, job_session(job), job_host_limiter(job)) as info_ydl:
+                return info_ydl.extract_info(url, download=False)
+
+        info = with_retries(job, report, token, "extraction", extract)
+        title = info.get('title', 'Unknown') if info else 'Unknown'
+        video_key = video_key_from_info(info) or video_key
+        del info  # Not needed again; don't keep every format alive for the rest of the job
+    report({'id': job['id'], 'type': 'info', 'title': title})
+    token.raise_if_cancelled()
+
+    # Create subfolder if the job has more than one output
+    if len(format_keys) > 1:
+        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        download_path = os.path.join(job['folder'], safe_title)
+        os.makedirs(download_path, exist_ok=True)
+    else:
+        download_path = job['folder']
+
+    # Partial and intermediate files go to the staging area when there is one
+    work_path = staging_path(job['staging_dir'], job) if job['staging_dir'] else download_path
+    os.makedirs(work_path, exist_ok=True)
+
+    touched = set()
+    hook = create_progress_hook(job, report, token, touched)
+    files: List[str] = []
+    stages = []
+    if job['download_video'] and not renditions:
+        stages.append(('video', job_format_key(job, 'video'), download_video_only))
+    if job['download_audio'] and not renditions:
+        stages.append(('audio', job_format_key(job, 'audio'), download_audio_only))
+
+    try:
+        if renditions:
+            files.extend(_run_renditions(job, report, token, hook, touched, store, video_key, title,
+                                         work_path, download_path))
+        for index, (media, format_key, download) in enumerate(stages):
+            token.raise_if_cancelled()
+            stored_path = store.lookup(video_key, format_key) if store else None
+            if stored_path:
+                files.append(store.link_into(stored_path, download_path))
+                report(stage_event(job['id'], f"Linked {media} from store: {os.path.basename(files[-1])}"))
+                report(progress_event(job['id'], 100, "Linked from store"))
+                continue
+
+            report(stage_event(job['id'], f"Starting {media} download..."))
+            # The last stage releases the job's info, which can hold hundreds of formats
+            last = index == len(stages) - 1
+            result, produced = with_retries(job, report, token, media,
+                                            lambda: download(job, work_path, hook, token, keep_info=not last))
+            touched.clear()  # This stage's files are complete
+            if work_path != download_path:
+                produced = [finalize(file_path, download_path) for file_path in produced]
+            if store:
+                for file_path in produced:
+                    store.ingest(file_path, video_key_from_info(result), format_key, title)
+            files.extend(produced)
+            report(stage_event(job['id'], f"{media.capitalize()} download complete!"))
+    except BaseException:
+        if token.cancelled:
+            cleanup_partial_files(touched, job['keep_partial'])
+            if work_path != download_path and not job['keep_partial']:
+                discard(work_path)
+        # A failed job keeps its staging directory so a retry resumes from it
+        raise
+
+    if work_path != download_path:
+        discard(work_path)
+
+    return {'title': title, 'download_path': download_path, 'files': files}
+
+
+def execute_job(job: Dict[str, Any], report: Callable, token: CancelToken,
+                runner: Callable = run_job):
+    """Run a job and report exactly one terminal event for it."""
+    try:
+        result = runner(job, report, token)
+    except Exception as e:
+        error_msg = str(e)
+        # yt-dlp may wrap the cancellation in its own error types
+        if token.cancelled or isinstance(e, DownloadCancelled) or "cancelled by user" in error_msg.lower():
+            report({'id': job['id'], 'type': 'cancelled'})
+        else:
+            kind = classify_error(e)
+            report({'id': job['id'], 'type': 'error', 'error': error_msg, 'kind': kind,
+                    'summary': describe_error(kind, e)})
+        return
+    report({'id': job['id'], 'type': 'complete', 'result': result})
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Bulk metadata resolution for lists of URLs.
+Titles, durations and estimated sizes are resolved concurrently by an
+asyncio front end over a bounded thread pool, with a per-host limit.
+Lookups have their own per-host connection budget, so a long list isn't
+held to the downloads' connection limit; they share the downloads' request
+spacing and throttle slowdowns.
+"""
+
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from cancellation import CancelToken
+from host_limits import HostLimiter, host_limiter, DEFAULT_MIN_INTERVAL, LOOKUP_POOL
+from jobs import CancellableYoutubeDL
+from ydl_session import get_session
+
+
+DEFAULT_CONCURRENCY = 32
+# Also the default lookup connections per host. Higher keeps a slow site's connections
+# busy while threads parse pages, at the cost of more load on it (see bench.py resolve)
+DEFAULT_PER_HOST = 16
+
+# Hosts that are served by the same backend share one limit
+HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'youtube-nocookie.com': 'youtube.com',
+}
+
+def host_key(url: str) -> str:
+    """Return the host a URL's requests are limited under."""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return HOST_ALIASES.get(host, host)
+
+
+def estimate_size(info: Dict[str, Any]) -> Optional[int]:
+    """Estimate the download size in bytes from the formats yt-dlp selected."""
+    formats = info.get('requested_formats') or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            # Total bitrate is in KBit/s
+            size = fmt['tbr'] * 1000 / 8 * info['duration']
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+
+def summarize(url: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a full info dict to the fields a bulk listing needs."""
+    return {
+        'url': url,
+        'id': info.get('id'),
+        'extractor': info.get('extractor_key'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'filesize': estimate_size(info),
+    }
+
+
+class _ThreadExtractors:
+    """One YoutubeDL per pool thread, all sharing the session's connections, closed together."""
+
+    def __init__(self, ydl_opts: Dict[str, Any], limiter: Optional[HostLimiter], use_session: bool):
+        self.ydl_opts = {'quiet': True, 'noplaylist': True, **ydl_opts}
+        self.limiter = limiter
+        self.use_session = use_session
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ydls = []
+
+    def extract(self, url: str) -> Dict[str, Any]:
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = CancellableYoutubeDL(self.ydl_opts, CancelToken(),
+                                                         get_session() if self.use_session else None, self.limiter)
+            with self._lock:
+                self._ydls.append(ydl)
+        return ydl.extract_info(url, download=False)
+
+    def close(self):
+        with self._lock:
+            ydls, self._ydls = self._ydls, []
+        for ydl in ydls:
+            ydl.close()
+
+
+class MetadataResolver:
+    """Resolves metadata for many URLs at once, yielding each as it finishes.
+
+    per_host bounds the URLs resolved at once per host. host_max_connections
+    caps open lookup requests per host (per_host if None, 0 for no limit); it
+    is a budget separate from download jobs' host_max_connections, so lookups
+    and downloads don't starve each other. host_min_interval and throttle
+    slowdowns are shared with download jobs (see host_limits.py).
+    use_session=False gives each thread standalone network state, as jobs
+    get with the setting off.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 ydl_opts: Optional[Dict[str, Any]] = None, keep_info: bool = False,
+                 host_max_connections: Optional[int] = None,
+                 host_min_interval: float = DEFAULT_MIN_INTERVAL, use_session: bool = True):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.ydl_opts = ydl_opts or {}
+        self.keep_info = keep_info  # Attach the full info dict as 'info'
+        if host_max_connections is None:
+            host_max_connections = per_host
+        self.limiter = host_limiter(host_max_connections, host_min_interval, LOOKUP_POOL)
+        self.use_session = use_session
+
+    async def resolve_iter(self, urls: Iterable[str]):
+        """Async generator yielding one result dict per URL, in completion order."""
+        loop = asyncio.get_running_loop()
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        extractors = _ThreadExtractors(self.ydl_opts, self.limiter, self.use_session)
+
+        async def resolve_one(url):
+            async with host_limits[host_key(url)]:
+                start = time.perf_counter()
+                try:
+                    info = await loop.run_in_executor(executor, extractors.extract, url)
+                except Exception as e:
+                    return {'url': url, 'error': str(e), 'elapsed': round(time.perf_counter() - start, 3)}
+            result = summarize(url, info or {})
+            result['elapsed'] = round(time.perf_counter() - start, 3)
+            if self.keep_info:
+                result['info'] = info
+            return result
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='resolve') as executor:
+                tasks = [asyncio.ensure_future(resolve_one(url)) for url in urls]
+                try:
+                    for next_done in asyncio.as_completed(tasks):
+                        yield await next_done
+                finally:
+                    for task in tasks:
+                        task.cancel()
+        finally:
+            # The pool's threads are gone; their YoutubeDLs would otherwise wait for the GC
+            extractors.close()
+
+    def resolve(self, urls: Iterable[str], callback: Optional[Callable] = None) -> List[Dict[str, Any]]:
+        """Resolve URLs from synchronous code, calling callback with each result as it arrives."""
+        async def collect():
+            results = []
+            async for result in self.resolve_iter(urls):
+                if callback:
+                    callback(result)
+                results.append(result)
+            return results
+
+        return asyncio.run(collect())
+
+
+def resolve_urls(urls: Iterable[str], callback: Optional[Callable] = None, **options) -> List[Dict[str, Any]]:
+    """Resolve metadata for a list of URLs. See MetadataResolver for options."""
+    return MetadataResolver(**options).resolve(urls, callback)
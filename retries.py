@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Failure classification and retry timing for download jobs.
+Errors are sorted into a few kinds that decide whether a job is retried,
+how long it waits first, and whether its stream URLs need re-extracting.
+"""
+
+import errno
+import random
+import socket
+import threading
+from typing import Dict, Any, List, Optional
+
+from yt_dlp.networking.exceptions import HTTPError, TransportError, IncompleteRead
+from yt_dlp.utils import ExtractorError, UnsupportedError, GeoRestrictedError, ContentTooShortError
+
+from cancellation import CancelToken
+
+
+# Error kinds
+NETWORK = 'network'          # Timeouts, resets, 5xx: retry as-is
+EXPIRED = 'expired'          # 403/410 on a stream URL: re-extract, then resume
+THROTTLED = 'throttled'      # 429: retry after a longer wait
+EXTRACTOR = 'extractor'      # Site or extractor problem: retrying won't help
+DISK_FULL = 'disk_full'      # Out of space or quota: retrying won't help
+UNKNOWN = 'unknown'
+
+RETRYABLE_KINDS = (NETWORK, EXPIRED, THROTTLED)
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_FRAGMENT_RETRIES = 10
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Throttling needs the server to cool off, so it backs off from a higher base
+THROTTLED_BASE_DELAY = 10.0
+
+# Fallbacks for errors yt-dlp has already flattened into a message
+MESSAGE_PATTERNS = [
+    ('no space left on device', DISK_FULL),
+    ('disk quota exceeded', DISK_FULL),
+    ('http error 429', THROTTLED),
+    ('too many requests', THROTTLED),
+    ('http error 403', EXPIRED),
+    ('http error 410', EXPIRED),
+    ('timed out', NETWORK),
+    ('connection reset', NETWORK),
+    ('connection refused', NETWORK),
+    ('connection aborted', NETWORK),
+    ('temporary failure in name resolution', NETWORK),
+    ('incomplete read', NETWORK),
+    ('http error 5', NETWORK),
+    ('unsupported url', EXTRACTOR),
+    ('unable to extract', EXTRACTOR),
+    ('video unavailable', EXTRACTOR),
+    ('private video', EXTRACTOR),
+]
+
+
+def _exception_chain(error: BaseException) -> List[BaseException]:
+    """Return error and every exception it wraps, outermost first."""
+    chain = []
+    pending = [error]
+    while pending:
+        current = pending.pop(0)
+        if current is None or current in chain:
+            continue
+        chain.append(current)
+        exc_info = getattr(current, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.extend([getattr(current, 'cause', None), current.__cause__, current.__context__])
+    return chain
+
+
+def _classify_one(error: BaseException) -> Optional[str]:
+    if isinstance(error, OSError) and error.errno in (errno.ENOSPC, errno.EDQUOT):
+        return DISK_FULL
+    if isinstance(error, HTTPError):
+        if error.status == 429:
+            return THROTTLED
+        if error.status in (403, 410):
+            return EXPIRED
+        if error.status >= 500:
+            return NETWORK
+        return EXTRACTOR
+    if isinstance(error, (TransportError, IncompleteRead, ContentTooShortError,
+                          socket.timeout, ConnectionError, TimeoutError)):
+        return NETWORK
+    if isinstance(error, (UnsupportedError, GeoRestrictedError)):
+        return EXTRACTOR
+    if isinstance(error, ExtractorError) and error.expected:
+        return EXTRACTOR
+    return None
+
+
+def classify_error(error: BaseException) -> str:
+    """Return the kind of a job failure, looking through yt-dlp's wrapped exceptions."""
+    chain = _exception_chain(error)
+    for current in chain:
+        kind = _classify_one(current)
+        if kind:
+            return kind
+    message = ' '.join(str(current) for current in chain).lower()
+    for pattern, kind in MESSAGE_PATTERNS:
+        if pattern in message:
+            return kind
+    if any(isinstance(current, ExtractorError) for current in chain):
+        return EXTRACTOR
+    return UNKNOWN
+
+
+def is_retryable(kind: str) -> bool:
+    return kind in RETRYABLE_KINDS
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BASE_DELAY, cap: float = DEFAULT_MAX_DELAY) -> float:
+    """Exponential backoff with full jitter for a 1-based attempt number."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def retry_delay(kind: str, attempt: int, job: Dict[str, Any]) -> float:
+    """How long a job should wait before retrying after a failure of the given kind."""
+    base = job['retry_base_delay']
+    if kind == THROTTLED:
+        base = max(base, THROTTLED_BASE_DELAY)
+    return backoff_delay(attempt, base, job['retry_max_delay'])
+
+
+def wait_or_cancel(token: CancelToken, seconds: float):
+    """Sleep for seconds, waking and raising DownloadCancelled as soon as the token is cancelled."""
+    woken = threading.Event()
+    unregister = token.add_callback(woken.set)
+    try:
+        woken.wait(seconds)
+    finally:
+        unregister()
+    token.raise_if_cancelled()
+
+
+def ydl_retry_options(job: Dict[str, Any], token: CancelToken) -> Dict[str, Any]:
+    """yt-dlp options for request- and fragment-level retries with jittered backoff.
+
+    The sleep functions wait on the token themselves and return 0, so a
+    cancel is never held up by a backoff sleep inside yt-dlp.
+    """
+    def sleep_function(attempt: int) -> float:
+        wait_or_cancel(token, backoff_delay(attempt + 1, job['retry_base_delay'], job['retry_max_delay']))
+        return 0
+
+    return {
+        'retries': job['max_retries'],
+        'fragment_retries': job['fragment_retries'],
+        'extractor_retries': job['max_retries'],
+        'retry_sleep_functions': {'http': sleep_function, 'fragment': sleep_function, 'extractor': sleep_function},
+    }
+
+
+def describe_error(kind: str, error: BaseException) -> str:
+    """One-line description of a failure for status text."""
+    message = str(error).strip().splitlines()[0] if str(error).strip() else type(error).__name__
+    # yt-dlp prefixes its messages with "ERROR: [extractor] id:"
+    if message.startswith('ERROR: '):
+        message = message[len('ERROR: '):]
+    labels = {
+        NETWORK: "Network error",
+        EXPIRED: "Stream URL expired",
+        THROTTLED: "Rate limited",
+        EXTRACTOR: "Extractor error",
+        DISK_FULL: "Disk full",
+    }
+    label = labels.get(kind)
+    return f"{label}: {message}" if label else message
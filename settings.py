@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Shared configuration for the GUI and the CLI.
+Settings are layered: schema defaults, then the selected profile, then
+values set in the config file. Every value is checked against SCHEMA;
+bad values are reported and replaced by the layer below.
+"""
+
+import os
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from yt_dlp.utils import parse_bytes
+
+from backends import EXECUTION_MODES, DEFAULT_MAX_WORKERS
+from content_store import DEFAULT_STORE_DIR, TEMP_SUFFIX
+from disk_space import DEFAULT_MIN_FREE
+from egress import EGRESS_STRATEGIES, DEFAULT_STRATEGY, DEFAULT_CHECK_INTERVAL, valid_egress
+from ffmpeg_tools import ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE
+from host_limits import DEFAULT_MAX_CONNECTIONS, DEFAULT_MIN_INTERVAL
+from jobs import DEFAULT_SOCKET_TIMEOUT
+from metadata_resolver import DEFAULT_CONCURRENCY, DEFAULT_PER_HOST
+from retries import DEFAULT_MAX_RETRIES, DEFAULT_FRAGMENT_RETRIES, DEFAULT_MAX_DELAY
+
+
+CONFIG_FILE = os.path.join(os.path.expanduser("~"), ".web_video_downloader_config.json")
+
+
+def _positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+
+def _non_negative_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _non_negative_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+
+def _positive_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def _rate(value):
+    # Bytes per second, as a number or a yt-dlp size string such as "2.5M"
+    if isinstance(value, str):
+        return parse_bytes(value) is not None
+    return _positive_int(value)
+
+
+def _optional_string(value):
+    return value is None or isinstance(value, str)
+
+
+def _egress_list(value):
+    return isinstance(value, list) and all(valid_egress(spec) for spec in value)
+
+
+# name -> (default, check, description)
+SCHEMA = {
+    'download_folder': ('', lambda v: isinstance(v, str), "default download folder"),
+    'profile': (None, _optional_string, "named profile applied under the values in this file"),
+    'execution_mode': ('thread', lambda v: v in EXECUTION_MODES, "run jobs in 'thread' or 'process' workers"),
+    'max_workers': (DEFAULT_MAX_WORKERS, _positive_int, "maximum concurrent jobs"),
+    'concurrent_fragments': (1, _positive_int, "fragments downloaded in parallel per job (DASH/HLS)"),
+    'rate_limit': (None, lambda v: v is None or _rate(v), "per-job download limit in bytes/s, e.g. \"2M\""),
+    'encoder_profile': (DEFAULT_ENCODER_PROFILE, lambda v: v in ENCODER_PROFILES, "FFmpeg settings for MP4 conversion"),
+    'staging_dir': (None, _optional_string, "download and convert here, then move finished files"),
+    'use_content_store': (False, lambda v: isinstance(v, bool), "reuse identical downloads from the store"),
+    'content_store_dir': (DEFAULT_STORE_DIR, lambda v: isinstance(v, str), "content-addressed store location"),
+    'use_session': (True, lambda v: isinstance(v, bool), "share connections, cookies and player caches between jobs"),
+    'host_max_connections': (DEFAULT_MAX_CONNECTIONS, _non_negative_int, "open requests per host across all jobs (0: no limit)"),
+    'host_min_interval': (DEFAULT_MIN_INTERVAL, _non_negative_number, "seconds between requests to the same host"),
+    'egress_pool': ([], _egress_list, "source addresses and proxies to spread jobs over, e.g. [\"10.0.0.2\", \"socks5://127.0.0.1:1080\"]"),
+    'egress_strategy': (DEFAULT_STRATEGY, lambda v: v in EGRESS_STRATEGIES, "give jobs egresses 'round-robin' or by 'least-load'"),
+    'egress_check_interval': (DEFAULT_CHECK_INTERVAL, _non_negative_number, "seconds between egress health checks (0: off)"),
+    'keep_partial_on_cancel': (False, lambda v: isinstance(v, bool), "keep .part files when cancelling"),
+    'check_disk_space': (True, lambda v: isinstance(v, bool), "hold jobs until they fit on disk"),
+    'min_free_space_gb': (DEFAULT_MIN_FREE / 1024 ** 3, _non_negative_number, "free space always left on a volume"),
+    'socket_timeout': (DEFAULT_SOCKET_TIMEOUT, _positive_number, "seconds before a stalled read fails"),
+    'max_retries': (DEFAULT_MAX_RETRIES, _non_negative_int, "retries per request and per stage"),
+    'fragment_retries': (DEFAULT_FRAGMENT_RETRIES, _non_negative_int, "retries per fragment"),
+    'retry_max_delay': (DEFAULT_MAX_DELAY, _non_negative_number, "longest backoff between retries in seconds"),
+    'history_size': (1000, _positive_int, "finished jobs whose status is kept"),
+    'prefetch_cache_size': (32, _positive_int, "pasted URLs whose info is kept for a quick start"),
+    'resolve_concurrency': (DEFAULT_CONCURRENCY, _positive_int, "URLs resolved at once in bulk metadata lookups"),
+    'resolve_per_host': (DEFAULT_PER_HOST, _positive_int, "URLs resolved at once per host"),
+}
+
+PROFILES = {
+    # Few jobs, light conversion, nothing that keeps the fans spinning
+    'laptop': {
+        'max_workers': 2,
+        'concurrent_fragments': 2,
+        'encoder_profile': 'fast',
+        'prefetch_cache_size': 16,
+        'resolve_concurrency': 8,
+    },
+    # Many cores and a fast link
+    'server': {
+        'execution_mode': 'process',
+        'max_workers': 8,
+        'concurrent_fragments': 8,
+        'encoder_profile': 'balanced',
+        'prefetch_cache_size': 128,
+        'resolve_concurrency': 64,
+        'resolve_per_host': 32,
+    },
+    # Unattended batches: patient retries, small files, resumable cancels
+    'overnight': {
+        'max_workers': 4,
+        'concurrent_fragments': 4,
+        'encoder_profile': 'small',
+        'max_retries': 10,
+        'fragment_retries': 20,
+        'retry_max_delay': 300.0,
+        'keep_partial_on_cancel': True,
+        'host_max_connections': 2,
+        'host_min_interval': 1.0,
+    },
+}
+
+
+def read_config_file(path: str = CONFIG_FILE) -> Dict[str, Any]:
+    """Return the raw values stored in a config file ({} if it doesn't exist)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        values = json.load(f)
+    if not isinstance(values, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+    return values
+
+
+def resolve_settings(values: Dict[str, Any], profile: Optional[str] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Layer defaults, a profile and explicit values. Returns the settings and any problems found.
+
+    profile overrides the profile named in values.
+    """
+    problems = []
+    settings = {name: default for name, (default, _, _) in SCHEMA.items()}
+
+    profile = profile or values.get('profile')
+    if not _optional_string(profile):
+        problems.append(f"Invalid value for 'profile': {profile!r} ({SCHEMA['profile'][2]})")
+        profile = None
+    if profile and profile not in PROFILES:
+        problems.append(f"Unknown profile '{profile}' (choose from {', '.join(PROFILES)})")
+        profile = None
+    settings.update(PROFILES.get(profile, {}))
+    settings['profile'] = profile
+
+    for name, value in values.items():
+        if name not in SCHEMA:
+            problems.append(f"Unknown setting '{name}'")
+            continue
+        if name == 'profile':
+            continue
+        if isinstance(value, int) and not isinstance(value, bool) and isinstance(SCHEMA[name][0], float):
+            value = float(value)
+        if not SCHEMA[name][1](value):
+            problems.append(f"Invalid value for '{name}': {value!r} ({SCHEMA[name][2]})")
+            continue
+        settings[name] = value
+    return settings, problems
+
+
+def load_settings(path: str = CONFIG_FILE, profile: Optional[str] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Read and resolve the config file. A file that can't be read counts as empty."""
+    problems = []
+    try:
+        values = read_config_file(path)
+    except (OSError, ValueError) as e:
+        values = {}
+        problems.append(f"Could not read {path}: {e}")
+    settings, more = resolve_settings(values, profile)
+    return settings, problems + more
+
+
+def save_settings(updates: Dict[str, Any], path: str = CONFIG_FILE):
+    """Write updated values into the config file, keeping everything else in it."""
+    try:
+        values = read_config_file(path)
+    except (OSError, ValueError):
+        values = {}
+    values.update(updates)
+    with open(path + TEMP_SUFFIX, 'w') as f:
+        json.dump(values, f, indent=2)
+    os.replace(path + TEMP_SUFFIX, path)
+
+
+def job_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """new_job() keyword arguments for the performance settings."""
+    rate_limit = settings['rate_limit']
+    return {
+        'concurrent_fragments': settings['concurrent_fragments'],
+        'rate_limit': parse_bytes(rate_limit) if isinstance(rate_limit, str) else rate_limit,
+        'encoder_profile': settings['encoder_profile'],
+        'staging_dir': settings['staging_dir'],
+        'store_dir': settings['content_store_dir'] if settings['use_content_store'] else None,
+        'keep_partial': settings['keep_partial_on_cancel'],
+        'socket_timeout': settings['socket_timeout'],
+        'max_retries': settings['max_retries'],
+        'fragment_retries': settings['fragment_retries'],
+        'retry_max_delay': settings['retry_max_delay'],
+        'use_session': settings['use_session'],
+        'host_max_connections': settings['host_max_connections'],
+        'host_min_interval': settings['host_min_interval'],
+    }
+
+
+def describe_settings(settings: Dict[str, Any]) -> str:
+    """One setting per line, for printing."""
+    return '\n'.join(f"{name} = {json.dumps(settings[name])}" for name in SCHEMA)
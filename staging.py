@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Staging area for downloads in progress.
+Partial files, fragments and FFmpeg intermediates are written to a fast
+local directory; only finished files are moved into the destination
+folder, and they appear there atomically.
+"""
+
+import os
+import shutil
+import hashlib
+from typing import Dict, Any
+
+from content_store import TEMP_SUFFIX
+
+
+def staging_path(staging_dir: str, job: Dict[str, Any]) -> str:
+    """Per-job working directory inside staging_dir.
+
+    The name depends only on what the job downloads and produces, so a
+    rerun of a cancelled or failed job finds its partial files and resumes
+    them, while jobs making different outputs never share a directory.
+    """
+    key = '\n'.join([job['url'], os.path.abspath(job['folder']),
+                     str(job['download_video']), str(job['download_audio']), repr(job['renditions']),
+                     repr(job['clip_ranges']), repr(job['clip_chapters']), str(job['precise_cuts'])])
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.abspath(os.path.expanduser(staging_dir)), f"job-{digest}")
+
+
+def finalize(src: str, folder: str) -> str:
+    """Move a finished file from staging into folder atomically. Returns the new path.
+
+    On the same volume this is a rename. Across volumes the file is copied
+    sequentially to a hidden temporary name next to the destination, synced,
+    and then renamed, so the folder never shows a partial file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    dest_path = os.path.join(folder, os.path.basename(src))
+    try:
+        os.replace(src, dest_path)
+        return dest_path
+    except OSError:
+        pass
+
+    temp_path = os.path.join(folder, '.' + os.path.basename(src) + TEMP_SUFFIX)
+    try:
+        shutil.copy2(src, temp_path)
+        with open(temp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.remove(src)
+    return dest_path
+
+
+def discard(path: str):
+    """Remove a job's staging directory and everything left in it."""
+    shutil.rmtree(path, ignore_errors=True)
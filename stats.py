@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Live throughput statistics for the dashboard panel.
+Samples go into fixed-size ring buffers. Recording one is O(1), memory
+stays constant however long the app runs, and drawing a sparkline reads
+only the last minute of numbers.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from jobs import Event, TERMINAL_EVENTS
+
+
+# Samples kept per series; at one tick a second this is the last minute
+HISTORY_SAMPLES = 60
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+# A job that hasn't reported progress for this long counts as stalled (0 B/s)
+STALE_AFTER = 3.0
+
+
+class RingBuffer:
+    """Fixed-size buffer of floats that overwrites its oldest value when full."""
+
+    __slots__ = ('_values', '_next', '_count')
+
+    def __init__(self, size: int):
+        self._values = [0.0] * size
+        self._next = 0
+        self._count = 0
+
+    def append(self, value: float):
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+
+    def values(self) -> List[float]:
+        """Stored values, oldest first."""
+        if self._count < len(self._values):
+            return self._values[:self._count]
+        return self._values[self._next:] + self._values[:self._next]
+
+    def last(self) -> float:
+        return self._values[self._next - 1] if self._count else 0.0
+
+    def __len__(self):
+        return self._count
+
+
+def sparkline(values: List[float]) -> str:
+    """One block character per value, scaled to the largest."""
+    top = max(values, default=0)
+    if top <= 0:
+        return SPARK_CHARS[0] * len(values)
+    return ''.join(SPARK_CHARS[min(int(v / top * len(SPARK_CHARS)), len(SPARK_CHARS) - 1)] for v in values)
+
+
+def cpu_load() -> Optional[float]:
+    """One-minute load average per core (1.0 means every core busy), or None where unsupported."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class ThroughputStats:
+    """Per-job and overall download rates built from engine events.
+
+    Feed it events with on_event() and call tick() at a fixed interval; each
+    tick records one sample per series. It isn't thread-safe: call both from
+    the same thread (the Tk thread in the app).
+    """
+
+    def __init__(self, samples: int = HISTORY_SAMPLES, interval: float = 1.0):
+        self.samples = samples
+        self.interval = interval
+        self.speed = RingBuffer(samples)  # Total bytes/s across jobs, per tick
+        self.completed = RingBuffer(samples)  # Jobs finished during each tick
+        self.job_speeds: Dict[int, RingBuffer] = {}
+        self._current: Dict[int, Tuple[float, float]] = {}  # Downloading job -> (speed, when reported)
+        self._post_processing = set()
+        self._held = set()
+        self._completed_since_tick = 0
+
+    def on_event(self, event: Event):
+        job_id = event['id']
+        if event['type'] == 'progress':
+            self._held.discard(job_id)
+            if event['status'] == "Post-processing...":
+                self._current.pop(job_id, None)
+                self._post_processing.add(job_id)
+            else:
+                self._post_processing.discard(job_id)
+                self._current[job_id] = (event.get('speed') or 0.0, time.monotonic())
+        elif event['type'] == 'held':
+            self._held.add(job_id)
+        elif event['type'] == 'stage':
+            # A stage starts or ends; conversion, if any, is over
+            self._post_processing.discard(job_id)
+        elif event['type'] in TERMINAL_EVENTS:
+            self._current.pop(job_id, None)
+            self._post_processing.discard(job_id)
+            self._held.discard(job_id)
+            self.job_speeds.pop(job_id, None)
+            if event['type'] == 'complete':
+                self._completed_since_tick += 1
+
+    def tick(self):
+        """Record one sample of every series."""
+        now = time.monotonic()
+        total = 0.0
+        for job_id, (speed, reported) in self._current.items():
+            if now - reported > STALE_AFTER:
+                speed = 0.0
+            ring = self.job_speeds.get(job_id)
+            if ring is None:
+                ring = self.job_speeds[job_id] = RingBuffer(self.samples)
+            ring.append(speed)
+            total += speed
+        self.speed.append(total)
+        self.completed.append(self._completed_since_tick)
+        self._completed_since_tick = 0
+
+    def jobs_per_minute(self) -> float:
+        ticks = len(self.completed)
+        return sum(self.completed.values()) / (ticks * self.interval) * 60 if ticks else 0.0
+
+    def job_sparkline(self, job_id: int, width: int = 12) -> str:
+        ring = self.job_speeds.get(job_id)
+        return sparkline(ring.values()[-width:]) if ring else ""
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            'speed': self.speed.last(),
+            'downloading': len(self._current),
+            'post_processing': len(self._post_processing),
+            'held': len(self._held),
+            'jobs_per_minute': self.jobs_per_minute(),
+            'cpu_load': cpu_load(),
+        }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+URL helpers: pulling URLs out of pasted text and reducing them to a
+canonical extractor/ID key so the same video is recognised however it
+was linked.
+"""
+
+import re
+import functools
+from typing import List, Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Matches the common YouTube URL shapes without loading any extractors
+YOUTUBE_ID_RE = re.compile(
+    r'^(?:https?://)?(?:[\w-]+\.)*'
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([0-9A-Za-z_-]{11})'
+)
+
+YOUTUBE_HOSTS = ('youtube.com', 'youtu.be')
+
+URL_RE = re.compile(r'https?://[^\s<>"\']+')
+
+# Query parameters that never change which video a URL points to, on any site (plus utm_*)
+TRACKING_PARAMS = {'fbclid', 'gclid'}
+
+# ...and on YouTube, where they only pick a start time, playlist position or referrer
+YOUTUBE_TRACKING_PARAMS = {'t', 'si', 'feature', 'pp', 'index', 'list', 'start_radio', 'ab_channel'}
+
+
+@functools.lru_cache(maxsize=1)
+def _extractors():
+    from yt_dlp.extractor import gen_extractor_classes
+    return [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+
+
+def extract_urls(text: str) -> List[str]:
+    """Return every http(s) URL in a block of text, in order."""
+    return [url.rstrip('.,;)]') for url in URL_RE.findall(text)]
+
+
+def is_http_url(url: str) -> bool:
+    """Whether url is an http(s) URL with a host."""
+    parts = urlparse(url.strip())
+    return parts.scheme in ('http', 'https') and bool(parts.hostname)
+
+
+def video_key(url: str) -> Optional[str]:
+    """Return 'extractor/id' for a URL a yt-dlp extractor recognises, or None."""
+    match = YOUTUBE_ID_RE.search(url)
+    if match:
+        return f"youtube/{match.group(1)}"
+    for ie in _extractors():
+        if not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        if video_id:
+            return f"{ie.ie_key().lower()}/{video_id}"
+        return None
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """Normalise a URL that no extractor recognises so trivial variants compare equal.
+
+    The scheme and port are kept: on an arbitrary site they can point to
+    different content.
+    """
+    parts = urlparse(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    dropped = TRACKING_PARAMS
+    if host in YOUTUBE_HOSTS or host.endswith(tuple('.' + h for h in YOUTUBE_HOSTS)):
+        dropped = dropped | YOUTUBE_TRACKING_PARAMS
+        if parts.path.rstrip('/') == '/playlist':
+            # Here the list is what the URL points to
+            dropped = dropped - {'list'}
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in dropped and not k.startswith('utm_')]
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    return urlunparse((parts.scheme.lower(), netloc, parts.path.rstrip('/'), '', urlencode(sorted(query)), ''))
+
+
+def canonical_key(url: str) -> str:
+    """Return the key two URLs share when they point to the same video."""
+    return video_key(url) or normalize_url(url)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Long-lived yt-dlp network state shared by every job in a process.
+Each job still gets its own YoutubeDL (options differ per job), but all
+of them borrow one set of request handlers (and so one keep-alive
+connection pool), one cookie jar, and one in-memory YouTube player and
+signature cache.
+"""
+
+import os
+import time
+import atexit
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
+from yt_dlp.networking.common import _REQUEST_HANDLERS, _RH_PREFERENCES  # See the shim below
+
+from content_store import TEMP_SUFFIX
+
+
+DEFAULT_COOKIE_FILE = os.path.join(os.path.expanduser("~"), ".downbad_cookies.txt")
+
+# Cookies are written back at most this often, and at exit
+COOKIE_SAVE_INTERVAL = 30.0
+
+# Options that change how request handlers are built; jobs that differ in any
+# of them can't share handlers
+NETWORK_PARAMS = ('http_headers', 'proxy', 'geo_verification_proxy', 'source_address', 'socket_timeout',
+                  'nocheckcertificate', 'legacyserverconnect', 'impersonate', 'client_certificate',
+                  'compat_opts', 'debug_printtraffic', 'enable_file_urls')
+
+# Per-extractor caches of downloaded player code and solved signatures
+SHARED_IE_CACHES = ('_code_cache', '_player_cache')
+
+
+# --- yt-dlp internals ---------------------------------------------------------
+# YoutubeDL has no public way to be handed an existing cookie jar or request
+# director, nor a public list of the request handlers it would build. Every use
+# of those private details is confined to the three functions below, so a
+# yt-dlp upgrade that changes them breaks in one place. The only other override
+# of yt-dlp internals is ffmpeg_tools.install_cancellable_popen(), which swaps
+# the Popen yt-dlp starts FFmpeg with.
+
+def _set_cached(ydl: yt_dlp.YoutubeDL, name: str, value):
+    """Preset one of YoutubeDL's cached properties ('cookiejar', '_request_director')."""
+    ydl.__dict__[name] = value
+
+
+def _take_cached(ydl: yt_dlp.YoutubeDL, name: str):
+    """Remove a cached property's value, if it was built, and return it."""
+    return ydl.__dict__.pop(name, None)
+
+
+def _build_director(owner: yt_dlp.YoutubeDL):
+    """A request director with every available handler, as YoutubeDL builds its own."""
+    return owner.build_request_director(_REQUEST_HANDLERS.values(), _RH_PREFERENCES)
+
+# -------------------------------------------------------------------------------
+
+
+class YtdlSession:
+    """Request handlers, cookies and extractor caches shared by YoutubeDL instances."""
+
+    def __init__(self, cookie_file: Optional[str] = DEFAULT_COOKIE_FILE):
+        self.cookie_file = cookie_file
+        self._lock = threading.Lock()
+        # Network key -> (request director, the session's YoutubeDL that logs for it)
+        self._directors: Dict[str, tuple] = {}
+        self._ie_caches: Dict[tuple, dict] = {}
+        self._last_cookie_save = time.monotonic()
+        self.cookiejar = YoutubeDLCookieJar()
+        if cookie_file and os.path.exists(cookie_file):
+            try:
+                self.cookiejar.load(cookie_file)
+            except Exception as e:
+                print(f"Error loading cookies: {e}")
+        self.stats = {'directors_built': 0, 'directors_reused': 0}
+
+    @staticmethod
+    def _network_key(params: Dict[str, Any]) -> str:
+        return repr([(name, params.get(name)) for name in NETWORK_PARAMS])
+
+    def _new_director(self, params: Dict[str, Any]):
+        """Handlers for one set of network options, owned by the session.
+
+        The handlers log through the YoutubeDL that builds them. A quiet one made
+        here does that, so no job's YoutubeDL (with its hooks, params and info) is
+        kept alive by the director or gets the warnings of jobs that run later.
+        """
+        owner_params = {name: params[name] for name in NETWORK_PARAMS if name in params}
+        owner_params['quiet'] = True
+        owner = yt_dlp.YoutubeDL(owner_params, auto_init=False)
+        _set_cached(owner, 'cookiejar', self.cookiejar)
+        return _build_director(owner), owner
+
+    def attach(self, ydl: yt_dlp.YoutubeDL):
+        """Point a new YoutubeDL at the shared cookie jar and request handlers."""
+        # Both are cached properties; setting them first stops yt-dlp building its own
+        _set_cached(ydl, 'cookiejar', self.cookiejar)
+        own_director = _take_cached(ydl, '_request_director')
+        if own_director is not None:
+            # Some options (impersonate, verbose) make YoutubeDL.__init__ build one early
+            own_director.close()
+        key = self._network_key(ydl.params)
+        with self._lock:
+            entry = self._directors.get(key)
+            if entry is None:
+                entry = self._directors[key] = self._new_director(ydl.params)
+                self.stats['directors_built'] += 1
+            else:
+                self.stats['directors_reused'] += 1
+        _set_cached(ydl, '_request_director', entry[0])
+
+    def detach(self, ydl: yt_dlp.YoutubeDL):
+        """Take the shared handlers back so YoutubeDL.close() doesn't close them."""
+        _take_cached(ydl, '_request_director')
+        self.save_cookies()
+
+    def share_ie_caches(self, ie):
+        """Give an extractor instance the session's caches in place of its own."""
+        for name in SHARED_IE_CACHES:
+            if isinstance(getattr(ie, name, None), dict):
+                with self._lock:
+                    cache = self._ie_caches.setdefault((ie.ie_key(), name), {})
+                setattr(ie, name, cache)
+
+    def save_cookies(self, force: bool = False):
+        if not self.cookie_file:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_cookie_save < COOKIE_SAVE_INTERVAL:
+                return
+            self._last_cookie_save = now
+            try:
+                # Several worker processes may save the same file; each writes its own
+                # temporary file (created readable by the owner only, as cookies are login
+                # credentials) and renames it over the jar, so none is ever half written
+                fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.cookie_file) + '.',
+                                                 suffix=TEMP_SUFFIX,
+                                                 dir=os.path.dirname(os.path.abspath(self.cookie_file)))
+                try:
+                    with open(fd, 'w', encoding='utf-8') as f:
+                        self.cookiejar.save(f)
+                    os.replace(temp_path, self.cookie_file)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+            except Exception as e:
+                print(f"Error saving cookies: {e}")
+
+    def close(self):
+        self.save_cookies(force=True)
+        with self._lock:
+            for director, _owner in self._directors.values():
+                director.close()
+            self._directors.clear()
+
+
+_session: Optional[YtdlSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> YtdlSession:
+    """The process-wide session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = YtdlSession()
+            atexit.register(_session.close)
+        return _session
+
+
+class SessionYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that borrows its network state from a YtdlSession.
+
+    Pass session=None to get a standalone instance, as with plain YoutubeDL.
+    """
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None, session: Optional[YtdlSession] = None,
+                 **kwargs):
+        self._session = session
+        super().__init__(params, **kwargs)
+        if session is not None:
+            session.attach(self)
+
+    def add_info_extractor(self, ie):
+        super().add_info_extractor(ie)
+        if self._session is not None and not isinstance(ie, type):
+            self._session.share_ie_caches(ie)
+
+    def close(self):
+        if self._session is not None:
+            self._session.detach(self)
+        super().close()